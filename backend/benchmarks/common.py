@@ -0,0 +1,92 @@
+# common.py
+"""Shared helpers for the benchmark scripts (local server, sample data)."""
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np # type: ignore
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES = ["koi_period", "koi_duration", "koi_depth", "koi_prad",
+            "koi_sma", "koi_incl", "koi_teq", "koi_model_snr"]
+SAMPLE = {"koi_period": 10.0, "koi_duration": 3.0, "koi_depth": 500.0, "koi_prad": 2.0,
+          "koi_sma": 0.1, "koi_incl": 89.0, "koi_teq": 800.0, "koi_model_snr": 20.0}
+# rough scale/offset of the KOI training data, enough to hit all classes and planet types
+_SCALE = np.array([50, 3, 3000, 4, 0.5, 3, 600, 20], dtype=float)
+_OFFSET = np.array([20, 5, 5000, 5, 0.5, 88, 900, 30], dtype=float)
+
+
+def bench_env(database_url: str, gemini_latency_ms: float = 0.0) -> Dict[str, str]:
+    """Environment for a local server: given database, fake Gemini client, models warmed up."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+    env["DATABASE_URL"] = database_url
+    env["GEMINI_CLIENT"] = "fake"
+    env["GEMINI_FAKE_LATENCY_MS"] = str(gemini_latency_ms)
+    return env
+
+
+def run_migrations(env: Dict[str, str], workdir: str):
+    subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "migrations.py")], cwd=workdir,
+                   env=env, check=True, capture_output=True)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, proc: subprocess.Popen, timeout_s: float, data: Optional[bytes] = None):
+    """(time of the first HTTP response, its status); retries while the port isn't accepting yet."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout_s:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=timeout_s) as resp:
+                resp.read()
+                return time.perf_counter(), resp.status
+        except urllib.error.HTTPError as e:
+            return time.perf_counter(), e.code
+        except OSError:
+            time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def spawn_server(env: Dict[str, str], workdir: str, port: int, extra_args: List[str] = ()) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+                             "--port", str(port), "--log-level", "warning", *extra_args],
+                            cwd=workdir, env=env)
+
+
+@contextlib.contextmanager
+def running_server(env: Dict[str, str], workdir: str, timeout_s: float = 60.0,
+                   extra_args: List[str] = ()) -> Iterator[str]:
+    """Start uvicorn, wait until / answers, yield its base URL, stop it afterwards."""
+    port = free_port()
+    proc = spawn_server(env, workdir, port, extra_args)
+    try:
+        wait_for(f"http://127.0.0.1:{port}/", proc, timeout_s)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def random_features(n: int, seed: int = 0) -> np.ndarray:
+    """(n x 8) plausible KOI feature rows, deterministic for a seed."""
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, len(FEATURES))) * _SCALE + _OFFSET
+
+
+def features_csv(rows: np.ndarray) -> bytes:
+    lines = [",".join(FEATURES)] + [",".join(repr(float(v)) for v in row) for row in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,115 @@
+# export.py
+"""
+Export benchmark: throughput and peak Python memory of /export's streaming
+writers at two table sizes, against reading the same rows as /history pages.
+
+    python benchmarks/export.py --rows 200000 --out export.json
+
+A temporary SQLite database is filled to rows/4 and measured, then to
+`rows` and measured again; flat peak memory between the two sizes is the
+point. Memory is the tracemalloc peak while draining the stream (a separate
+untraced run gives the throughput).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable
+
+from common import BACKEND_DIR, random_features
+
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("GEMINI_CLIENT", "fake")
+os.environ.setdefault("SIMILARITY_INDEX_PATH", "")
+
+
+def drain(chunks: Iterable[bytes]) -> int:
+    return sum(len(c) for c in chunks)
+
+
+def measure(fn: Callable[[], int], rows: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"rows_per_sec": round(rows / elapsed, 1), "mb": round(size / 1e6, 1), "peak_mb": round(peak / 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=5000, help="EXPORT_BATCH_ROWS")
+    parser.add_argument("--formats", default="csv,ndjson,parquet")
+    parser.add_argument("--workdir", default=BACKEND_DIR, help="directory containing models_store/")
+    parser.add_argument("--out", default="export.json")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'export.db')}"
+    os.chdir(args.workdir)
+    import crud, migrations
+    import main as app_main
+    from db import SessionLocal
+    from services.export import DEFAULT_COLUMNS, WRITERS
+
+    migrations.run()
+    X = random_features(5000, 0)
+    rows = app_main.analysis_rows(X, app_main.score_batch(X))
+    columns = list(DEFAULT_COLUMNS)
+
+    def export(fmt: str, cols) -> Callable[[], int]:
+        def run():
+            db = SessionLocal()
+            try:
+                return drain(WRITERS[fmt](cols, crud.iter_export_rows(db, cols, batch_size=args.batch)))
+            finally:
+                db.close()
+        return run
+
+    def history_pages() -> int:  # what an export through /history?cursor= reads
+        db = SessionLocal()
+        try:
+            n, after = 0, None
+            while True:
+                page = crud.get_analyses_after(db, after_id=after, limit=100)
+                if not page:
+                    return n
+                n += len(json.dumps([crud.analysis_record(db, o) for o in page], default=str))
+                after = page[-1].id
+                db.expunge_all()
+        finally:
+            db.close()
+
+    report: Dict[str, Any] = {"batch": args.batch, "sizes": []}
+    stored, db = 0, SessionLocal()
+    for target in (args.rows // 4, args.rows):
+        while stored < target:
+            chunk = rows[:min(len(rows), target - stored)]
+            crud.create_analyses_bulk(db, chunk)
+            stored += len(chunk)
+        size: Dict[str, Any] = {"rows": stored}
+        for fmt in args.formats.split(","):
+            size[fmt] = measure(export(fmt, columns), stored)
+            print(f"{stored:>9} rows  {fmt:<8} {size[fmt]}", file=sys.stderr)
+        size["ndjson_with_result"] = measure(export("ndjson", ["id", "result"]), stored)
+        print(f"{stored:>9} rows  ndjson+result {size['ndjson_with_result']}", file=sys.stderr)
+        size["history_pages"] = measure(history_pages, stored)
+        print(f"{stored:>9} rows  /history pages {size['history_pages']}", file=sys.stderr)
+        report["sizes"].append(size)
+    db.close()
+    tmp.cleanup()
+
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
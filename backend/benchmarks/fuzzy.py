@@ -0,0 +1,70 @@
+# fuzzy.py
+"""
+Fuzzy planet-type rules benchmark: the compiled FuzzyRuleEngine (what
+scoring uses) against the per-row assign_planet_type_multi reference.
+
+    python benchmarks/fuzzy.py --rows 1000,10000,100000 --out fuzzy.json
+
+Rows are synthetic KOI feature vectors (planet-type columns). Both paths
+run on the same rows; the report also says whether every score matched.
+"scores only" is the engine without building one result dict per row.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from common import BACKEND_DIR, random_features
+
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'fuzzy_main.db')}")  # unused
+os.environ.setdefault("GEMINI_CLIENT", "fake")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="fuzzy.json")
+    args = parser.parse_args()
+
+    from main import PLANET_FEATURE_IDX, PLANET_FEATURE_ORDER, assign_planet_type_multi, fuzzy_engine
+
+    results: List[Dict[str, Any]] = []
+    for n in (int(r) for r in args.rows.split(",")):
+        XP = random_features(n, args.seed)[:, PLANET_FEATURE_IDX]
+        rows = [dict(zip(PLANET_FEATURE_ORDER, map(float, row))) for row in XP]
+
+        scalar_s = best_of(lambda: [assign_planet_type_multi(r) for r in rows], args.repeat)
+        engine_s = best_of(lambda: fuzzy_engine.assign(XP), args.repeat)
+        arrays_s = best_of(lambda: fuzzy_engine.scores(XP), args.repeat)  # without the per-row dicts
+        types, scores = fuzzy_engine.assign(XP)
+        identical = all((t, s) == assign_planet_type_multi(r) for t, s, r in zip(types, scores, rows))
+
+        result = {"rows": n, "scalar_ms": round(scalar_s * 1e3, 2), "engine_ms": round(engine_s * 1e3, 2),
+                  "engine_scores_only_ms": round(arrays_s * 1e3, 2),
+                  "speedup": round(scalar_s / engine_s, 1), "identical": identical}
+        print(f"{n:>8} rows  scalar {result['scalar_ms']:>9} ms  engine {result['engine_ms']:>8} ms  "
+              f"(scores only {result['engine_scores_only_ms']} ms)  x{result['speedup']}  identical={identical}", file=sys.stderr)
+        results.append(result)
+
+    with open(args.out, "w") as f:
+        json.dump({"repeat": args.repeat, "results": results}, f, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
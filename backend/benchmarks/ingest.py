@@ -0,0 +1,137 @@
+# ingest.py
+"""
+Streaming ingest benchmark: server memory and throughput of
+/predict_batch/stream (chunked parse -> score -> persist) as the uploaded
+CSV grows, optionally against /predict_batch (whole file in memory).
+
+    python benchmarks/ingest.py --rows 20000,100000,400000 --out ingest.json
+    python benchmarks/ingest.py --rows 20000,100000 --endpoints stream,batch
+
+Every upload goes to a fresh server (SQLite, fake Gemini client) that has
+already scored a small warm-up file, so `peak_rss_mb` (VmHWM from
+/proc/<pid>/status, Linux) is that request's high-water mark and
+`growth_mb` is how far it rose above the warmed-up server. Flat figures
+across file sizes are the point. Upload bodies are written to disk and
+sent from there, so the client doesn't skew the picture either.
+/predict_batch needs roughly 13 KB of server memory per row; keep its
+sizes within the machine's RAM.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from typing import Any, Dict, List
+
+from common import BACKEND_DIR, FEATURES, bench_env, free_port, random_features, run_migrations, spawn_server, wait_for
+
+ENDPOINTS = {"stream": "/predict_batch/stream", "batch": "/predict_batch"}
+
+
+def write_upload(path: str, rows: int, seed: int, block: int = 50000) -> str:
+    """multipart/form-data body with a `rows`-line CSV, generated block by block; returns its content type."""
+    boundary = uuid.uuid4().hex
+    with open(path, "wb") as f:
+        f.write((f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"koi.csv\"\r\n"
+                 f"Content-Type: text/csv\r\n\r\n{','.join(FEATURES)}\n").encode("utf-8"))
+        for start in range(0, rows, block):
+            X = random_features(min(block, rows - start), seed + start)
+            f.write("".join(",".join(repr(float(v)) for v in row) + "\n" for row in X).encode("utf-8"))
+        f.write(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return f"multipart/form-data; boundary={boundary}"
+
+
+def post_file(url: str, path: str, content_type: str, timeout_s: float) -> Dict[str, Any]:
+    with open(path, "rb") as body:
+        req = urllib.request.Request(url, data=body, method="POST", headers={
+            "Content-Type": content_type, "Content-Length": str(os.path.getsize(path))})
+        with urllib.request.urlopen(req, timeout=timeout_s) as resp:
+            return json.loads(resp.read())
+
+
+def memory(pid: int) -> Dict[str, float]:
+    """Current and peak RSS of one process in MB (Linux)."""
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                name, value, _ = line.split()
+                fields[name.rstrip(":")] = int(value) / 1024.0
+    return {"rss_mb": round(fields["VmRSS"], 1), "peak_rss_mb": round(fields["VmHWM"], 1)}
+
+
+def measure(endpoint: str, upload: Dict[str, Any], env: Dict[str, str], args, tmp: str) -> Dict[str, Any]:
+    db_path = os.path.join(tmp, f"{endpoint}_{upload['rows']}.db")
+    env = {**env, "DATABASE_URL": f"sqlite:///{db_path}"}
+    run_migrations(env, args.workdir)
+    port = free_port()
+    proc = spawn_server(env, args.workdir, port, ["--no-access-log"])
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(base_url + "/", proc, 120)
+        post_file(base_url + ENDPOINTS[endpoint], args.warmup_path, args.warmup_type, args.timeout)
+        before = memory(proc.pid)
+        start = time.perf_counter()
+        response = post_file(base_url + ENDPOINTS[endpoint], upload["path"], upload["content_type"], args.timeout)
+        elapsed = time.perf_counter() - start
+        after = memory(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    scored = response["rows"] if endpoint == "stream" else len(response["results"])
+    report = {
+        "endpoint": endpoint,
+        "rows": upload["rows"],
+        "file_mb": upload["file_mb"],
+        "scored_rows": scored,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(scored / elapsed, 1),
+        "warm_rss_mb": before["rss_mb"],
+        "peak_rss_mb": after["peak_rss_mb"],
+        "growth_mb": round(after["peak_rss_mb"] - before["peak_rss_mb"], 1),
+    }
+    print(f"{endpoint:<6} {upload['rows']:>8} rows ({upload['file_mb']:>6} MB)  {report['rows_per_sec']:>9} rows/s  "
+          f"peak rss {report['peak_rss_mb']} MB (+{report['growth_mb']})", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="20000,100000,400000")
+    parser.add_argument("--endpoints", default="stream", help="comma-separated: " + ",".join(ENDPOINTS))
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="INGEST_CHUNK_ROWS")
+    parser.add_argument("--timeout", type=float, default=3600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=BACKEND_DIR, help="directory containing models_store/")
+    parser.add_argument("--out", default="ingest.json")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+
+    env = bench_env("sqlite://")  # DATABASE_URL is set per server
+    env["INGEST_CHUNK_ROWS"] = str(args.chunk_rows)
+    env["SIMILARITY_WARM_UP"] = "off"
+    env["SIMILARITY_INDEX_PATH"] = ""
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        args.warmup_path = os.path.join(tmp, "warmup.body")
+        args.warmup_type = write_upload(args.warmup_path, 100, args.seed)
+        for n in (int(r) for r in args.rows.split(",")):
+            path = os.path.join(tmp, f"upload_{n}.body")
+            upload = {"rows": n, "path": path, "content_type": write_upload(path, n, args.seed),
+                      "file_mb": round(os.path.getsize(path) / 1e6, 1)}
+            for endpoint in args.endpoints.split(","):
+                results.append(measure(endpoint, upload, env, args, tmp))
+            os.remove(path)
+
+    with open(out, "w") as f:
+        json.dump({"chunk_rows": args.chunk_rows, "results": results}, f, indent=2)
+    print(f"wrote {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# similarity.py
+"""
+Similarity index benchmark: build, save/reload and k-NN query latency of
+services/similarity.py at a given number of stored analyses.
+
+    python benchmarks/similarity.py --rows 1000000 --out similarity.json
+
+Rows are synthetic KOI feature vectors, z-scored with the base model's
+feature_stats.pkl (no database is involved). Queries are timed with an
+empty delta and with a full one (merge_rows - 1 rows scanned brute force,
+the worst case between merges), against a numpy brute-force scan.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+import numpy as np # type: ignore
+
+from common import BACKEND_DIR, random_features
+
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'similarity_main.db')}")  # unused
+os.environ.setdefault("GEMINI_CLIENT", "fake")
+
+
+def timed(fn: Callable[[np.ndarray], object], queries: np.ndarray) -> Dict[str, float]:
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {"mean_us": round(statistics.fmean(samples), 1), "p50_us": round(samples[len(samples) // 2], 1),
+            "p95_us": round(samples[int(len(samples) * 0.95)], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--merge-rows", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=BACKEND_DIR, help="directory containing models_store/")
+    parser.add_argument("--out", default="similarity.json")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+
+    os.chdir(args.workdir)
+    from services.model_registry import ModelRegistry
+    from services.similarity import SimilarityIndex
+    from main import FEATURE_PRETTY, build_norms
+    fs = ModelRegistry("models_store", FEATURE_PRETTY, build_norms).get("base").norms()[0]
+
+    n_delta = args.merge_rows - 1
+    X = random_features(args.rows, args.seed)
+    ids = np.arange(1, args.rows + 1, dtype=np.int64)
+    queries = random_features(args.queries, args.seed + 1)
+    report: Dict[str, object] = {"rows": args.rows, "k": args.k, "queries": args.queries}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(None, lambda: fs, path=os.path.join(tmp, "index.joblib"), merge_rows=args.merge_rows)
+        start = time.perf_counter()
+        index.build(ids[:-n_delta], X[:-n_delta], fs.mean, fs.std)
+        report["build_s"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        index.save()
+        report["save_s"] = round(time.perf_counter() - start, 3)
+        report["file_mb"] = round(os.path.getsize(index.path) / 1e6, 1)
+        reloaded = SimilarityIndex(None, lambda: fs, path=index.path, merge_rows=args.merge_rows)
+        start = time.perf_counter()
+        reloaded.load_saved(fs)
+        report["reload_s"] = round(time.perf_counter() - start, 3)
+
+        report["query_empty_delta"] = timed(lambda q: index.query(q, args.k), queries)
+        index.append(ids[-n_delta:], X[-n_delta:])
+        report["query_full_delta"] = timed(lambda q: index.query(q, args.k), queries)
+
+    Z = (X - fs.mean) / fs.std
+
+    def brute(q):
+        d = ((Z - (q - fs.mean) / fs.std) ** 2).sum(axis=1)
+        return np.argpartition(d, args.k)[:args.k]
+    report["query_brute_force"] = timed(brute, queries[:max(1, args.queries // 50)])
+
+    # same neighbours as a full scan
+    q = queries[0]
+    expected = ids[np.argsort(((Z - (q - fs.mean) / fs.std) ** 2).sum(axis=1), kind="stable")[:args.k]]
+    report["matches_brute_force"] = [i for i, _ in index.query(q, args.k)] == expected.tolist()
+
+    for key in ("query_empty_delta", "query_full_delta", "query_brute_force"):
+        print(f"{key:<18} p50 {report[key]['p50_us']} us  p95 {report[key]['p95_us']} us", file=sys.stderr)
+    print(f"build {report['build_s']} s  save {report['save_s']} s  reload {report['reload_s']} s  "
+          f"file {report['file_mb']} MB  matches brute force: {report['matches_brute_force']}", file=sys.stderr)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
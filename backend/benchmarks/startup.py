@@ -0,0 +1,103 @@
+# startup.py
+"""
+Cold-start benchmark: import time of main.py broken down by top-level
+package, and time from process start to the first HTTP response.
+
+    python benchmarks/startup.py                       # uses sqlite + fake Gemini
+    python benchmarks/startup.py --runs 5 --out startup.json
+    python benchmarks/startup.py --workdir /srv/prismiq   # directory holding models_store/
+
+Each run is a fresh interpreter, so OS file caches are warm but nothing is
+imported yet - the same situation as a scaled-from-zero worker.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from common import BACKEND_DIR, SAMPLE, bench_env, free_port, run_migrations, spawn_server, wait_for
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_profile(env: Dict[str, str], workdir: str) -> Dict[str, Any]:
+    """`python -X importtime -c 'import main'`, self time summed per top-level package."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    per_package: Counter = Counter()
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, name = int(m.group(1)), int(m.group(2)), m.group(4)
+        per_package[name.split(".")[0]] += self_us
+        if name == "main":
+            total_us = cumulative_us
+    return {"import_main_s": total_us / 1e6,
+            "packages_s": {k: round(v / 1e6, 4) for k, v in per_package.most_common()}}
+
+
+def first_response(env: Dict[str, str], workdir: str, timeout_s: float = 60.0) -> Dict[str, Any]:
+    """Seconds from spawning uvicorn to the first GET / and to the first /predict."""
+    port = free_port()
+    start = time.perf_counter()
+    proc = spawn_server(env, workdir, port)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        home, _ = wait_for(base + "/", proc, timeout_s)
+        predict, status = wait_for(base + "/predict", proc, timeout_s, data=json.dumps(SAMPLE).encode())
+        if status != 200:
+            print(f"warning: first /predict returned {status} (models missing in {workdir}/models_store?)",
+                  file=sys.stderr)
+        return {"first_response_s": home - start, "first_predict_s": predict - start}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {"median": round(statistics.median(values), 4), "min": round(min(values), 4),
+            "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="packages to list in the import breakdown")
+    parser.add_argument("--out", help="write the JSON report here as well")
+    parser.add_argument("--workdir", default=BACKEND_DIR, help="directory containing models_store/")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bench_env(os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+        run_migrations(env, args.workdir)
+        env["AUTO_MIGRATE"] = "off"  # measure the serving path, not DDL
+        profiles = [import_profile(env, args.workdir) for _ in range(args.runs)]
+        responses = [first_response(env, args.workdir) for _ in range(args.runs)]
+
+    best = min(profiles, key=lambda p: p["import_main_s"])
+    report = {
+        "runs": args.runs,
+        "import_main_s": summarize([p["import_main_s"] for p in profiles]),
+        "first_response_s": summarize([r["first_response_s"] for r in responses]),
+        "first_predict_s": summarize([r["first_predict_s"] for r in responses]),
+        "import_by_package_s": dict(list(best["packages_s"].items())[:args.top]),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
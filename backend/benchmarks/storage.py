@@ -0,0 +1,147 @@
+# storage.py
+"""
+Storage benchmark: bytes per stored analysis and read latency of the
+full-JSON layout (every row keeps the whole /predict payload in `result`)
+against the compact layout (services/result_store.py).
+
+    python benchmarks/storage.py --rows 20000 --out storage.json
+
+Each layout gets its own SQLite database with the same scored rows. Size is
+the VACUUMed file size divided by the row count; read latency is timed
+in-process, alternating between the layouts: one row by id rebuilt into
+its payload (what /analysis/{id} formats), and a /history page of 20 records.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from common import BACKEND_DIR, random_features
+
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'storage_main.db')}")  # unused
+os.environ.setdefault("GEMINI_CLIENT", "fake")
+
+LAYOUTS = ("full_json", "compact")
+
+
+def timed(fn: Callable[[], Any], runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {"mean_us": round(statistics.fmean(samples), 1), "p50_us": round(samples[len(samples) // 2], 1),
+            "p95_us": round(samples[int(len(samples) * 0.95)], 1)}
+
+
+def load(layout: str, path: str, rows: List[tuple]) -> Dict[str, Any]:
+    """Write `rows` in the given layout; returns the open session and size/throughput figures."""
+    from sqlalchemy import create_engine, insert # type: ignore
+    from sqlalchemy.orm import sessionmaker # type: ignore
+    import crud, migrations, models
+
+    engine = create_engine(f"sqlite:///{path}")
+    session_factory = sessionmaker(bind=engine)
+    migrations.run(engine, session_factory)
+    db = session_factory()
+    start = time.perf_counter()
+    for i in range(0, len(rows), 1000):
+        chunk = rows[i:i + 1000]
+        if layout == "compact":
+            crud.create_analyses_bulk(db, chunk)
+        else:  # as rows were written before the compact layout
+            db.execute(insert(models.Analysis), [
+                {"features": features, "result": result, "explanation": explanation, **crud.summary_columns(result)}
+                for features, result, explanation in chunk
+            ])
+            db.commit()
+    write_s = time.perf_counter() - start
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    size = os.path.getsize(path)
+    return {"db": db, "engine": engine, "report": {
+        "layout": layout,
+        "rows": len(rows),
+        "bytes_per_row": round(size / len(rows), 1),
+        "db_mb": round(size / 1e6, 2),
+        "write_rows_per_sec": round(len(rows) / write_s, 1),
+    }}
+
+
+def readers(db, n_rows: int, seed: int) -> Dict[str, Callable[[], Any]]:
+    import crud
+    from services.response_service import format_analysis_response
+    rng = random.Random(seed)
+
+    def read_analysis():
+        db.expunge_all()  # measure the database read, not the identity map
+        format_analysis_response(crud.analysis_result(db, crud.get_analysis(db, rng.randint(1, n_rows))))
+
+    def read_history_page():
+        db.expunge_all()
+        after = rng.randint(21, n_rows)
+        [crud.analysis_record(db, o) for o in crud.get_analyses_after(db, after_id=after, limit=20)]
+
+    return {"read_analysis": read_analysis, "read_history_page": read_history_page}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=10, help="alternations between the layouts while reading")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=BACKEND_DIR, help="directory containing models_store/")
+    parser.add_argument("--out", default="storage.json")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+
+    os.chdir(args.workdir)
+    import main as app_main
+
+    X = random_features(args.rows, args.seed)
+    results = app_main.score_batch(X)
+    rows = app_main.analysis_rows(X, results)
+
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp:
+        loaded = [load(layout, os.path.join(tmp, f"{layout}.db"), rows) for layout in LAYOUTS]
+        del rows, results
+        gc.collect()
+        gc.freeze()
+        # layouts take turns, so drift (CPU frequency, page cache) hits both alike
+        samples: Dict[tuple, List[float]] = {}
+        for round_ in range(args.rounds):
+            for i, layout in enumerate(loaded):
+                for name, fn in readers(layout["db"], args.rows, args.seed + round_ * 7 + i).items():
+                    samples.setdefault((i, name), []).extend(timed(fn, max(1, args.reads // args.rounds)))
+        for i, layout in enumerate(loaded):
+            report = layout["report"]
+            for name in ("read_analysis", "read_history_page"):
+                report[name] = summarize(samples[i, name])
+            layout["db"].close()
+            layout["engine"].dispose()
+            print(f"{report['layout']:<10} {report['bytes_per_row']:>8} B/row  write {report['write_rows_per_sec']} rows/s  "
+                  f"analysis p50 {report['read_analysis']['p50_us']} us  "
+                  f"history page p50 {report['read_history_page']['p50_us']} us", file=sys.stderr)
+            reports.append(report)
+
+    with open(out, "w") as f:
+        json.dump({"rows": args.rows, "reads": args.reads, "results": reports}, f, indent=2)
+    print(f"wrote {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
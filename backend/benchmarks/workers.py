@@ -0,0 +1,155 @@
+# workers.py
+"""
+Multi-worker benchmark: memory per worker and aggregate throughput of the
+pre-fork launcher (serve.py, models shared copy-on-write) against
+`uvicorn --workers N` (every worker loads its own copy), at several worker
+counts. Uses SQLite and the fake Gemini client, like load.py.
+
+    python benchmarks/workers.py --out workers.json
+    python benchmarks/workers.py --workers 1,2,4,8 --modes prefork --concurrency 64 --requests 2000
+
+Memory comes from /proc/<pid>/smaps_rollup after the throughput run: RSS
+counts shared pages in every process, PSS divides them among the processes
+sharing them, so the sum of PSS is the real footprint of the server.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from common import BACKEND_DIR, bench_env, free_port, run_migrations, spawn_server, wait_for
+from load import Scenario, drive
+
+MODES = ("prefork", "uvicorn")
+
+
+def spawn_prefork(env: Dict[str, str], workdir: str, port: int, workers: int) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--port", str(port),
+                             "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+                            cwd=workdir, env=env)
+
+
+def children(pid: int) -> List[int]:
+    """Worker processes of a server (uvicorn --workers also starts a multiprocessing resource tracker)."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+    workers = []
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/cmdline", "rb") as f:
+                if b"resource_tracker" in f.read():
+                    continue
+        except OSError:
+            continue
+        workers.append(child)
+    return workers
+
+
+def memory(pid: int) -> Dict[str, float]:
+    """RSS / PSS / private memory of one process in MB (Linux)."""
+    fields: Dict[str, float] = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    private = fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)
+    return {"rss_mb": round(fields.get("Rss", 0.0), 1), "pss_mb": round(fields.get("Pss", 0.0), 1),
+            "private_mb": round(private, 1)}
+
+
+def wait_for_workers(proc: subprocess.Popen, workers: int, timeout_s: float = 60.0):
+    start = time.perf_counter()
+    while len(children(proc.pid)) < workers and time.perf_counter() - start < timeout_s:
+        time.sleep(0.05)
+
+
+def measure(mode: str, workers: int, env: Dict[str, str], args) -> Dict[str, Any]:
+    port = free_port()
+    start = time.perf_counter()
+    if mode == "prefork":
+        proc = spawn_prefork(env, args.workdir, port, workers)
+    else:
+        proc = spawn_server(env, args.workdir, port, ["--workers", str(workers)] if workers > 1 else [])
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(base_url + "/", proc, 120)
+        wait_for_workers(proc, workers)
+        scenario = Scenario(args.scenario, SimpleNamespace(
+            repeat_features=False, warmup=args.warmup, requests=args.requests, concurrency=[args.concurrency],
+            seed=args.seed, large_rows=0))
+        drive(base_url, scenario, args.concurrency, args.warmup, args.timeout)  # every worker warmed up
+        ready_s = time.perf_counter() - start
+        result = drive(base_url, scenario, args.concurrency, args.requests, args.timeout, first=args.warmup)
+
+        if mode == "uvicorn" and workers == 1:
+            parent, per_worker = None, [memory(proc.pid)]  # single uvicorn process serves itself
+        else:
+            parent, per_worker = memory(proc.pid), [memory(pid) for pid in children(proc.pid)]
+        total_pss = (parent["pss_mb"] if parent else 0.0) + sum(w["pss_mb"] for w in per_worker)
+        report = {
+            "mode": mode,
+            "workers": workers,
+            "ready_s": round(ready_s, 2),
+            "throughput_rps": result["throughput_rps"],
+            "p50_ms": result.get("p50_ms"),
+            "p95_ms": result.get("p95_ms"),
+            "errors": result["errors"],
+            "parent": parent,
+            "per_worker": per_worker,
+            "worker_rss_mb": round(sum(w["rss_mb"] for w in per_worker) / len(per_worker), 1),
+            "worker_pss_mb": round(sum(w["pss_mb"] for w in per_worker) / len(per_worker), 1),
+            "total_pss_mb": round(total_pss, 1),
+        }
+        print(f"{mode:<8} workers={workers:<2} {report['throughput_rps']:>8} rps  p95={report['p95_ms']} ms  "
+              f"worker rss={report['worker_rss_mb']} pss={report['worker_pss_mb']} MB  "
+              f"total pss={report['total_pss_mb']} MB", file=sys.stderr)
+        return report
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=lambda s: [int(x) for x in s.split(",") if x], default=[1, 2, 4, 8])
+    parser.add_argument("--modes", type=lambda s: [x for x in s.split(",") if x], default=list(MODES))
+    parser.add_argument("--scenario", default="predict", help="load.py scenario driven at each worker count")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--gemini-latency-ms", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=BACKEND_DIR, help="directory containing models_store/")
+    parser.add_argument("--out", default="workers.json")
+    args = parser.parse_args()
+    if set(args.modes) - set(MODES):
+        parser.error(f"modes: {', '.join(MODES)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bench_env(f"sqlite:///{os.path.join(tmp, 'workers.db')}", args.gemini_latency_ms)
+        env["PREDICT_CACHE"] = "off"  # measure scoring, not the memo cache
+        run_migrations(env, args.workdir)
+        for workers in args.workers:
+            for mode in args.modes:
+                results.append(measure(mode, workers, env, args))
+
+    report = {"cpu_count": os.cpu_count(), "scenario": args.scenario, "concurrency": args.concurrency,
+              "requests": args.requests, "results": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,445 @@
 # crud.py
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import Float, Integer, and_, delete, func, insert, or_, select, text, tuple_, update # type: ignore
+from sqlalchemy.exc import IntegrityError # type: ignore
 from sqlalchemy.orm import Session # type: ignore
 import models, schemas
+from services import result_store, rollups
 
+logger = logging.getLogger("exoplanet_api")
+
+# callbacks(rows) run after new analyses are committed; each row is {"id", **summary_columns}
+created_listeners: list = []
+
+def add_created_listener(fn):
+    created_listeners.append(fn)
+
+def _notify_created(rows: list[dict]):
+    for fn in created_listeners:
+        try:
+            fn(rows)
+        except Exception:
+            logger.exception("Analysis created listener failed")
+
+# sort keys accepted by get_analysis_summaries
+SUMMARY_SORT_COLUMNS = ("created_at", "confidence", "reliability_score", "outlier_count")
+
+SUMMARY_FIELDS = ("prediction", "confidence", "reliability_label", "reliability_score",
+                  "planet_type", "outlier_count")
+
+def summary_columns(result: dict) -> dict:
+    """Denormalized summary fields of a result payload (see models.Analysis)."""
+    reliability = result.get("reliability") or {}
+    planet = result.get("planet_type") or {}
+    return {
+        "prediction": result.get("prediction"),
+        "confidence": result.get("confidence"),
+        "reliability_label": reliability.get("label"),
+        "reliability_score": reliability.get("score"),
+        "planet_type": planet.get("ml_prediction"),
+        "outlier_count": len(result.get("outliers") or []),
+    }
+
+# ---------- Compact result layout (services/result_store.py) ----------
+# result contexts never change once written, so every process keeps the ones it has seen (per engine)
+_result_contexts: dict[tuple, dict] = {}
+
+def _result_context_key(db: Session, context: dict) -> str:
+    """Key of the stored context, writing it first if this is its first row."""
+    key = result_store.context_key(context)
+    bind = db.bind or db.get_bind()
+    if (bind, key) in _result_contexts:
+        return key
+    # own session, so a concurrent insert by another process can't fail the caller's transaction
+    ctx_db = Session(bind=bind)
+    try:
+        if ctx_db.get(models.ResultContext, key) is None:
+            ctx_db.add(models.ResultContext(key=key, model_version=context["model_version"], data=context))
+            try:
+                ctx_db.commit()
+            except IntegrityError:
+                ctx_db.rollback()  # written by another process meanwhile
+    finally:
+        ctx_db.close()
+    _result_contexts[bind, key] = context
+    return key
+
+def get_result_context(db: Session, key: str) -> dict:
+    bind = db.bind or db.get_bind()  # Session.get_bind() is slow enough to matter per row
+    context = _result_contexts.get((bind, key))
+    if context is None:
+        context = _result_contexts[bind, key] = db.get(models.ResultContext, key).data
+    return context
+
+def analysis_columns(db: Session, features: dict, result: dict, explanation: str | None = None) -> dict:
+    """Column values of a new row: compact result columns plus the summary columns."""
+    key = _result_context_key(db, result_store.result_context(result))
+    columns = {
+        **result_store.pack_result(features, result, key, models.FEATURE_COLUMNS),
+        "explanation": explanation,
+        **summary_columns(result),
+    }
+    if columns["explanation_status"] == "pending":
+        columns["explanation_claimed_at"] = time.time()  # the submitting process generates it
+    return columns
+
+def analysis_result(db: Session, db_obj) -> dict:
+    """The row's result payload (as /predict returned it)."""
+    if db_obj.result is not None:  # stored before the compact layout
+        return db_obj.result
+    return result_store.unpack_result(db_obj, get_result_context(db, db_obj.context_key))
+
+def analysis_features(db_obj) -> dict:
+    if db_obj.result is not None:
+        return db_obj.features
+    return result_store.unpack_features(db_obj, models.FEATURE_COLUMNS)
+
+def analysis_record(db: Session, db_obj) -> dict:
+    """Row in the schemas.AnalysisResponse shape."""
+    return {"id": db_obj.id, "created_at": db_obj.created_at, "features": analysis_features(db_obj),
+            "result": analysis_result(db, db_obj), "explanation": db_obj.explanation}
 
 def create_analysis(db: Session, features: dict, result: dict, explanation: str | None = None):
-    db_obj = models.Analysis(
-        features=features,
-        result=result,
-        explanation=explanation
-    )
+    now = datetime.now(timezone.utc)  # set here so the row and its rollup buckets agree
+    db_obj = models.Analysis(**analysis_columns(db, features, result, explanation), created_at=now)
     db.add(db_obj)
+    _add_to_rollups(db, rollups.rollup_counts([(summary_columns(result), now)]))
     db.commit()
     db.refresh(db_obj)
+    _notify_created([{"id": db_obj.id, **summary_columns(result)}])
     return db_obj
 
+def create_analyses_bulk(db: Session, rows: list[tuple[dict, dict, str | None]]) -> list[int]:
+    """
+    Insert many (features, result, explanation) rows in one transaction and
+    return their ids in input order. Uses multi-row INSERT ... VALUES ...
+    RETURNING (batched by SQLAlchemy's insertmanyvalues); dialects without
+    INSERT RETURNING fall back to an ORM flush.
+    """
+    if not rows:
+        return []
+    now = datetime.now(timezone.utc)
+    values = [{**analysis_columns(db, features, result, explanation), "created_at": now}
+              for features, result, explanation in rows]
+    _add_to_rollups(db, rollups.rollup_counts((v, now) for v in values))
+    if getattr(db.get_bind().dialect, "insert_returning", False):
+        table = models.Analysis.__table__
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        ids = list(db.execute(stmt, values).scalars())
+    else:
+        db_objs = [models.Analysis(**v) for v in values]
+        db.add_all(db_objs)
+        db.flush()
+        ids = [obj.id for obj in db_objs]
+    db.commit()
+    _notify_created([
+        {"id": analysis_id, **{k: v[k] for k in SUMMARY_FIELDS}} for analysis_id, v in zip(ids, values)
+    ])
+    return ids
+
+def update_analysis_explanation(db: Session, analysis_id: int, koi_text: str, planet_text: str | None = None):
+    """Fill in deferred Gemini text and mark it ready."""
+    db_obj = get_analysis(db, analysis_id)
+    if db_obj is None:
+        return None
+    if db_obj.result is not None:  # stored before the compact layout: the texts live in the result JSON
+        result = dict(db_obj.result)  # new dict so the JSON column is flagged dirty
+        result["gemini_koi_explanation"] = koi_text
+        if planet_text is not None and result.get("planet_type"):
+            result["planet_type"] = {**result["planet_type"], "gemini_planet_explanation": planet_text}
+        result["explanation_status"] = "ready"
+        db_obj.result = result
+    else:
+        if planet_text is not None and db_obj.planet_code is not None:
+            db_obj.planet_explanation = planet_text
+        db_obj.explanation_status = "ready"
+    db_obj.explanation = koi_text
+    db.commit()
+    return db_obj
+
+def mark_explanation_failed(db: Session, analysis_id: int) -> bool:
+    """A deferred explanation that could not be generated: "failed" instead of "pending" forever."""
+    db_obj = get_analysis(db, analysis_id)
+    if db_obj is None:
+        return False
+    if db_obj.result is not None:
+        db_obj.result = {**db_obj.result, "explanation_status": "failed"}
+    else:
+        db_obj.explanation_status = "failed"
+    db.commit()
+    return True
+
+def get_orphaned_explanation_ids(db: Session, stale_before: float, limit: int = 1000) -> list[int]:
+    """Pending explanations no live process is generating (claimed before stale_before)."""
+    Analysis = models.Analysis
+    rows = db.query(Analysis.id).filter(
+        Analysis.explanation_status == "pending",
+        or_(Analysis.explanation_claimed_at.is_(None), Analysis.explanation_claimed_at < stale_before),
+    )
+    return [row.id for row in rows.order_by(Analysis.id).limit(limit).all()]
+
+def heartbeat_explanations(db: Session, analysis_ids: list[int], now: float | None):
+    """Renew the claims on pending explanations a process still holds (now=None releases them)."""
+    if not analysis_ids:
+        return
+    Analysis = models.Analysis
+    db.execute(update(Analysis)
+               .where(Analysis.id.in_(analysis_ids), Analysis.explanation_status == "pending")
+               .values(explanation_claimed_at=now))
+    db.commit()
+
+def claim_explanation(db: Session, analysis_id: int, now: float, stale_before: float):
+    """Atomically take over an orphaned pending explanation; returns the row, or None if another process has it."""
+    Analysis = models.Analysis
+    result = db.execute(
+        update(Analysis)
+        .where(Analysis.id == analysis_id, Analysis.explanation_status == "pending",
+               or_(Analysis.explanation_claimed_at.is_(None), Analysis.explanation_claimed_at < stale_before))
+        .values(explanation_claimed_at=now)
+    )
+    db.commit()
+    return get_analysis(db, analysis_id) if result.rowcount == 1 else None
+
+# ---------- Rollups (services/rollups.py) ----------
+def _add_to_rollups(db: Session, counts: Counter):
+    """Add to the rollup counters in the caller's transaction, so they commit (or not) with the rows."""
+    if not counts:
+        return
+    table = models.AnalysisRollup.__table__
+    # sorted: concurrent transactions lock the counter rows in the same order
+    params = [{"period": p, "bucket": b, "dimension": d, "value": v, "count": n}
+              for (p, b, d, v), n in sorted(counts.items())]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert # type: ignore
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert # type: ignore
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[c.name for c in table.primary_key],
+                                          set_={"count": table.c.count + stmt.excluded.count})
+        db.execute(stmt, params)
+        return
+    for p in params:
+        key = [table.c.period == p["period"], table.c.bucket == p["bucket"],
+               table.c.dimension == p["dimension"], table.c.value == p["value"]]
+        if db.execute(update(table).where(*key).values(count=table.c.count + p["count"])).rowcount == 0:
+            db.execute(insert(table), [p])
+
+def get_rollups(db: Session, period: str, first: str | None = None, last: str | None = None):
+    """(bucket, dimension, value, count) rows of one period ("all", "day", "hour"), buckets first..last."""
+    R = models.AnalysisRollup
+    query = db.query(R.bucket, R.dimension, R.value, R.count).filter(R.period == period)
+    if first is not None:
+        query = query.filter(R.bucket >= first)  # bucket strings sort chronologically
+    if last is not None:
+        query = query.filter(R.bucket <= last)
+    return query.all()
+
+def rebuild_rollups(db: Session, batch_size: int = 10000) -> int:
+    """Recompute every rollup counter from the analyses table; returns the number of analyses counted."""
+    Analysis = models.Analysis
+    if db.get_bind().dialect.name == "postgresql":
+        # inserts wait on the counters until the rebuild commits, so none is counted twice or missed
+        db.execute(text("LOCK TABLE analysis_rollups IN SHARE ROW EXCLUSIVE MODE"))
+    db.execute(delete(models.AnalysisRollup))  # on SQLite this takes the write lock for the same effect
+    # rows with the same summary values in the same hour add to the same counters
+    groups: Counter = Counter()
+    rows = db.execute(
+        select(Analysis.prediction, Analysis.planet_type, Analysis.reliability_label, Analysis.outlier_count,
+               Analysis.created_at).execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        hour = rollups.as_utc(row.created_at).replace(minute=0, second=0, microsecond=0)
+        groups[row.prediction, row.planet_type, row.reliability_label, row.outlier_count, hour] += 1
+    counts: Counter = Counter()
+    for (prediction, planet_type, reliability_label, outlier_count, hour), n in groups.items():
+        row = {"prediction": prediction, "planet_type": planet_type, "reliability_label": reliability_label,
+               "outlier_count": outlier_count}
+        for key, c in rollups.rollup_counts([(row, hour)]).items():
+            counts[key] += c * n
+    _add_to_rollups(db, counts)
+    total = sum(groups.values())
+    db.commit()
+    return total
+
 def get_analyses(db: Session, skip: int = 0, limit: int = 20):
-    return db.query(models.Analysis).offset(skip).limit(limit).all()
+    return (db.query(models.Analysis)
+            .order_by(models.Analysis.created_at.desc(), models.Analysis.id.desc())
+            .offset(skip).limit(limit).all())
+
+# stands in for NULL in numeric sort keys: below every value in DESC order, above every value in ASC
+_NULLS_LAST = 1e308
+
+def _keyset(db: Session, query, sort_col, after_id: int | None, descending: bool = True):
+    """
+    Order query by (sort_col, id) and start after analysis after_id.
+    The anchor's sort value is read in SQL, so the comparison uses the stored value as-is.
+    Numeric sort columns are nullable: NULLs sort last in either order, through a
+    coalesce() that the ORDER BY and the keyset predicate share.
+    """
+    Analysis = models.Analysis
+    if isinstance(sort_col.type, (Float, Integer)):
+        sort_col = func.coalesce(sort_col, -_NULLS_LAST if descending else _NULLS_LAST)
+    if after_id is not None:
+        anchor = db.query(sort_col).filter(Analysis.id == after_id).scalar_subquery()
+        key, bound = tuple_(sort_col, Analysis.id), tuple_(anchor, after_id)
+        query = query.filter(key < bound if descending else key > bound)
+    if descending:
+        return query.order_by(sort_col.desc(), Analysis.id.desc())
+    return query.order_by(sort_col.asc(), Analysis.id.asc())
+
+def get_analyses_after(db: Session, after_id: int | None = None, limit: int = 20):
+    """Keyset page of full rows in (created_at DESC, id DESC) order, starting after analysis after_id."""
+    query = db.query(models.Analysis)
+    return _keyset(db, query, models.Analysis.created_at, after_id).limit(limit).all()
+
+def get_analysis_summaries(db: Session, limit: int = 30, skip: int = 0, after_id: int | None = None,
+                           prediction: str | None = None, reliability: str | None = None,
+                           planet_type: str | None = None, min_outliers: int | None = None,
+                           max_outliers: int | None = None, sort: str = "created_at", descending: bool = True):
+    """Summary columns only (no result JSON), filtered and sorted in SQL."""
+    Analysis = models.Analysis
+    query = db.query(Analysis.id, Analysis.prediction, Analysis.confidence, Analysis.reliability_label,
+                     Analysis.reliability_score, Analysis.planet_type, Analysis.outlier_count,
+                     Analysis.created_at)
+    if prediction is not None:
+        query = query.filter(Analysis.prediction == prediction)
+    if reliability is not None:
+        query = query.filter(Analysis.reliability_label == reliability)
+    if planet_type is not None:
+        query = query.filter(Analysis.planet_type == planet_type)
+    if min_outliers is not None:
+        query = query.filter(Analysis.outlier_count >= min_outliers)
+    if max_outliers is not None:
+        query = query.filter(Analysis.outlier_count <= max_outliers)
+    query = _keyset(db, query, getattr(Analysis, sort), after_id, descending)
+    if skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def get_feature_rows(db: Session, after_id: int = 0, limit: int = 10000, before_id: int | None = None):
+    """(id, *FEATURE_COLUMNS) of analyses after `after_id` (and before `before_id`) with every feature column set, in id order."""
+    Analysis = models.Analysis
+    columns = [getattr(Analysis, k) for k in models.FEATURE_COLUMNS]
+    bound = [Analysis.id < before_id] if before_id is not None else []
+    return db.execute(
+        select(Analysis.id, *columns)
+        .where(Analysis.id > after_id, *bound, *(c.is_not(None) for c in columns))
+        .order_by(Analysis.id)
+        .limit(limit)
+    ).all()
+
+def get_analysis_summaries_by_ids(db: Session, ids: list[int]):
+    Analysis = models.Analysis
+    return db.query(Analysis.id, Analysis.prediction, Analysis.confidence, Analysis.reliability_label,
+                    Analysis.reliability_score, Analysis.planet_type, Analysis.outlier_count,
+                    Analysis.created_at).filter(Analysis.id.in_(ids)).all()
+
+def iter_export_rows(db: Session, columns: list[str], since: datetime | None = None,
+                     until: datetime | None = None, batch_size: int = 5000):
+    """
+    Batches of rows (tuples in `columns` order, see services/export.py) in id
+    order, fetched `batch_size` at a time through a server-side cursor.
+    "result" needs whole rows to rebuild the payload; other columns are
+    selected on their own.
+    """
+    Analysis = models.Analysis
+    conditions = []
+    if since is not None:
+        conditions.append(Analysis.created_at >= rollups.as_utc(since))
+    if until is not None:
+        conditions.append(Analysis.created_at < rollups.as_utc(until))
+    if "result" not in columns:
+        stmt = select(*(getattr(Analysis, c) for c in columns))
+        stmt = stmt.where(*conditions).order_by(Analysis.id).execution_options(yield_per=batch_size)
+        for batch in db.execute(stmt).partitions():
+            yield [tuple(row) for row in batch]
+        return
+    stmt = select(Analysis).where(*conditions).order_by(Analysis.id).execution_options(yield_per=batch_size)
+    for batch in db.execute(stmt).scalars().partitions():
+        # the identity map only holds weak references, so each batch is freed once written
+        yield [tuple(analysis_result(db, o) if c == "result" else getattr(o, c) for c in columns) for o in batch]
 
 def get_analysis(db: Session, analysis_id: int):
-    return db.query(models.Analysis).filter(models.Analysis.id == analysis_id).first()
\ No newline at end of file
+    return db.query(models.Analysis).filter(models.Analysis.id == analysis_id).first()
+
+def get_cached_explanation(db: Session, key: str):
+    return db.query(models.ExplanationCache).filter(models.ExplanationCache.key == key).first()
+
+def save_cached_explanation(db: Session, key: str, model_name: str, text: str):
+    db_obj = models.ExplanationCache(key=key, model_name=model_name, text=text)
+    db.merge(db_obj)
+    db.commit()
+    return db_obj
+
+# ---------- Background jobs ----------
+JOB_ACTIVE_STATUSES = ("queued", "running")
+
+def create_job(db: Session, job_id: str, filename: str, path: str, owner: str, heartbeat_at: float):
+    db_obj = models.Job(id=job_id, filename=filename, path=path, status="queued",
+                        rows_done=0, skipped_rows=0, shards_done=[], owner=owner, heartbeat_at=heartbeat_at)
+    db.add(db_obj)
+    db.commit()
+    db.refresh(db_obj)
+    return db_obj
+
+def get_job(db: Session, job_id: str):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def get_jobs(db: Session, limit: int = 20, status: str | None = None):
+    query = db.query(models.Job)
+    if status is not None:
+        query = query.filter(models.Job.status == status)
+    return query.order_by(models.Job.created_at.desc(), models.Job.id.desc()).limit(limit).all()
+
+def claim_job(db: Session, job_id: str, owner: str, now: float, stale_before: float) -> bool:
+    """
+    Atomically take over a queued/running job unless another live process owns it
+    (its heartbeat is newer than stale_before).
+    """
+    Job = models.Job
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status.in_(JOB_ACTIVE_STATUSES),
+               or_(Job.owner == owner, Job.heartbeat_at.is_(None), Job.heartbeat_at < stale_before))
+        .values(owner=owner, heartbeat_at=now, status="running")
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def get_orphaned_job_ids(db: Session, stale_before: float) -> list[str]:
+    Job = models.Job
+    rows = db.query(Job.id).filter(Job.status.in_(JOB_ACTIVE_STATUSES),
+                                   or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < stale_before))
+    return [row.id for row in rows.order_by(Job.created_at).all()]
+
+def heartbeat_jobs(db: Session, job_ids: list[str], owner: str, now: float):
+    if not job_ids:
+        return
+    Job = models.Job
+    db.execute(update(Job).where(Job.id.in_(job_ids), Job.owner == owner).values(heartbeat_at=now))
+    db.commit()
+
+def get_stopped_job_uploads(db: Session, job_ids: list[str], stopped_before) -> list[tuple[str, str]]:
+    """(id, path) of the given jobs that are done, or cancelled/failed since before `stopped_before`."""
+    Job = models.Job
+    rows = db.query(Job.id, Job.path).filter(
+        Job.id.in_(job_ids),
+        or_(Job.status == "done", and_(Job.status.in_(("cancelled", "failed")), Job.finished_at < stopped_before)))
+    return [(row.id, row.path) for row in rows.all()]
+
+def set_job_status(db: Session, job_id: str, status: str, from_statuses=JOB_ACTIVE_STATUSES,
+                   error: str | None = None, **values) -> bool:
+    """Move a job to `status` if it is currently in one of from_statuses."""
+    Job = models.Job
+    if status in ("done", "failed", "cancelled"):
+        values["finished_at"] = func.now()
+    result = db.execute(
+        update(Job).where(Job.id == job_id, Job.status.in_(from_statuses)).values(status=status, error=error, **values)
+    )
+    db.commit()
+    return result.rowcount == 1
@@ -1,82 +1,129 @@
-from typing import Dict, Any, Tuple
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
 import os
 import logging
+from contextlib import asynccontextmanager
 import numpy as np # type: ignore
-import joblib # type: ignore
-import pandas as pd # type: ignore
-import google.generativeai as genai # type: ignore
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, WebSocket # type: ignore
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, WebSocket, WebSocketDisconnect, Request, Response, Header # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
+from fastapi.responses import StreamingResponse # type: ignore
+from fastapi.websockets import WebSocketState # type: ignore
 from pydantic import BaseModel, Field # type: ignore
-import crud, models, schemas
-from db import engine, get_db
+import crud, models, schemas, migrations
+from db import engine, get_db, SessionLocal, reset_after_fork as reset_db_after_fork
 from sqlalchemy import text # type: ignore
-import io, asyncio
+import io, asyncio, time, importlib.util, secrets
+from types import SimpleNamespace
 from services.response_service import (
     format_upload_response,
+    format_batch_response,
     format_explorer_response,
-    format_analysis_response
+    format_explanation_response,
+    format_analysis_response,
+    format_job_response,
+    format_stats_summary,
+    format_similar_response
 )
-
-# sklearn utilities for potential use with metrics
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, classification_report, accuracy_score # type: ignore
+from services.fuzzy_engine import FuzzyRuleEngine
+from services.normalization import FeatureStats, reliability_label
+from services.model_registry import ModelRegistry, ModelUnavailable
+from services.batcher import MicroBatcher
+from services.explanation_service import ExplanationService, make_client
+from services.explanation_cache import ExplanationCache
+from services.explanation_worker import ExplanationWorker
+from services.ingest import open_chunk_reader
+from services.pagination import encode_cursor, decode_cursor
+from services.change_feed import ChangeFeed, PgNotifyBridge, RESYNC
+from services.artifacts import FileArtifact, JsonPayload
+from services.result_cache import ResultCache, feature_key
+from services.timing import Timings, TimingMiddleware
+from services.jobs import JobManager, TERMINAL_STATUSES
+from services import rollups
+from services.export import DEFAULT_COLUMNS, EXPORT_COLUMNS, EXPORT_FORMATS, WRITERS
+from services.similarity import INDEX_PATH as SIMILARITY_INDEX_PATH, SimilarityIndex
+from datetime import datetime, timezone
+
+# pandas (~0.5s to import) is only needed once a file is uploaded, so it's imported there
+if TYPE_CHECKING:
+    import pandas as pd # type: ignore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("exoplanet_api")
 
-models.Base.metadata.create_all(bind=engine)
-
 # ------------------------------
 # 1. Load Model & Config (paths preserved)
 # ------------------------------
-MODEL_PATH = "models_store/koi_classifier.pkl"
-STATS_PATH = "models_store/feature_stats.pkl"
-PLANET_MODEL_PATH = "models_store/planet_classifier.pkl"
+MODEL_STORE = "models_store"
 KOI_METRICS_PATH = "models_store/koi_model_metrics.pkl"
 PLANET_METRICS_PATH = "models_store/planet_model_metrics.pkl"
 
-# defensive loads with clear errors
-try:
-    model = joblib.load(MODEL_PATH)
-    logger.info("Loaded KOI classifier from %s", MODEL_PATH)
-except Exception as e:
-    logger.exception("Failed to load KOI model")
-    raise
-
-try:
-    stats = joblib.load(STATS_PATH)
-    logger.info("Loaded stats from %s", STATS_PATH)
-except Exception as e:
-    logger.exception("Failed to load stats")
-    raise
-
-try:
-    planet_model = joblib.load(PLANET_MODEL_PATH)
-    logger.info("Loaded planet-type model from %s", PLANET_MODEL_PATH)
-except Exception as e:
-    logger.exception("Failed to load planet model")
-    raise
-
-# Configure Gemini via environment variable (keeps your original Gemini calls intact)
+# Configure Gemini via environment variable (GEMINI_CLIENT=fake for a local stand-in)
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_KEY:
-    logger.warning("GEMINI_API_KEY not set in environment. Gemini calls will fail until set.")
-else:
-    genai.configure(api_key=GEMINI_KEY)
-    logger.info("Configured Gemini API")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+def build_gemini_client():
+    return make_client(GEMINI_KEY,
+                       kind=os.getenv("GEMINI_CLIENT", "gemini"),
+                       max_workers=GEMINI_MAX_CONCURRENCY,
+                       fake_latency_ms=float(os.getenv("GEMINI_FAKE_LATENCY_MS", "0")))
+
+explainer = ExplanationService(
+    build_gemini_client(),
+    timeout_s=float(os.getenv("GEMINI_TIMEOUT_S", "30")),
+    max_concurrency=GEMINI_MAX_CONCURRENCY,
+    # prompt-keyed LRU + explanation_cache table (EXPLANATION_CACHE=off disables it)
+    cache=None if os.getenv("EXPLANATION_CACHE", "on").lower() in ("0", "off", "false") else ExplanationCache(
+        session_factory=SessionLocal,
+        max_entries=int(os.getenv("EXPLANATION_CACHE_SIZE", "1024")),
+        ttl_s=float(os.getenv("EXPLANATION_CACHE_TTL_S", "3600")),
+    ),
+)
+# Background fill-in of Gemini text for ?defer_explanation=true requests
+explanation_worker = ExplanationWorker(explainer, SessionLocal,
+                                       concurrency=int(os.getenv("EXPLANATION_WORKERS", "4")),
+                                       stale_s=float(os.getenv("EXPLANATION_STALE_S", "60")))
+
+# New analyses are pushed to /ws/explorer subscribers instead of being polled for
+change_feed = ChangeFeed(max_queue=int(os.getenv("CHANGE_FEED_MAX_QUEUE", "100")))
+crud.add_created_listener(change_feed.publish)
 
 # ------------------------------
 # 2. App & metadata
 # ------------------------------
-app = FastAPI(title="Exoplanet AI API", version="1.0")
+def env_flag(name: str, default: str = "off") -> bool:
+    return os.getenv(name, default).lower() in ("1", "on", "true")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Nothing here touches the database or the models before the first request can be served:
+    # DDL is a deploy step (`python migrations.py`), models load in the background.
+    if env_flag("AUTO_MIGRATE"):
+        await asyncio.to_thread(migrations.run, engine)
+    if env_flag("MODEL_WARM_UP", "on"):
+        model_registry.warm_up()
+    if env_flag("CHANGE_FEED_PG_NOTIFY") and engine.dialect.name == "postgresql":
+        PgNotifyBridge(engine, change_feed).start()  # fan out across uvicorn workers
+    if env_flag("SIMILARITY_WARM_UP"):
+        similarity_index.warm_up()  # loads (or builds) the index in the background
+    job_manager.start()  # heartbeats + resumes jobs left behind by a stopped process
+    explanation_worker.start(analysis_prompts)  # same for deferred explanations
+    yield
+    await explanation_worker.shutdown()
+    await job_manager.shutdown()
+
+app = FastAPI(title="Exoplanet AI API", version="1.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Per-stage histograms (/metrics/prometheus), Server-Timing headers and /ws/logs events
+timings = Timings()
+app.add_middleware(TimingMiddleware, timings=timings)
+
 # Feature mapping (kept same as your Streamlit names, but model expects koi_* keys)
 FEATURE_ORDER = [
     "koi_period",    # Orbital Period (days)
@@ -110,13 +157,39 @@ planet_class_map = {
 
 class_map = {0: "Exoplanet", 1: "Candidate", 2: "False Positive"}
 
-means = stats["means"]
-stds = stats["stds"]
+# Planet-type stage uses the KOI features minus inclination (index 5)
+PLANET_FEATURE_ORDER = ["koi_period", "koi_duration", "koi_depth", "koi_prad", "koi_sma", "koi_teq"]
+PLANET_FEATURE_IDX = [FEATURE_ORDER.index(k) for k in PLANET_FEATURE_ORDER]
+
+# Normalization vectors (std == 0 guarded once), rebuilt whenever feature_stats.pkl changes on disk
+def build_norms(stats) -> Tuple[FeatureStats, FeatureStats]:
+    koi_norm = FeatureStats(stats, FEATURE_ORDER)
+    return koi_norm, koi_norm.select(PLANET_FEATURE_ORDER)
+
+# Versioned models (models_store/ = "base", models_store/versions/<v>/), loaded lazily and hot-swappable
+model_registry = ModelRegistry(MODEL_STORE, FEATURE_PRETTY, build_norms,
+                               default_version=os.getenv("MODEL_VERSION") or None)
+model_registry.shadow_version = os.getenv("SHADOW_MODEL_VERSION") or None
+model_registry.shadow_rate = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+
+# Nearest neighbours of stored analyses (/similar), in z-score space of the active model's feature stats
+similarity_index = SimilarityIndex(
+    SessionLocal, lambda: model_registry.active().norms()[0],
+    path=SIMILARITY_INDEX_PATH,
+    merge_rows=int(os.getenv("SIMILARITY_MERGE_ROWS", "4096")),
+    refresh_s=float(os.getenv("SIMILARITY_REFRESH_S", "1")),
+    gap_ttl_s=float(os.getenv("SIMILARITY_GAP_TTL_S", "600")),
+)
+crud.add_created_listener(similarity_index.notify)
 
 # ------------------------------
-# 3. Fuzzy membership + class specs (copied verbatim)
+# 3. Fuzzy membership + class specs
 # ------------------------------
+# membership/assign_planet_type_multi are the original per-row rules, kept as the
+# reference for fuzzy_engine (tests/test_fuzzy_engine.py, benchmarks/fuzzy.py);
+# scoring itself only uses fuzzy_engine.
 def membership(value, prim_min=None, prim_max=None, soft_min=None, soft_max=None):
+    import pandas as pd # type: ignore
     if pd.isna(value):
         return 0.0
     if (prim_min is not None) and (prim_max is not None):
@@ -203,6 +276,9 @@ def assign_planet_type_multi(row: Dict[str, Any]) -> Tuple[str, Dict[str, float]
     best_cls = max(scores, key=scores.get)
     return best_cls, scores
 
+# Compiled once at startup; used for batch scoring (same scores as assign_planet_type_multi)
+fuzzy_engine = FuzzyRuleEngine(CLASS_SPECS, PLANET_FEATURE_ORDER)
+
 # ------------------------------
 # 4. Request model (Pydantic)
 # ------------------------------
@@ -219,37 +295,101 @@ class PredictRequest(BaseModel):
 # ------------------------------
 # 5. Utility helpers (kept logic same)
 # ------------------------------
-def compute_zscores(sample: np.ndarray, feature_keys: list) -> Tuple[Dict[str, float], Dict[str, float]]:
-    z_scores = {}
-    stats_out = {}
-    for i, key in enumerate(feature_keys):
-        val = float(sample[0][i])
-        mean_val = float(means[key])
-        std_val = float(stds[key]) if stds[key] != 0 else 1.0
-        z = (val - mean_val) / std_val
-        z_scores[key] = z
-        stats_out[key] = {"value": val, "mean": mean_val, "std": std_val, "z": z}
-    return z_scores, stats_out
-
 def reliability_label_from_score(score: float) -> str:
-    if score > 0.8:
-        return "High"
-    elif score > 0.5:
-        return "Medium"
-    else:
-        return "Low"
+    return reliability_label(score)  # thresholds shared with services/result_store.py
 
-def safe_generate_gemini(prompt: str, model_name: str = "gemini-2.0-flash") -> str:
-    """Call Gemini and return text. If Gemini is not configured, return a placeholder."""
-    if not GEMINI_KEY:
-        return "(Gemini API key not configured — no text available)"
-    try:
-        gm = genai.GenerativeModel(model_name)
-        resp = gm.generate_content(prompt)
-        return getattr(resp, "text", str(resp))
-    except Exception as e:
-        logger.exception("Gemini call failed")
-        return f"(Gemini call failed: {str(e)})"
+async def safe_generate_gemini(prompt: str, model_name: str = "gemini-2.0-flash", use_cache: bool = True) -> str:
+    """Call Gemini off the event loop and return text (placeholder text if unconfigured/failed/timed out)."""
+    return await explainer.generate(prompt, model_name, use_cache=use_cache)
+
+# ------------------------------
+# 5b. Vectorized scoring (whole feature matrix in one pass)
+# ------------------------------
+def score_batch(X: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Score an (N x 8) KOI feature matrix in one pass.
+    Returns one result dict per row, shaped like /predict minus the Gemini text.
+    """
+    X = np.asarray(X, dtype=float)
+    bundle = model_registry.active()  # one version for the whole batch, even if a swap happens meanwhile
+    with timings.stage("koi_inference"):
+        codes, proba = bundle.koi.predict(X)
+        confidence = proba.max(axis=1)
+    model_registry.shadow(X, codes, confidence, bundle)
+
+    with timings.stage("zscores"):
+        koi_norm, planet_norm = bundle.norms()
+        koi_z = koi_norm.score(X)
+        reliability = koi_z.reliability(confidence)
+
+    with timings.stage("importance"):
+        importance_pretty = bundle.koi.importance
+        labels = [class_map.get(int(c), f"Unknown ({int(c)})") for c in codes]
+
+    # Planet-type stage only for rows predicted "Exoplanet"
+    exo_rows = np.flatnonzero(np.array([lbl == "Exoplanet" for lbl in labels], dtype=bool))
+    planet_out: Dict[int, Dict[str, Any]] = {}
+    assemble_s = 0.0
+    if exo_rows.size:
+        XP = X[exo_rows][:, PLANET_FEATURE_IDX]
+        with timings.stage("planet_inference"):
+            p_codes, p_proba = bundle.planet.predict(XP)
+            planet_z = planet_norm.score(XP)
+        with timings.stage("fuzzy_rules"):
+            rule_types, rule_score_rows = fuzzy_engine.assign(XP)
+
+        assemble_start = time.perf_counter()
+        for j, i in enumerate(exo_rows):
+            rule_type, rule_scores = rule_types[j], rule_score_rows[j]
+            ml_code = int(p_codes[j])
+            ml_planet_type = planet_class_map.get(ml_code, f"Unknown({ml_code})")
+            rel_planet = float(p_proba[j].max()) * float(rule_scores.get(ml_planet_type, 0.0)) * float(planet_z.decay[j])
+            planet_out[int(i)] = {
+                "ml_prediction": ml_planet_type,
+                "ml_code": ml_code,
+                "ml_probabilities": dict(zip(planet_class_map.values(), map(float, p_proba[j]))),
+                "rule_based_prediction": rule_type,
+                "rule_scores": rule_scores,
+                "agreement": ml_planet_type == rule_type,
+                "gemini_planet_explanation": None,
+                "planet_z_scores": planet_z.z_dict(j),
+                "planet_stats": planet_z.stats_dict(j),
+                "planet_outliers": planet_z.outlier_list(j),
+                "planet_extreme_outlier": bool(planet_z.extreme[j]),
+                "planet_reliability": {"score": rel_planet, "label": reliability_label_from_score(rel_planet)},
+            }
+        assemble_s = time.perf_counter() - assemble_start
+
+    assemble_start = time.perf_counter()
+    results = []
+    for i in range(X.shape[0]):
+        payload: Dict[str, Any] = {
+            "prediction": labels[i],
+            "prediction_code": int(codes[i]),
+            "probabilities": dict(zip(class_map.values(), map(float, proba[i]))),
+            "confidence": float(confidence[i]),
+            "reliability": {"score": float(reliability[i]),
+                            "label": reliability_label_from_score(float(reliability[i]))},
+            "z_scores": koi_z.z_dict(i),
+            "stats": koi_z.stats_dict(i),
+            "outliers": koi_z.outlier_list(i),
+            "extreme_outlier": bool(koi_z.extreme[i]),
+            "feature_importance": importance_pretty,
+            "gemini_koi_explanation": None,
+            "model_version": bundle.version,
+        }
+        if i in planet_out:
+            payload["planet_type"] = planet_out[i]
+        results.append(payload)
+    timings.record("assemble", assemble_s + time.perf_counter() - assemble_start)
+    return results
+
+# Concurrent /predict calls are scored together (see services/batcher.py)
+predict_batcher = MicroBatcher(
+    score_batch,
+    max_batch_size=int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "2")),
+)
 
 # ------------------------------
 # 6. Main predict endpoint (keeps both Gemini calls)
@@ -259,8 +399,14 @@ def safe_generate_gemini(prompt: str, model_name: str = "gemini-2.0-flash") -> s
 async def home():
     return {"message": "Welcome to Prismiq API!"}
 
-@app.post("/predict")
-async def predict(req: PredictRequest):
+# Memoized payloads for repeated feature vectors (PREDICT_CACHE=off disables it)
+result_cache = None if os.getenv("PREDICT_CACHE", "on").lower() in ("0", "off", "false") else ResultCache(
+    max_entries=int(os.getenv("PREDICT_CACHE_SIZE", "4096")),
+    max_bytes=int(float(os.getenv("PREDICT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+)
+
+async def score_request(req: PredictRequest, bypass_cache: bool = False) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Model stage of /predict: (sample, payload without Gemini text)."""
     # Build sample in the same order as training
     sample = np.array([[
         req.koi_period,
@@ -273,39 +419,41 @@ async def predict(req: PredictRequest):
         req.koi_model_snr
     ]])
 
-    # KOI model prediction
+    # Same features + same model artifacts -> same payload, no model call needed
+    generation = key = None
+    if result_cache is not None and not bypass_cache:
+        try:
+            generation = model_registry.active().signature()
+        except ModelUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        key = feature_key(sample[0])
+        with timings.stage("result_cache"):
+            cached = result_cache.get(generation, key)
+        if cached is not None:
+            return sample, cached
+
+    # KOI + planet-type models, z-scores and fuzzy rules (micro-batched with concurrent calls)
     try:
-        pred = int(model.predict(sample)[0])
-        proba = model.predict_proba(sample)[0].tolist()
-        pred_label = class_map.get(pred, f"Unknown ({pred})")
-        confidence = float(max(proba))
+        # queue wait + batch scoring; the per-stage split is only in the (per batch) histograms
+        response_payload: Dict[str, Any] = await timings.timed("inference", predict_batcher.submit(sample[0]))
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        logger.exception("KOI model prediction failed")
+        logger.exception("Model prediction failed")
         raise HTTPException(status_code=500, detail=str(e))
-
-    # Statistical analysis (KOI features)
-    z_scores, stats_out = compute_zscores(sample, FEATURE_ORDER)
-    flags = [(k, v) for k, v in z_scores.items() if abs(v) > 3]
-    extreme = any(abs(v) > 5 for v in z_scores.values())
-
-    n_outliers = len(flags)
-    reliability_score = confidence * float(np.exp(-0.15 * n_outliers))
-    reliability_label = reliability_label_from_score(reliability_score)
-
-    # Global importance mapping (try to preserve original mapping behavior)
-    try:
-        importance = model.get_booster().get_score(importance_type="weight")
-    except Exception:
-        # fallback if model is not xgboost or missing booster
-        importance = {}
-    importance_pretty = {}
-    for k, v in importance.items():
-        if str(k).startswith("f"):
-            idx = int(k[1:])
-            fname = FEATURE_PRETTY[idx] if idx < len(FEATURE_PRETTY) else k
-        else:
-            fname = k
-        importance_pretty[fname] = float(v)
+    if key is not None and response_payload.get("model_version") == generation[0]:
+        result_cache.put(generation, key, response_payload)  # stored before callers add Gemini text
+    return sample, response_payload
+
+def build_prompts(response_payload: Dict[str, Any], sample: np.ndarray) -> Tuple[str, str | None]:
+    """KOI prompt, plus the planet-type prompt when the object is an Exoplanet."""
+    pred_label = response_payload["prediction"]
+    proba = list(response_payload["probabilities"].values())
+    reliability_score = response_payload["reliability"]["score"]
+    reliability_label = response_payload["reliability"]["label"]
+    importance_pretty = response_payload["feature_importance"]
+    stats_out = response_payload["stats"]
+    flags = [(o["feature"], o["z"]) for o in response_payload["outliers"]]
 
     # First Gemini explanation (KOI classification)
     outlier_summary = "None"
@@ -331,163 +479,366 @@ Please provide a scientific explanation for why this object was classified as {p
 Keep it clear, technical, and astronomy-focused.
 """
 
-    gemini_koi_text = safe_generate_gemini(prompt_koi)
-
-    response_payload: Dict[str, Any] = {
-        "prediction": pred_label,
-        "prediction_code": pred,
-        "probabilities": dict(zip(class_map.values(), map(float, proba))),
-        "confidence": confidence,
-        "reliability": {"score": reliability_score, "label": reliability_label},
-        "z_scores": {k: float(v) for k, v in z_scores.items()},
-        "stats": stats_out,
-        "outliers": [{"feature": k, "z": float(v)} for k, v in flags],
-        "extreme_outlier": extreme,
-        "feature_importance": importance_pretty,
-        "gemini_koi_explanation": gemini_koi_text
-    }
-
     # ------------------------------
     # Planet type stage (only if Exoplanet)
     # ------------------------------
-    if pred_label == "Exoplanet":
-        planet_features = [
-            float(sample[0][0]),  # koi_period
-            float(sample[0][1]),  # koi_duration
-            float(sample[0][2]),  # koi_depth
-            float(sample[0][3]),  # koi_prad
-            float(sample[0][4]),  # koi_sma
-            float(sample[0][6])   # koi_teq (skip inclination/index 5)
-        ]
-        planet_sample = np.array([planet_features])
-
-        try:
-            planet_pred = int(planet_model.predict(planet_sample)[0])
-            planet_proba = planet_model.predict_proba(planet_sample)[0].tolist()
-            ml_planet_type = planet_class_map.get(planet_pred, f"Unknown({planet_pred})")
-        except Exception as e:
-            logger.exception("Planet model prediction failed")
-            raise HTTPException(status_code=500, detail=str(e))
-
-        # Rule-based classification (identical logic)
-        row_dict = {
-            "koi_period": float(sample[0][0]),
-            "koi_duration": float(sample[0][1]),
-            "koi_depth": float(sample[0][2]),
-            "koi_prad": float(sample[0][3]),
-            "koi_sma": float(sample[0][4]),
-            "koi_teq": float(sample[0][6])
-        }
-        rule_type, rule_scores = assign_planet_type_multi(row_dict)
+    planet = response_payload.get("planet_type")
+    if planet is None:
+        return prompt_koi, None
 
-        # Planet z-scores
-        planet_keys = ["koi_period", "koi_duration", "koi_depth", "koi_prad", "koi_sma", "koi_teq"]
-        z_scores_planet, stats_planet = compute_zscores(np.array([planet_features]), planet_keys)
-        flags_planet = [(k, v) for k, v in z_scores_planet.items() if abs(v) > 3]
-        extreme_planet = any(abs(v) > 5 for v in z_scores_planet.values())
+    row_dict = dict(zip(PLANET_FEATURE_ORDER, map(float, sample[0][PLANET_FEATURE_IDX])))
 
-        n_out_planet = len(flags_planet)
-        reliability_planet = float(max(planet_proba)) * float(rule_scores.get(ml_planet_type, 0.0)) * float(np.exp(-0.15 * n_out_planet))
-        rel_label = reliability_label_from_score(reliability_planet)
-
-        # Second Gemini call: planet-type explanation (kept intact)
-        prompt_planet = f"""
+    # Second Gemini call: planet-type explanation (kept intact)
+    prompt_planet = f"""
 The Exoplanet was detected. Two systems classified its type:
-- ML Model → {ml_planet_type}, probabilities {dict(zip(planet_class_map.values(), planet_proba))}.
-- Rule-based fuzzy system → {rule_type}, scores {rule_scores}.
+- ML Model → {planet["ml_prediction"]}, probabilities {planet["ml_probabilities"]}.
+- Rule-based fuzzy system → {planet["rule_based_prediction"]}, scores {planet["rule_scores"]}.
 Features used: {row_dict}.
 Please give a clear astronomy-focused explanation of why they agree/disagree, which features influenced both systems, and what type is more likely.
 """
+    return prompt_koi, prompt_planet
 
-        gemini_planet_text = safe_generate_gemini(prompt_planet)
-
-        response_payload["planet_type"] = {
-            "ml_prediction": ml_planet_type,
-            "ml_code": planet_pred,
-            "ml_probabilities": dict(zip(planet_class_map.values(), map(float, planet_proba))),
-            "rule_based_prediction": rule_type,
-            "rule_scores": rule_scores,
-            "agreement": ml_planet_type == rule_type,
-            "gemini_planet_explanation": gemini_planet_text,
-            "planet_z_scores": {k: float(v) for k, v in z_scores_planet.items()},
-            "planet_stats": stats_planet,
-            "planet_outliers": [{"feature": k, "z": float(v)} for k, v in flags_planet],
-            "planet_extreme_outlier": extreme_planet,
-            "planet_reliability": {"score": reliability_planet, "label": rel_label}
-        }
+@app.post("/predict")
+async def predict(req: PredictRequest, bypass_cache: bool = False):
+    timings.mark("validation")
+    sample, response_payload = await score_request(req, bypass_cache=bypass_cache)
+    with timings.stage("prompts"):
+        prompt_koi, prompt_planet = build_prompts(response_payload, sample)
+
+    if prompt_planet is not None:
+        # Both prompts are independent, so they run concurrently
+        koi_text, planet_text = await asyncio.gather(
+            timings.timed("gemini_koi", safe_generate_gemini(prompt_koi, use_cache=not bypass_cache)),
+            timings.timed("gemini_planet", safe_generate_gemini(prompt_planet, use_cache=not bypass_cache)),
+        )
+        response_payload["planet_type"]["gemini_planet_explanation"] = planet_text
+    else:
+        koi_text = await timings.timed("gemini_koi", safe_generate_gemini(prompt_koi, use_cache=not bypass_cache))
+
+    response_payload["gemini_koi_explanation"] = koi_text
 
     return response_payload
 
 # ------------------------------
 # 7. Metrics endpoints (preserve behaviour)
 # ------------------------------
+def metrics_payload(data) -> JsonPayload:
+    # ensure serializable formats (numpy -> list)
+    if isinstance(data, dict):
+        # convert numpy arrays in confusion matrix
+        cm = data.get("confusion_matrix")
+        if cm is not None:
+            data["confusion_matrix"] = (cm.tolist() if hasattr(cm, "tolist") else cm)
+    return JsonPayload(data)
+
+# serialized once, re-read only when the pickle's mtime/size changes
+koi_metrics = FileArtifact(KOI_METRICS_PATH, transform=metrics_payload)
+planet_metrics = FileArtifact(PLANET_METRICS_PATH, transform=metrics_payload)
+
+def artifact_response(artifact: FileArtifact, request: Request) -> Response:
+    payload = artifact.get()
+    # no-cache: browsers keep the body but revalidate, getting a 304 until the file changes
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if payload.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
 @app.get("/metrics/koi")
-async def get_koi_metrics():
+async def get_koi_metrics(request: Request):
     try:
-        data = joblib.load(KOI_METRICS_PATH)
-        # ensure serializable formats (numpy -> list)
-        if isinstance(data, dict):
-            # convert numpy arrays in confusion matrix
-            cm = data.get("confusion_matrix")
-            if cm is not None:
-                data["confusion_matrix"] = (cm.tolist() if hasattr(cm, "tolist") else cm)
-        return data
+        return artifact_response(koi_metrics, request)
     except Exception as e:
         logger.exception("Failed to load KOI metrics")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/metrics/planet")
-async def get_planet_metrics():
+async def get_planet_metrics(request: Request):
     try:
-        data = joblib.load(PLANET_METRICS_PATH)
-        if isinstance(data, dict):
-            cm = data.get("confusion_matrix")
-            if cm is not None:
-                data["confusion_matrix"] = (cm.tolist() if hasattr(cm, "tolist") else cm)
-        return data
+        return artifact_response(planet_metrics, request)
     except Exception as e:
         logger.exception("Failed to load planet metrics")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/upload", response_model=schemas.UploadResponse)
-async def upload_file(file: UploadFile = File(...), db=Depends(get_db)):
+@app.get("/metrics/batcher")
+async def get_batcher_metrics():
+    # queue depth + batch-size histogram for tuning PREDICT_BATCH_MAX_SIZE / _MAX_WAIT_MS
+    return predict_batcher.stats()
+
+@app.get("/metrics/explanation_cache")
+async def get_explanation_cache_metrics():
+    if explainer.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **explainer.cache.stats()}
+
+@app.get("/metrics/predict_cache")
+async def get_predict_cache_metrics():
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+@app.get("/metrics/prometheus")
+async def get_prometheus_metrics():
+    return Response(content=timings.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/change_feed")
+async def get_change_feed_metrics():
+    return change_feed.stats()
+
+async def read_upload_frame(file: UploadFile) -> "pd.DataFrame":
+    import pandas as pd # type: ignore
     contents = await file.read()
-
-    # --- Parse file ---
     if file.filename.endswith(".csv"):
-        df = pd.read_csv(io.BytesIO(contents))
+        return pd.read_csv(io.BytesIO(contents))
     elif file.filename.endswith(".json"):
-        df = pd.read_json(io.BytesIO(contents))
-    else:
-        raise HTTPException(400, "Only CSV/JSON supported")
+        return pd.read_json(io.BytesIO(contents))
+    raise HTTPException(400, "Only CSV/JSON supported")
+
+def feature_matrix(df: "pd.DataFrame") -> Tuple[np.ndarray, np.ndarray]:
+    """(X of scorable rows, boolean mask of which input rows were scorable)."""
+    missing = [k for k in FEATURE_ORDER if k not in df.columns]
+    if missing:
+        raise HTTPException(400, f"Missing feature columns: {missing}")
+
+    # --- Rows with missing/non-numeric features can't be scored ---
+    import pandas as pd # type: ignore
+    feats = df[FEATURE_ORDER].apply(pd.to_numeric, errors="coerce")
+    valid = feats.notna().all(axis=1).to_numpy()
+    return feats.to_numpy(dtype=float)[valid], valid
+
+def analysis_rows(X: np.ndarray, raw_results: List[Dict[str, Any]]) -> List[Tuple[dict, dict, None]]:
+    """(features, result, explanation) rows for crud.create_analyses_bulk."""
+    return [(dict(zip(FEATURE_ORDER, map(float, x))), r, None) for x, r in zip(X, raw_results)]
+
+def save_analysis(db, features: dict, raw_result: Dict[str, Any], explanation: str | None):
+    with timings.stage("db_write"):
+        db_obj = crud.create_analysis(db, features, raw_result, explanation)
+    timings.set_analysis(db_obj.id)
+    return db_obj
+
+def analysis_prompts(db, db_obj) -> Tuple[str, str | None]:
+    """build_prompts for a stored analysis (a deferred explanation resumed by explanation_worker)."""
+    features = crud.analysis_features(db_obj)
+    sample = np.array([[float(features[k]) for k in FEATURE_ORDER]])
+    return build_prompts(crud.analysis_result(db, db_obj), sample)
+
+async def predict_deferred(req: PredictRequest, features: dict, db, bypass_cache: bool = False) -> Dict[str, Any]:
+    """Persist the model result right away; the Gemini text is filled in by explanation_worker."""
+    sample, raw_result = await score_request(req, bypass_cache=bypass_cache)
+    with timings.stage("prompts"):
+        prompt_koi, prompt_planet = build_prompts(raw_result, sample)
+    raw_result["explanation_status"] = "pending"
+
+    db_obj = save_analysis(db, features, raw_result, None)
+    explanation_worker.submit(db_obj.id, prompt_koi, prompt_planet, use_cache=not bypass_cache)
+
+    return format_upload_response(raw_result, db_obj.id)
+
+@app.post("/upload", response_model=schemas.UploadResponse)
+async def upload_file(file: UploadFile = File(...), bypass_cache: bool = False,
+                      defer_explanation: bool = False, db=Depends(get_db)):
+    timings.mark("validation")
+    # --- Parse file ---
+    with timings.stage("parse_upload"):
+        df = await read_upload_frame(file)
 
     # --- Take first row as features ---
     features = df.iloc[0].to_dict()
 
+    if defer_explanation:
+        return await predict_deferred(PredictRequest(**features), features, db, bypass_cache=bypass_cache)
+
     # --- Run prediction ---
-    raw_result = await predict(PredictRequest(**features))  # reuse predict endpoint
+    raw_result = await predict(PredictRequest(**features), bypass_cache=bypass_cache)  # reuse predict endpoint
 
     # --- Extract Gemini explanation (if any) ---
     explanation = raw_result.get("gemini_koi_explanation", "")
 
     # --- Save to DB (ensure your CRUD accepts these args) ---
-    db_obj = crud.create_analysis(db, features, raw_result, explanation)
+    db_obj = save_analysis(db, features, raw_result, explanation)
 
     # --- Shape response ---
     shaped = format_upload_response(raw_result, db_obj.id)
 
     return shaped
 
+@app.post("/predict_batch", response_model=schemas.BatchUploadResponse)
+async def predict_batch(file: UploadFile = File(...), persist: bool = True, db=Depends(get_db)):
+    timings.mark("validation")
+    with timings.stage("parse_upload"):
+        df = await read_upload_frame(file)
+        X, valid = feature_matrix(df)
+
+    start = time.perf_counter()
+    try:
+        raw_results = await asyncio.to_thread(score_batch, X) if len(X) else []
+    except Exception as e:
+        logger.exception("Batch prediction failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    ids: List[int | None] = [None] * len(raw_results)
+    if persist and raw_results:
+        with timings.stage("db_write"):
+            ids = await asyncio.to_thread(crud.create_analyses_bulk, db, analysis_rows(X, raw_results))
+    elapsed = time.perf_counter() - start
+
+    logger.info("Scored %d rows in %.3fs (%.0f rows/s)", len(raw_results), elapsed,
+                len(raw_results) / elapsed if elapsed > 0 else 0.0)
+    return format_batch_response(raw_results, ids, elapsed, skipped=int((~valid).sum()))
+
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))
+
+def _ingest_chunk(df: "pd.DataFrame", db) -> Tuple[int, int, List[int]]:
+    """Score + persist one chunk -> (rows scored, rows skipped, analysis ids)."""
+    X, valid = feature_matrix(df)
+    if not len(X):
+        return 0, int((~valid).sum()), []
+    raw_results = score_batch(X)
+    return len(raw_results), int((~valid).sum()), crud.create_analyses_bulk(db, analysis_rows(X, raw_results))
+
+@app.post("/predict_batch/stream", response_model=schemas.IngestResponse)
+async def predict_batch_stream(file: UploadFile = File(...), db=Depends(get_db)):
+    """
+    Bounded-memory variant of /predict_batch for large CSV / JSON Lines catalogs:
+    each chunk of INGEST_CHUNK_ROWS rows is parsed, scored and persisted before
+    the next one is read. Only totals are returned.
+    """
+    try:
+        reader = open_chunk_reader(file.file, file.filename, INGEST_CHUNK_ROWS)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    totals = {"rows": 0, "skipped_rows": 0, "chunks": 0,
+              "first_analysis_id": None, "last_analysis_id": None}
+    start = time.perf_counter()
+    try:
+        while True:
+            df = await asyncio.to_thread(next, reader, None)
+            if df is None:
+                break
+            n_rows, n_skipped, ids = await asyncio.to_thread(_ingest_chunk, df, db)
+            totals["rows"] += n_rows
+            totals["skipped_rows"] += n_skipped
+            totals["chunks"] += 1
+            if ids:
+                totals["first_analysis_id"] = totals["first_analysis_id"] or ids[0]
+                totals["last_analysis_id"] = ids[-1]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Streaming ingest failed after %d rows", totals["rows"])
+        raise HTTPException(status_code=500, detail=f"Ingest failed after {totals['rows']} rows: {e}")
+    elapsed = time.perf_counter() - start
+
+    logger.info("Ingested %d rows in %d chunks in %.3fs", totals["rows"], totals["chunks"], elapsed)
+    return {
+        **totals,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(totals["rows"] / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+# ------------------------------
+# Background batch jobs (/jobs): sharded, scored in a process pool, cancellable and resumable
+# ------------------------------
+def job_shard(df: "pd.DataFrame") -> Tuple[np.ndarray, int]:
+    X, valid = feature_matrix(df)
+    return X, int((~valid).sum())
+
+def job_worker_init():
+    """Runs once in each job pool process: load the active model before the first shard arrives."""
+    model_registry.active()
+
+job_manager = JobManager(
+    SessionLocal,
+    os.getenv("JOBS_DIR", "jobs_store"),
+    prepare=job_shard,
+    score_fn=score_batch,
+    to_rows=analysis_rows,
+    shard_rows=int(os.getenv("JOB_SHARD_ROWS", "5000")),
+    workers=int(os.getenv("JOB_WORKERS", "0")) or None,
+    initializer=job_worker_init,
+    stale_s=float(os.getenv("JOB_STALE_S", "60")),
+    keep_upload_s=float(os.getenv("JOB_UPLOAD_TTL_S", "3600")),
+)
+
+def _job_or_404(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs", response_model=schemas.JobResponse, status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """Score a CSV / JSON Lines catalog in the background; poll GET /jobs/{job_id} or ws /ws/jobs/{job_id}."""
+    try:
+        job = await job_manager.submit(file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return format_job_response(job)
+
+@app.get("/jobs", response_model=list[schemas.JobResponse])
+def list_jobs(limit: int = 20, status: str | None = None, db=Depends(get_db)):
+    return [format_job_response(job) for job in crud.get_jobs(db, limit=min(limit, 100), status=status)]
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobResponse)
+def get_job(job_id: str):
+    return format_job_response(_job_or_404(job_id))
+
+@app.post("/jobs/{job_id}/cancel", response_model=schemas.JobResponse)
+async def cancel_job(job_id: str):
+    await asyncio.to_thread(_job_or_404, job_id)
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return format_job_response(await asyncio.to_thread(job_manager.get, job_id))
+
+@app.post("/jobs/{job_id}/resume", response_model=schemas.JobResponse)
+async def resume_job(job_id: str):
+    await asyncio.to_thread(_job_or_404, job_id)
+    if not await job_manager.resume(job_id):
+        raise HTTPException(status_code=409, detail="Only cancelled or failed jobs can be resumed, "
+                                                    "within JOB_UPLOAD_TTL_S of stopping")
+    return format_job_response(await asyncio.to_thread(job_manager.get, job_id))
+
+@app.websocket("/ws/jobs/{job_id}")
+async def ws_job(websocket: WebSocket, job_id: str):
+    """Sends the job's status whenever it changes (at least every second for jobs run by another worker)."""
+    await websocket.accept()
+    last = None
+    try:
+        while True:
+            fut = job_manager.subscribe(job_id)  # before reading so no update slips in between
+            try:
+                job = await asyncio.to_thread(job_manager.get, job_id)
+                if job is None:
+                    await websocket.send_json({"job_id": job_id, "error": "Job not found"})
+                    break
+                payload = format_job_response(job)
+                if payload != last:
+                    await websocket.send_json(payload)
+                    last = payload
+                if job.status in TERMINAL_STATUSES:
+                    break
+                await asyncio.wait([fut], timeout=1.0)
+            finally:
+                job_manager.unsubscribe(job_id, fut)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @app.post("/predict_manual", response_model=schemas.UploadResponse)
-async def predict_manual(req: PredictRequest, db=Depends(get_db)):
+async def predict_manual(req: PredictRequest, bypass_cache: bool = False,
+                         defer_explanation: bool = False, db=Depends(get_db)):
+    timings.mark("validation")
+    if defer_explanation:
+        return await predict_deferred(req, req.dict(), db, bypass_cache=bypass_cache)
+
     # 🔥 Run prediction logic using existing function
-    raw_result = await predict(req)
+    raw_result = await predict(req, bypass_cache=bypass_cache)
 
     # --- Extract Gemini explanation (if any) ---
     explanation = raw_result.get("gemini_koi_explanation", "")
 
     # --- Save to DB (same as upload) ---
-    db_obj = crud.create_analysis(db, req.dict(), raw_result, explanation)
+    db_obj = save_analysis(db, req.dict(), raw_result, explanation)
 
     # --- Shape response (same format as /upload) ---
     shaped = format_upload_response(raw_result, db_obj.id)
@@ -495,11 +846,47 @@ async def predict_manual(req: PredictRequest, db=Depends(get_db)):
     return shaped
 
 
+def keyset_page(fetch, cursor: str, limit: int, sort: str = "created_at",
+                order: str = "desc") -> Tuple[list, str | None]:
+    """
+    One page after the opaque cursor ('' = first page), plus the cursor of the page after it.
+    fetch(after_id, limit) runs the query ordered by (sort, id) `order`; cursors of another order are a 400.
+    """
+    try:
+        after_id = decode_cursor(cursor, sort, order)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    db_objs = fetch(after_id, limit + 1)
+    next_cursor = encode_cursor(db_objs[limit - 1], sort, order) if len(db_objs) > limit else None
+    return db_objs[:limit], next_cursor
+
 @app.get("/explorer")
-def get_explorer(page: int = 1, limit: int = 30, db=Depends(get_db)):
+def get_explorer(response: Response, page: int = 1, limit: int = 30, cursor: str | None = None,
+                 prediction: str | None = None, reliability: str | None = None,
+                 planet_type: str | None = None, min_outliers: int | None = None,
+                 max_outliers: int | None = None, sort: str = "created_at", order: str = "desc",
+                 db=Depends(get_db)):
+    if sort not in crud.SUMMARY_SORT_COLUMNS or order not in ("asc", "desc"):
+        raise HTTPException(400, f"sort must be one of {list(crud.SUMMARY_SORT_COLUMNS)}, order asc/desc")
+
+    # Filters/sorting run in SQL over the summary columns (no result JSON is loaded)
+    def fetch(after_id, n, skip=0):
+        return crud.get_analysis_summaries(
+            db, limit=n, skip=skip, after_id=after_id, prediction=prediction, reliability=reliability,
+            planet_type=planet_type, min_outliers=min_outliers, max_outliers=max_outliers,
+            sort=sort, descending=order == "desc",
+        )
+
+    # ?cursor= (empty for the first page) -> keyset pagination
+    if cursor is not None:
+        rows, next_cursor = keyset_page(fetch, cursor, limit, sort, order)
+        return {"results": format_explorer_response(rows), "next_cursor": next_cursor}
+
     skip = (page - 1) * limit
-    db_objs = crud.get_analyses(db, skip=skip, limit=limit)
-    shaped = format_explorer_response(db_objs)
+    rows = fetch(None, limit, skip=skip)
+    shaped = format_explorer_response(rows)
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1], sort, order)
 
     return shaped
 
@@ -509,47 +896,315 @@ def get_analysis_detail(analysis_id: int, db=Depends(get_db)):
     if not db_obj:
         raise HTTPException(404, "Not found")
 
-    raw = db_obj.result  # stored JSON
-    print("DEBUG RAW planet_type:", raw.get("planet_type"))
+    raw = crud.analysis_result(db, db_obj)  # rebuilt from the compact columns
 
     return format_analysis_response(raw)
 
-@app.get("/history", response_model=list[schemas.AnalysisResponse])
-def get_history(skip: int = 0, limit: int = 20, db=Depends(get_db)):
-    return crud.get_analyses(db, skip=skip, limit=limit)
+@app.get("/analysis/{analysis_id}/explanation", response_model=schemas.ExplanationResponse)
+def get_analysis_explanation(analysis_id: int, db=Depends(get_db)):
+    db_obj = crud.get_analysis(db, analysis_id)
+    if not db_obj:
+        raise HTTPException(404, "Not found")
+    return format_explanation_response(db_obj)
+
+def _load_explanation(analysis_id: int) -> Dict[str, Any] | None:
+    db = SessionLocal()
+    try:
+        db_obj = crud.get_analysis(db, analysis_id)
+        return format_explanation_response(db_obj) if db_obj else None
+    finally:
+        db.close()
+
+# 🔹 WebSocket push of a deferred explanation once it is ready
+@app.websocket("/ws/analysis/{analysis_id}/explanation")
+async def ws_analysis_explanation(websocket: WebSocket, analysis_id: int):
+    await websocket.accept()
+    ready = explanation_worker.subscribe(analysis_id)  # subscribe before reading to not miss the update
+    try:
+        current = await asyncio.to_thread(_load_explanation, analysis_id)
+        if current is None:
+            await websocket.send_json({"analysis_id": analysis_id, "status": "not_found"})
+        elif current["status"] != "pending":
+            await websocket.send_json(current)
+        else:
+            try:
+                await websocket.send_json(await asyncio.wait_for(ready, timeout=2 * explainer.timeout_s))
+            except asyncio.TimeoutError:
+                await websocket.send_json(current)
+    finally:
+        explanation_worker.unsubscribe(analysis_id, ready)
+        await websocket.close()
+
+@app.get("/history", response_model=list[schemas.AnalysisResponse] | schemas.AnalysisPage)
+def get_history(response: Response, skip: int = 0, limit: int = 20, cursor: str | None = None,
+                db=Depends(get_db)):
+    if cursor is not None:
+        db_objs, next_cursor = keyset_page(
+            lambda after_id, n: crud.get_analyses_after(db, after_id=after_id, limit=n), cursor, limit)
+        return {"results": [crud.analysis_record(db, o) for o in db_objs], "next_cursor": next_cursor}
+
+    db_objs = crud.get_analyses(db, skip=skip, limit=limit)
+    if len(db_objs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(db_objs[-1])
+    return [crud.analysis_record(db, o) for o in db_objs]
+
+# ------------------------------
+# Bulk export (streamed; memory stays at one batch whatever the row count)
+# ------------------------------
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+
+@app.get("/export")
+def export_analyses(format: str = "csv", columns: str | None = None,
+                    since: datetime | None = None, until: datetime | None = None):
+    """
+    All analyses in id order as CSV, NDJSON or Parquet (one row group per
+    EXPORT_BATCH_ROWS). ?columns=id,prediction,... picks columns (see
+    services/export.py); ?since=/?until= filter on created_at (UTC if no offset).
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(400, f"format must be one of {list(EXPORT_FORMATS)}")
+    selected = columns.split(",") if columns else list(DEFAULT_COLUMNS)
+    unknown = [c for c in selected if c not in EXPORT_COLUMNS]
+    if unknown or len(set(selected)) != len(selected):
+        raise HTTPException(400, f"columns must be distinct names from {list(EXPORT_COLUMNS)}")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(501, "Parquet export needs pyarrow (pip install pyarrow)")
+
+    def stream():
+        db = SessionLocal()  # get_db's session is closed once this function returns
+        try:
+            batches = crud.iter_export_rows(db, selected, since, until, batch_size=EXPORT_BATCH_ROWS)
+            yield from WRITERS[format](selected, batches)
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="analyses.{format}"'})
+
+# ------------------------------
+# Similarity search (KD-tree over z-scored features, services/similarity.py)
+# ------------------------------
+SIMILAR_MAX_K = 100
+
+def _similar(db, features: List[float], k: int, exclude_id: int | None = None):
+    if not 1 <= k <= SIMILAR_MAX_K:
+        raise HTTPException(400, f"k must be between 1 and {SIMILAR_MAX_K}")
+    try:
+        neighbours = similarity_index.search(features, k, exclude_id=exclude_id)
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    rows = crud.get_analysis_summaries_by_ids(db, [i for i, _ in neighbours])
+    return {"results": format_similar_response(rows, neighbours)}
+
+@app.get("/analysis/{analysis_id}/similar")
+def get_similar_analyses(analysis_id: int, k: int = 20, db=Depends(get_db)):
+    """The k stored analyses closest to this one (Euclidean distance over z-scored features)."""
+    db_obj = crud.get_analysis(db, analysis_id)
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    features = crud.analysis_features(db_obj)
+    if any(features.get(key) is None for key in FEATURE_ORDER):
+        raise HTTPException(status_code=422, detail="Analysis has no complete feature vector")
+    return _similar(db, [float(features[key]) for key in FEATURE_ORDER], k, exclude_id=analysis_id)
+
+@app.get("/similar")
+def get_similar(features: str, k: int = 20, db=Depends(get_db)):
+    """?features=<8 comma-separated values in FEATURE_ORDER>: the k closest stored analyses."""
+    try:
+        values = [float(v) for v in features.split(",")]
+    except ValueError:
+        raise HTTPException(400, "features must be comma-separated numbers")
+    if len(values) != len(FEATURE_ORDER) or not all(np.isfinite(values)):
+        raise HTTPException(400, f"features must be {len(FEATURE_ORDER)} finite values: {', '.join(FEATURE_ORDER)}")
+    return _similar(db, values, k)
+
+# ------------------------------
+# Aggregate statistics (rollup counters kept up to date by every insert)
+# ------------------------------
+@app.get("/stats/summary")
+def get_stats_summary(bucket: str | None = None, buckets: int = 24, db=Depends(get_db)):
+    """Counts per prediction / planet type / reliability / outlier bucket; ?bucket=hour|day adds a time series."""
+    if bucket is not None and bucket not in rollups.PERIODS:
+        raise HTTPException(400, f"bucket must be one of {list(rollups.PERIODS)}")
+    if not 1 <= buckets <= 1000:
+        raise HTTPException(400, "buckets must be between 1 and 1000")
+    totals = rollups.summarize(crud.get_rollups(db, "all")).get("", rollups.empty_summary())
+    if bucket is None:
+        return format_stats_summary(totals)
+
+    starts = rollups.bucket_starts(bucket, buckets, datetime.now(timezone.utc))
+    by_bucket = rollups.summarize(crud.get_rollups(db, bucket, starts[0], starts[-1]))
+    series = [(rollups.bucket_start_iso(b, bucket), by_bucket.get(b, rollups.empty_summary())) for b in starts]
+    return format_stats_summary(totals, bucket, series)
+
+
+STAGE_LABELS = {
+    "validation": "Validating input",
+    "parse_upload": "Parsing uploaded file",
+    "result_cache": "Checking result cache",
+    "inference": "Running KOI + planet classifiers",
+    "koi_inference": "Running KOI classifier",
+    "zscores": "Computing z-scores",
+    "importance": "Mapping feature importance",
+    "planet_inference": "Running planet classifier",
+    "fuzzy_rules": "Applying fuzzy planet-type rules",
+    "assemble": "Assembling results",
+    "prompts": "Preparing explanation prompts",
+    "gemini_koi": "Fetching Gemini explanation (classification)",
+    "gemini_planet": "Fetching Gemini explanation (planet type)",
+    "db_write": "Saving analysis",
+}
 
+def log_line(event: Tuple) -> str:
+    if event[0] == "stage":
+        _, name, seconds = event
+        return f"{STAGE_LABELS.get(name, name)}... {seconds * 1000:.1f} ms"
+    if event[0] == "analysis":
+        return f"Saved as analysis #{event[1]}"
+    return "Analysis complete ✅" if event[1] < 400 else f"Analysis failed (HTTP {event[1]}) ❌"
+
+WS_LOGS_IDLE_S = float(os.getenv("WS_LOGS_IDLE_S", "60"))
+
+async def _next_event(websocket: WebSocket, queue: asyncio.Queue) -> Tuple | None:
+    """The next trace event; None once the client disconnects or nothing arrives for WS_LOGS_IDLE_S."""
+    getter = asyncio.ensure_future(queue.get())
+    receiver = asyncio.ensure_future(websocket.receive())  # client messages are ignored, except a disconnect
+    try:
+        deadline = time.monotonic() + WS_LOGS_IDLE_S
+        while True:
+            done, _ = await asyncio.wait({getter, receiver}, timeout=max(0.0, deadline - time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                return getter.result()
+            if receiver not in done or receiver.result()["type"] == "websocket.disconnect":
+                return None
+            receiver = asyncio.ensure_future(websocket.receive())
+    finally:
+        getter.cancel()
+        receiver.cancel()
 
 @app.websocket("/ws/logs")
-async def websocket_logs(websocket: WebSocket):
+async def websocket_logs(websocket: WebSocket, trace_id: str | None = None, analysis_id: int | None = None):
+    """
+    Real stage progress of one request. Without parameters a new trace id is sent
+    first ("X-Trace-Id: <id>"); the stages of the request that sends it in its
+    X-Trace-Id header follow. ?trace_id= (the X-Trace-Id returned by /predict,
+    /predict_manual or /upload) or ?analysis_id= replays a recent request.
+    """
     await websocket.accept()
-    steps = [
-        "Validating input...",
-        "Preprocessing features...",
-        "Running KOI classifier...",
-        "Running Planet classifier...",
-        "Fetching Gemini explanation...",
-        "Finalizing results..."
-    ]
-    for step in steps:
-        await websocket.send_text(step)
-        await asyncio.sleep(1)
-    await websocket.send_text("Analysis complete ✅")
-    await websocket.close()
+    if trace_id is None and analysis_id is None:
+        trace_id, queue = timings.reserve()
+        replay: List[Tuple] = []
+        await websocket.send_text(f"X-Trace-Id: {trace_id}")
+    else:
+        trace_id, queue, replay = timings.subscribe(trace_id, analysis_id)
+        if not trace_id:
+            await websocket.send_text("No recent trace for this " + ("trace id" if analysis_id is None else f"analysis {analysis_id}"))
+            await websocket.close()
+            return
+    try:
+        for event in replay:
+            await websocket.send_text(log_line(event))
+        while not replay or replay[-1][0] != "done":
+            event = await _next_event(websocket, queue)
+            if event is None:
+                break
+            replay.append(event)
+            await websocket.send_text(log_line(event))
+        if websocket.client_state != WebSocketState.DISCONNECTED:
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        timings.unsubscribe(trace_id, queue)
 
 # 🔹 WebSocket for real-time explorer updates
+def _explorer_snapshot(limit: int = 20) -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        return format_explorer_response(crud.get_analysis_summaries(db, limit=limit))
+    finally:
+        db.close()
+
 @app.websocket("/ws/explorer")
-async def ws_explorer(websocket: WebSocket, db=Depends(get_db)):
+async def ws_explorer(websocket: WebSocket):
+    """
+    Sends the latest page once ({"type": "snapshot"}), then only newly created
+    analyses ({"type": "delta"}). A client that falls behind gets a fresh
+    snapshot instead of its backlog.
+    """
     await websocket.accept()
-    while True:
-        db_objs = crud.get_analyses(db, skip=0, limit=20)
-        shaped = format_explorer_response(db_objs)
-        await websocket.send_json(shaped)
+    sub = change_feed.subscribe()  # before the snapshot so no insert slips between them
+    try:
+        await websocket.send_json({"type": "snapshot", "results": await asyncio.to_thread(_explorer_snapshot)})
+        while True:
+            rows = await sub.get()
+            if rows is RESYNC:
+                await websocket.send_json({"type": "snapshot", "results": await asyncio.to_thread(_explorer_snapshot)})
+                continue
+            delta = format_explorer_response(SimpleNamespace(**row) for row in reversed(rows))
+            await websocket.send_json({"type": "delta", "results": delta})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        change_feed.unsubscribe(sub)
+
+# ------------------------------
+# Pre-fork serving (serve.py)
+# ------------------------------
+def post_fork():
+    """
+    Per-worker state, called in each worker right after serve.py forks it.
+    Models, stats and libraries loaded by the parent stay shared; anything
+    holding sockets, threads or a process identity is recreated here.
+    """
+    reset_db_after_fork()
+    explainer.client = build_gemini_client()
+    job_manager.after_fork()
+
+# ------------------------------
+# Model admin (versions, hot-swap, shadow scoring)
+# ------------------------------
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # unset: /admin/* is disabled
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled (ADMIN_TOKEN is not set)")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/models")
+def get_models(_=Depends(require_admin)):
+    return model_registry.describe()
+
+@app.post("/admin/models/activate")
+def activate_model(req: schemas.ModelActivateRequest, _=Depends(require_admin)):
+    try:
+        model_registry.activate(req.version)
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return model_registry.describe()
+
+@app.post("/admin/models/shadow")
+def set_shadow_model(req: schemas.ShadowModelRequest, _=Depends(require_admin)):
+    try:
+        model_registry.set_shadow(req.version, req.sample_rate)
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return model_registry.describe()
+
+@app.post("/admin/stats/rebuild")
+def rebuild_stats(db=Depends(get_db), _=Depends(require_admin)):
+    """Recompute the /stats/summary counters from the analyses table."""
+    return {"analyses": crud.rebuild_rollups(db)}
 
 @app.post("/reset_db")
 def reset_db():
     try:
         with engine.begin() as conn:
             conn.execute(text("TRUNCATE TABLE analyses RESTART IDENTITY CASCADE;"))
+            conn.execute(text("TRUNCATE TABLE analysis_rollups;"))
+        similarity_index.clear()
         return {"status": "success", "message": "Analysis table reset successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,223 @@
+# migrations.py
+"""
+Idempotent schema migrations. Safe to run on every deploy:
+
+    python migrations.py
+"""
+import logging
+import os
+from types import SimpleNamespace
+from sqlalchemy import inspect, select, update # type: ignore
+import crud, models
+from db import engine as default_engine, SessionLocal
+from services import result_store
+
+logger = logging.getLogger("exoplanet_api")
+
+
+def create_tables(engine):
+    models.Base.metadata.create_all(bind=engine)
+
+
+def add_missing_columns(engine):
+    """create_all never alters existing tables, so add columns introduced later."""
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}")
+            logger.info("Added column %s.%s", table.name, column.name)
+
+
+def relax_not_null_columns(engine):
+    """Columns made nullable later (analyses.features/result) still have NOT NULL in existing tables."""
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        relaxed = [c["name"] for c in inspector.get_columns(table.name)
+                   if not c["nullable"] and c["name"] in table.c
+                   and table.c[c["name"]].nullable and not table.c[c["name"]].primary_key]
+        if not relaxed:
+            continue
+        if engine.dialect.name == "sqlite":
+            _rebuild_sqlite_table(engine, table)  # SQLite can't change a column's constraints
+        else:
+            with engine.begin() as conn:
+                for name in relaxed:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ALTER COLUMN {name} DROP NOT NULL")
+        logger.info("Dropped NOT NULL on %s.%s", table.name, ", ".join(relaxed))
+
+
+def _rebuild_sqlite_table(engine, table):
+    """Recreate `table` from the model and copy its rows (all columns exist after add_missing_columns)."""
+    old = f"{table.name}_old"
+    columns = ", ".join(c.name for c in table.columns)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old}")
+        indexes = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (old,)
+        ).scalars().all()
+        for index in indexes:  # they keep their names, which the new table's indexes reuse
+            conn.exec_driver_sql(f"DROP INDEX {index}")
+        table.create(conn)
+        conn.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old}")
+        conn.exec_driver_sql(f"DROP TABLE {old}")
+
+
+def create_missing_indexes(engine):
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def backfill_summary_columns(session_factory=SessionLocal, batch_size: int = 1000) -> int:
+    """Populate the denormalized summary columns of rows written before they existed."""
+    Analysis = models.Analysis
+    done, last_id = 0, 0
+    db = session_factory()
+    try:
+        while True:
+            rows = db.execute(
+                select(Analysis.id, Analysis.result)
+                .where(Analysis.prediction.is_(None), Analysis.id > last_id)
+                .order_by(Analysis.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.execute(update(Analysis), [{"id": row.id, **crud.summary_columns(row.result or {})} for row in rows])
+            db.commit()
+            done += len(rows)
+            last_id = rows[-1].id
+    finally:
+        db.close()
+    if done:
+        logger.info("Backfilled summary columns for %d analyses", done)
+    return done
+
+
+def _compact_row(db, row):
+    """Compact column values of a full-payload row, or None if the rebuilt payload wouldn't match it."""
+    result, features = row.result, row.features or {}
+    try:
+        values = crud.analysis_columns(db, features, result, row.explanation)
+        rebuilt = result_store.unpack_result(SimpleNamespace(**values), crud.get_result_context(db, values["context_key"]))
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return None  # payload from an older version of the API
+    if rebuilt != result:
+        return None
+    return {"id": row.id, "result": None, **values}
+
+
+def compact_results(session_factory=SessionLocal, batch_size: int = 1000) -> int:
+    """
+    Move rows written with the full result JSON to the compact layout
+    (services/result_store.py). Rows whose payload can't be rebuilt exactly
+    are left as they are; they are still served from `result`. SQLite /
+    Postgres only return the freed space after VACUUM.
+    """
+    Analysis = models.Analysis
+    done, kept, last_id = 0, 0, 0
+    db = session_factory()
+    try:
+        while True:
+            rows = db.execute(
+                select(Analysis.id, Analysis.features, Analysis.result, Analysis.explanation)
+                .where(Analysis.result.is_not(None), Analysis.id > last_id)
+                .order_by(Analysis.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = [u for u in (_compact_row(db, row) for row in rows) if u is not None]
+            if updates:
+                db.execute(update(Analysis), updates)
+                db.commit()
+            done += len(updates)
+            kept += len(rows) - len(updates)
+            last_id = rows[-1].id
+    finally:
+        db.close()
+    if done or kept:
+        logger.info("Compacted %d analyses (%d kept as full JSON)", done, kept)
+    return done
+
+
+def backfill_feature_columns(session_factory=SessionLocal, batch_size: int = 1000) -> int:
+    """
+    Fill the typed feature columns of rows compact_results() left as full
+    JSON from their `features` input, so the similarity index and exports
+    see them too. `features` itself is left as it is.
+    """
+    Analysis = models.Analysis
+    done, last_id = 0, 0
+    db = session_factory()
+    try:
+        while True:
+            rows = db.execute(
+                select(Analysis.id, Analysis.features)
+                .where(Analysis.koi_period.is_(None), Analysis.features.is_not(None), Analysis.id > last_id)
+                .order_by(Analysis.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = [u for u in (_feature_values(row) for row in rows) if u is not None]
+            if updates:
+                db.execute(update(Analysis), updates)
+                db.commit()
+            done += len(updates)
+            last_id = rows[-1].id
+    finally:
+        db.close()
+    if done:
+        logger.info("Backfilled feature columns for %d analyses", done)
+    return done
+
+
+def _feature_values(row):
+    try:
+        return {"id": row.id, **{k: float(row.features[k]) for k in models.FEATURE_COLUMNS}}
+    except (KeyError, TypeError, ValueError):
+        return None  # incomplete input; the row stays out of the similarity index
+
+
+def discard_saved_similarity_index():
+    """A saved index skips rows below its last id, so rebuild it after rows gained feature values."""
+    from services.similarity import INDEX_PATH
+    if INDEX_PATH and os.path.exists(INDEX_PATH):
+        os.remove(INDEX_PATH)
+        logger.info("Removed %s; the similarity index is rebuilt on next start", INDEX_PATH)
+
+
+def backfill_rollups(session_factory=SessionLocal) -> int:
+    """Build the /stats/summary counters once for analyses that existed before them."""
+    db = session_factory()
+    try:
+        if db.query(models.AnalysisRollup.period).first() is not None or db.query(models.Analysis.id).first() is None:
+            return 0
+        counted = crud.rebuild_rollups(db)
+    finally:
+        db.close()
+    logger.info("Built rollups for %d analyses", counted)
+    return counted
+
+
+def run(engine=default_engine, session_factory=SessionLocal):
+    create_tables(engine)
+    add_missing_columns(engine)
+    relax_not_null_columns(engine)
+    create_missing_indexes(engine)
+    backfill_summary_columns(session_factory)
+    compact_results(session_factory)
+    if backfill_feature_columns(session_factory):
+        discard_saved_similarity_index()
+    backfill_rollups(session_factory)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
@@ -1,12 +1,100 @@
 # models.py
-from sqlalchemy import Column, Integer, String, JSON, DateTime, func # type: ignore
+from sqlalchemy import Column, Integer, Float, String, JSON, LargeBinary, DateTime, Index, func # type: ignore
 from db import Base
 
+# model inputs, stored in typed columns of the same names
+FEATURE_COLUMNS = ("koi_period", "koi_duration", "koi_depth", "koi_prad",
+                   "koi_sma", "koi_incl", "koi_teq", "koi_model_snr")
+
 class Analysis(Base):
     __tablename__ = "analyses"
 
     id = Column(Integer, primary_key=True, index=True)
-    features = Column(JSON, nullable=False)
-    result = Column(JSON, nullable=False)
-    explanation = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    # compact layout (services/result_store.py): `result` is rebuilt from the columns below and the
+    # shared ResultContext; rows written before it keep the full payload in `result` (features in `features`)
+    features = Column(JSON(none_as_null=True), nullable=True)  # input columns other than FEATURE_COLUMNS, if any
+    result = Column(JSON(none_as_null=True), nullable=True)
+    explanation = Column(String, nullable=True)  # Gemini KOI text
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    koi_period = Column(Float, nullable=True)
+    koi_duration = Column(Float, nullable=True)
+    koi_depth = Column(Float, nullable=True)
+    koi_prad = Column(Float, nullable=True)
+    koi_sma = Column(Float, nullable=True)
+    koi_incl = Column(Float, nullable=True)
+    koi_teq = Column(Float, nullable=True)
+    koi_model_snr = Column(Float, nullable=True)
+    context_key = Column(String(16), nullable=True)  # ResultContext.key
+    prediction_code = Column(Integer, nullable=True)
+    probabilities = Column(LargeBinary, nullable=True)  # packed float64, context classes order
+    explanation_status = Column(String, nullable=True, index=True)  # pending | ready | failed, only for deferred explanations
+    explanation_claimed_at = Column(Float, nullable=True)  # time.time() the generating process took a pending row
+    planet_code = Column(Integer, nullable=True)
+    planet_rule_type = Column(String, nullable=True)
+    planet_scores = Column(LargeBinary, nullable=True)  # packed ML probabilities + rule scores + reliability
+    planet_explanation = Column(String, nullable=True)
+
+    # summary of `result`, denormalized at write time so list views skip the JSON
+    prediction = Column(String, nullable=True, index=True)
+    confidence = Column(Float, nullable=True)
+    reliability_label = Column(String, nullable=True, index=True)
+    reliability_score = Column(Float, nullable=True)
+    planet_type = Column(String, nullable=True, index=True)
+    outlier_count = Column(Integer, nullable=True, index=True)
+
+    # keyset pagination: ORDER BY created_at DESC, id DESC
+    __table_args__ = (Index("ix_analyses_created_at_id", "created_at", "id"),)
+
+
+class AnalysisRollup(Base):
+    """Counts of analyses per summary value, overall and per hour/day (see services/rollups.py)."""
+    __tablename__ = "analysis_rollups"
+
+    period = Column(String(8), primary_key=True)  # all | day | hour
+    bucket = Column(String(16), primary_key=True)  # "" for all, else the UTC day / hour
+    dimension = Column(String(16), primary_key=True)
+    value = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ResultContext(Base):
+    """Parts of a result shared by every row scored with one model version / feature stats."""
+    __tablename__ = "result_contexts"
+
+    key = Column(String(16), primary_key=True)  # hash of `data`
+    model_version = Column(String, nullable=True)
+    data = Column(JSON, nullable=False)  # importance, training means/stds, class names
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ExplanationCache(Base):
+    __tablename__ = "explanation_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256(client kind + model_name + prompt)
+    model_name = Column(String, nullable=False)
+    text = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Job(Base):
+    """Background batch analysis of an uploaded file (see services/jobs.py)."""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    filename = Column(String, nullable=False)
+    path = Column(String, nullable=False)  # stored copy of the upload, removed once the job is done/stopped
+    status = Column(String, nullable=False, index=True)  # queued | running | done | failed | cancelled
+    total_rows = Column(Integer, nullable=True)  # counted from the file before scoring starts
+    rows_done = Column(Integer, nullable=False, default=0)
+    skipped_rows = Column(Integer, nullable=False, default=0)
+    shards_done = Column(JSON, nullable=False, default=list)  # indexes of committed shards
+    first_analysis_id = Column(Integer, nullable=True)
+    last_analysis_id = Column(Integer, nullable=True)
+    rows_per_sec = Column(Float, nullable=True)
+    error = Column(String, nullable=True)
+    # the process running the job and when it last reported; a stale heartbeat lets another process take over
+    owner = Column(String, nullable=True)
+    heartbeat_at = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -15,6 +15,10 @@ class AnalysisResponse(AnalysisBase):
     class Config:
         orm_mode = True
 
+class AnalysisPage(BaseModel):
+    results: List[AnalysisResponse]
+    next_cursor: Optional[str] = None
+
 class UploadResponse(BaseModel):
     analysis_id: int
     prediction: str
@@ -23,6 +27,64 @@ class UploadResponse(BaseModel):
     planet_type: Optional[str] = None
     extreme_outlier: bool
     logs: List[str]
+    explanation: Optional[str] = None
+    explanation_status: str = "ready"
+    model_version: Optional[str] = None
+
+class ExplanationResponse(BaseModel):
+    analysis_id: int
+    status: str
+    gemini_koi_explanation: Optional[str] = None
+    gemini_planet_explanation: Optional[str] = None
+
+class BatchRowResponse(BaseModel):
+    analysis_id: Optional[int] = None
+    prediction: str
+    confidence: float
+    reliability: str
+    planet_type: Optional[str] = None
+    outlier_count: int
+    extreme_outlier: bool
+
+class BatchUploadResponse(BaseModel):
+    rows: int
+    skipped_rows: int
+    elapsed_ms: float
+    rows_per_sec: float
+    model_version: Optional[str] = None
+    results: List[BatchRowResponse]
+
+class IngestResponse(BaseModel):
+    rows: int
+    skipped_rows: int
+    chunks: int
+    first_analysis_id: Optional[int] = None
+    last_analysis_id: Optional[int] = None
+    elapsed_ms: float
+    rows_per_sec: float
+
+class JobResponse(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    total_rows: Optional[int] = None
+    rows_done: int
+    skipped_rows: int
+    progress: Optional[float] = None
+    rows_per_sec: Optional[float] = None
+    eta_s: Optional[float] = None
+    first_analysis_id: Optional[int] = None
+    last_analysis_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ModelActivateRequest(BaseModel):
+    version: str
+
+class ShadowModelRequest(BaseModel):
+    version: Optional[str] = None
+    sample_rate: float = 0.1
 
 class ExplorerResponse(BaseModel):
     analysis_id: int
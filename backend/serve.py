@@ -0,0 +1,151 @@
+# serve.py
+"""
+Pre-fork multi-worker launcher:
+
+    python serve.py --workers 4 --port 8000
+
+`uvicorn --workers N` starts N fresh interpreters, each importing main.py and
+loading its own copy of the models, pandas and the Gemini SDK. Here the app,
+the active model version, the feature stats and the heavy libraries are
+loaded once in the parent, which then forks the workers; the loaded memory is
+shared copy-on-write. Database pools, the Gemini client and the job manager
+identity are created per worker (main.post_fork), the pool size per worker
+with --db-pool-size / DB_POOL_SIZE.
+
+The parent only supervises: a worker that dies is replaced, SIGTERM / SIGINT
+stop all workers gracefully. A model activated later (/admin/models/activate)
+is loaded by each worker on its own.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+logger = logging.getLogger("exoplanet_api")
+
+
+def preload():
+    """Import the app and load everything workers can share."""
+    import main
+    import pandas # type: ignore  (imported lazily by the endpoints; load it once here)
+
+    main.model_registry.warm_up(background=False)
+    if main.explainer.client is not None and os.getenv("GEMINI_CLIENT", "gemini") != "fake":
+        try:
+            import google.generativeai # type: ignore  (module only; configured per worker on first call)
+        except ImportError:
+            pass
+    # keep the preloaded objects out of the GC's bookkeeping, so collections in the
+    # workers don't write to (and un-share) their pages
+    gc.collect()
+    gc.freeze()
+    return main
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # explicit IPPROTO_TCP: asyncio only sets TCP_NODELAY on accepted sockets whose proto says TCP,
+    # and without it every response waits ~40 ms for a delayed ACK
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app_module, sock: socket.socket, args):
+    import uvicorn # type: ignore
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    app_module.post_fork()
+    config = uvicorn.Config(app_module.app, log_level=args.log_level, access_log=args.access_log,
+                            timeout_keep_alive=args.timeout_keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(app_module, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app_module, sock, args)
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def supervise(app_module, sock: socket.socket, args):
+    workers: Dict[int, float] = {}  # pid -> start time
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        workers[spawn(app_module, sock, args)] = time.monotonic()
+    logger.info("Serving on %s:%d with %d workers (pids %s)", args.host, args.port, args.workers,
+                ", ".join(map(str, workers)))
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning("Worker %d exited (status %d), starting a new one", pid, status)
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)  # don't spin if workers die right at startup
+        workers[spawn(app_module, sock, args)] = time.monotonic()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--db-pool-size", type=int, help="connections kept per worker (sets DB_POOL_SIZE)")
+    parser.add_argument("--db-max-overflow", type=int, help="extra connections per worker (sets DB_MAX_OVERFLOW)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--timeout-keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_false")
+    args = parser.parse_args()
+
+    # db.py reads these at import, so they must be set before preload()
+    if args.db_pool_size is not None:
+        os.environ["DB_POOL_SIZE"] = str(args.db_pool_size)
+    if args.db_max_overflow is not None:
+        os.environ["DB_MAX_OVERFLOW"] = str(args.db_max_overflow)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sock = bind_socket(args.host, args.port, args.backlog)
+    app_module = preload()
+    supervise(app_module, sock, args)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# artifacts.py
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+import joblib # type: ignore
+from fastapi.encoders import jsonable_encoder # type: ignore
+
+logger = logging.getLogger("exoplanet_api")
+
+
+# ---------- File-backed artifacts with change detection ----------
+class FileArtifact:
+    """
+    A file on disk loaded on first use and reloaded only when its mtime or
+    size changes, so artifacts can be replaced without a restart. `transform`
+    turns the loaded object into whatever callers need (kept alongside it).
+    If a reload fails (e.g. the file is mid-write) the last good value is kept
+    and the load is retried on the next access.
+    """
+
+    def __init__(self, path: str, transform: Optional[Callable[[Any], Any]] = None,
+                 loader: Callable[[str], Any] = joblib.load):
+        self.path = path
+        self.transform = transform or (lambda obj: obj)
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._value: Any = None
+        self.loads = 0
+
+    def _stat(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self) -> Any:
+        signature = self._stat()
+        if signature == self._signature:
+            return self._value
+        with self._lock:
+            if signature != self._signature:
+                try:
+                    self._value = self.transform(self.loader(self.path))
+                except Exception:
+                    if self._signature is None:
+                        raise
+                    logger.exception("Reloading %s failed; keeping previous version", self.path)
+                    return self._value
+                self._signature = signature
+                self.loads += 1
+                logger.info("Loaded %s", self.path)
+        return self._value
+
+    @property
+    def signature(self) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) of the loaded version; changes whenever get() reloads."""
+        return self._signature
+
+
+# ---------- Pre-serialized JSON payloads ----------
+class JsonPayload:
+    """JSON body encoded once, with a strong ETag derived from its bytes."""
+
+    def __init__(self, data: Any):
+        # same encoding as FastAPI's JSONResponse
+        self.body = json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False,
+                               indent=None, separators=(",", ":")).encode("utf-8")
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()[:20]
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header value names this payload's ETag."""
+        if not if_none_match:
+            return False
+        tags = {t.strip() for t in if_none_match.split(",")}
+        tags = {t[2:] if t.startswith("W/") else t for t in tags}  # weak comparison
+        return "*" in tags or self.etag in tags
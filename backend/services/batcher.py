@@ -0,0 +1,105 @@
+# batcher.py
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np # type: ignore
+
+logger = logging.getLogger("exoplanet_api")
+
+
+# ---------- Dynamic micro-batching ----------
+class MicroBatcher:
+    """
+    Collects rows submitted by concurrent requests into one matrix.
+
+    A batch is flushed when it reaches max_batch_size rows or when the oldest
+    row has waited max_wait_ms, whichever comes first. batch_fn runs once per
+    batch (in the default executor, so the event loop keeps collecting the next
+    batch meanwhile) and must return one result per row; each caller's future
+    is resolved with its own row.
+    """
+
+    def __init__(self, batch_fn: Callable[[np.ndarray], List[Any]],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # power-of-two buckets up to max_batch_size
+        self._buckets = [1]
+        while self._buckets[-1] < self.max_batch_size:
+            self._buckets.append(min(self._buckets[-1] * 2, self.max_batch_size))
+        self._histogram = {b: 0 for b in self._buckets}
+        self.batches = 0
+        self.rows = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def submit(self, row: np.ndarray) -> Any:
+        queue = self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+        await queue.put((np.asarray(row, dtype=float).ravel(), fut))
+        return await fut
+
+    async def _collect(self, queue: asyncio.Queue) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        items = [await queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            if not queue.empty():
+                items.append(queue.get_nowait())
+                continue
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect(queue)
+            items = [(row, fut) for row, fut in items if not fut.done()]  # drop cancelled callers
+            if not items:
+                continue
+            self._record(len(items))
+            try:
+                X = np.vstack([row for row, _ in items])
+                results = await loop.run_in_executor(None, self.batch_fn, X)
+            except Exception as e:
+                logger.exception("Micro-batch of %d rows failed", len(items))
+                for _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(items, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def _record(self, size: int):
+        self.batches += 1
+        self.rows += size
+        bucket = next(b for b in self._buckets if size <= b)
+        self._histogram[bucket] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {f"<={b}": n for b, n in self._histogram.items()},
+        }
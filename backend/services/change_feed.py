@@ -0,0 +1,173 @@
+# change_feed.py
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger("exoplanet_api")
+
+# queued instead of a delta when a subscriber fell behind and must reload its page
+RESYNC = object()
+
+
+# ---------- In-process broker ----------
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.stale = False  # RESYNC queued; further rows are covered by the reload
+
+    async def get(self):
+        item = await self.queue.get()
+        if item is RESYNC:
+            self.stale = False
+        return item
+
+
+class ChangeFeed:
+    """
+    Fan-out of newly inserted analyses to websocket subscribers.
+
+    publish() is thread-safe (inserts also happen in worker threads). Each
+    subscriber has a bounded queue; a subscriber that can't keep up has its
+    backlog discarded and receives RESYNC, so one slow client never grows
+    memory or delays the others.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max(1, int(max_queue))
+        self._subs: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.bridge: Optional["PgNotifyBridge"] = None
+        self.published = 0
+        self.resyncs = 0
+
+    def subscribe(self) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, rows: List[Dict[str, Any]]):
+        """Called after analyses are committed; rows carry id + summary columns."""
+        if not rows:
+            return
+        self.deliver(rows)
+        if self.bridge is not None:
+            self.bridge.notify(rows)
+
+    def deliver(self, rows: List[Dict[str, Any]]):
+        """Hand rows to local subscribers only (also used for rows from other workers)."""
+        self.published += len(rows)
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(self._put, sub, rows)
+            except RuntimeError:  # subscriber's loop is closed
+                self.unsubscribe(sub)
+
+    def _put(self, sub: Subscription, rows: List[Dict[str, Any]]):
+        if sub.stale:
+            sub.dropped += 1
+            return
+        try:
+            sub.queue.put_nowait(rows)
+        except asyncio.QueueFull:
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+                sub.dropped += 1
+            sub.queue.put_nowait(RESYNC)
+            sub.stale = True
+            self.resyncs += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subs = list(self._subs)
+        return {
+            "subscribers": len(subs),
+            "published_rows": self.published,
+            "resyncs": self.resyncs,
+            "max_queue": self.max_queue,
+            "queued": sum(s.queue.qsize() for s in subs),
+            "cross_worker": self.bridge is not None,
+        }
+
+
+# ---------- Optional cross-worker fan-out (Postgres LISTEN/NOTIFY) ----------
+class PgNotifyBridge:
+    """
+    Relays published rows to the other uvicorn workers through NOTIFY on
+    `channel`; a daemon thread LISTENs and delivers rows from other processes
+    to this process' subscribers.
+    """
+
+    MAX_PAYLOAD = 7000  # Postgres limit is 8000 bytes
+
+    def __init__(self, engine, feed: ChangeFeed, channel: str = "analyses_feed"):
+        self.engine = engine
+        self.feed = feed
+        self.channel = channel
+        self.origin = os.getpid()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.feed.bridge = self
+        self._thread = threading.Thread(target=self._listen, name="pg-notify", daemon=True)
+        self._thread.start()
+
+    def _payloads(self, rows: List[Dict[str, Any]]):
+        """Split rows into NOTIFY payloads under MAX_PAYLOAD bytes."""
+        wrap = '{"o": %d, "r": [%s]}'
+        parts: List[str] = []
+        size = len(wrap % (self.origin, ""))
+        for row in rows:
+            item = json.dumps(row, default=str)
+            if parts and size + len(item) + 1 > self.MAX_PAYLOAD:
+                yield wrap % (self.origin, ",".join(parts))
+                parts, size = [], len(wrap % (self.origin, ""))
+            parts.append(item)
+            size += len(item) + 1
+        if parts:
+            yield wrap % (self.origin, ",".join(parts))
+
+    def notify(self, rows: List[Dict[str, Any]]):
+        try:
+            with self.engine.begin() as conn:
+                for payload in self._payloads(rows):
+                    conn.exec_driver_sql("SELECT pg_notify(%(channel)s, %(payload)s)",
+                                         {"channel": self.channel, "payload": payload})
+        except Exception:
+            logger.exception("Change feed NOTIFY failed")
+
+    def _listen(self):
+        conn = self.engine.raw_connection()
+        try:
+            dbapi_conn = conn.driver_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel}")
+            while True:
+                if select.select([dbapi_conn], [], [], 5.0) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    note = dbapi_conn.notifies.pop(0)
+                    try:
+                        data = json.loads(note.payload)
+                    except ValueError:
+                        continue
+                    if data.get("o") != self.origin:
+                        self.feed.deliver(data.get("r") or [])
+        except Exception:
+            logger.exception("Change feed LISTEN loop stopped")
+        finally:
+            conn.close()
@@ -0,0 +1,113 @@
+# explanation_cache.py
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import crud
+
+logger = logging.getLogger("exoplanet_api")
+
+
+def cache_key(client: str, model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{client}\0{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+# ---------- Two-tier explanation cache ----------
+class ExplanationCache:
+    """
+    In-process LRU (size + TTL eviction) in front of the persistent
+    explanation_cache table. Keys are sha256(client kind + model name +
+    prompt), so identical feature vectors reuse the same Gemini text across
+    restarts and a stand-in client's output is never served as Gemini's.
+    Callers must only put() real explanations, never placeholder/failure text.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None,
+                 max_entries: int = 1024, ttl_s: float = 3600.0):
+        self.session_factory = session_factory
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self._lru: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "expirations": 0, "db_errors": 0}
+
+    # --- memory tier ---
+    def _lru_get(self, key: str) -> Optional[str]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        stored_at, text = entry
+        if self.ttl_s > 0 and time.monotonic() - stored_at > self.ttl_s:
+            del self._lru[key]
+            self.counters["expirations"] += 1
+            return None
+        self._lru.move_to_end(key)
+        return text
+
+    def _lru_put(self, key: str, text: str):
+        self._lru[key] = (time.monotonic(), text)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    # --- persistent tier (sync SQLAlchemy, run off the event loop) ---
+    def _db_get(self, key: str) -> Optional[str]:
+        db = self.session_factory()
+        try:
+            row = crud.get_cached_explanation(db, key)
+            return row.text if row is not None else None
+        finally:
+            db.close()
+
+    def _db_put(self, key: str, model_name: str, text: str):
+        db = self.session_factory()
+        try:
+            crud.save_cached_explanation(db, key, model_name, text)
+        finally:
+            db.close()
+
+    async def get(self, client: str, model_name: str, prompt: str) -> Optional[str]:
+        key = cache_key(client, model_name, prompt)
+        text = self._lru_get(key)
+        if text is not None:
+            self.counters["memory_hits"] += 1
+            return text
+        if self.session_factory is not None:
+            try:
+                text = await asyncio.to_thread(self._db_get, key)
+            except Exception:
+                logger.exception("Explanation cache lookup failed")
+                self.counters["db_errors"] += 1
+                text = None
+            if text is not None:
+                self.counters["db_hits"] += 1
+                self._lru_put(key, text)
+                return text
+        self.counters["misses"] += 1
+        return None
+
+    async def put(self, client: str, model_name: str, prompt: str, text: str):
+        key = cache_key(client, model_name, prompt)
+        self._lru_put(key, text)
+        self.counters["stores"] += 1
+        if self.session_factory is not None:
+            try:
+                await asyncio.to_thread(self._db_put, key, model_name, text)
+            except Exception:
+                logger.exception("Explanation cache write failed")
+                self.counters["db_errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["db_hits"]
+        return {
+            **self.counters,
+            "size": len(self._lru),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,136 @@
+# explanation_service.py
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger("exoplanet_api")
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+NOT_CONFIGURED_TEXT = "(Gemini API key not configured — no text available)"
+
+
+class ExplanationFailed(Exception):
+    """No explanation could be generated (no client, Gemini error or timeout); str() is the reason."""
+
+
+# ---------- Clients ----------
+class GeminiClient:
+    """
+    Real Gemini client. The SDK call is synchronous, so it runs on a dedicated
+    thread pool: it never blocks the event loop and can't exhaust the default
+    executor used by model scoring. The SDK is imported on the first call, not
+    at startup.
+    """
+
+    kind = "gemini"
+
+    def __init__(self, api_key: str, max_workers: int = 8):
+        self._api_key = api_key
+        self._genai = None
+        self._sdk_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+
+    def _sdk(self):
+        if self._genai is None:
+            with self._sdk_lock:
+                if self._genai is None:
+                    import google.generativeai as genai # type: ignore
+                    genai.configure(api_key=self._api_key)
+                    self._genai = genai
+        return self._genai
+
+    def _generate_sync(self, prompt: str, model_name: str) -> str:
+        gm = self._sdk().GenerativeModel(model_name)
+        resp = gm.generate_content(prompt)
+        return getattr(resp, "text", str(resp))
+
+    async def generate(self, prompt: str, model_name: str = DEFAULT_MODEL) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._generate_sync, prompt, model_name)
+
+
+class FakeGeminiClient:
+    """Local stand-in with configurable latency (tests, benchmarks, offline dev)."""
+
+    kind = "fake"
+
+    def __init__(self, latency_ms: float = 0.0, text: Optional[str] = None):
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.text = text
+        self.calls = 0
+
+    async def generate(self, prompt: str, model_name: str = DEFAULT_MODEL) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.text if self.text is not None else f"[fake {model_name}] {len(prompt)} chars of prompt"
+
+
+def make_client(api_key: Optional[str], kind: str = "gemini", max_workers: int = 8,
+                fake_latency_ms: float = 0.0):
+    if kind == "fake":
+        logger.info("Using fake Gemini client (%.0f ms latency)", fake_latency_ms)
+        return FakeGeminiClient(latency_ms=fake_latency_ms)
+    if not api_key:
+        logger.warning("GEMINI_API_KEY not set in environment. Gemini calls will fail until set.")
+        return None
+    logger.info("Configured Gemini API")
+    return GeminiClient(api_key, max_workers=max_workers)
+
+
+# ---------- Explanation layer ----------
+class ExplanationService:
+    """
+    Async front for the explanation client: optional prompt cache, per-call
+    timeout and a global concurrency limit, so a slow Gemini can't starve the
+    other endpoints. generate() never raises — failures come back as the
+    "(Gemini call failed: ...)" text, which is never cached; generate_checked()
+    raises ExplanationFailed instead, for callers that store the outcome.
+    """
+
+    def __init__(self, client=None, timeout_s: float = 30.0, max_concurrency: int = 8, cache=None):
+        self.client = client
+        self.cache = cache
+        self.timeout_s = timeout_s
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    async def generate(self, prompt: str, model_name: str = DEFAULT_MODEL, use_cache: bool = True) -> str:
+        if self.client is None:
+            return NOT_CONFIGURED_TEXT
+        try:
+            return await self.generate_checked(prompt, model_name, use_cache)
+        except ExplanationFailed as e:
+            return f"(Gemini call failed: {e})"
+
+    async def generate_checked(self, prompt: str, model_name: str = DEFAULT_MODEL, use_cache: bool = True) -> str:
+        if self.client is None:
+            raise ExplanationFailed("Gemini API key not configured")
+        cache = self.cache if use_cache else None
+        client_kind = getattr(self.client, "kind", type(self.client).__name__)  # part of the cache key
+        if cache is not None:
+            cached = await cache.get(client_kind, model_name, prompt)
+            if cached is not None:
+                return cached
+        try:
+            async with self._semaphore():
+                text = await asyncio.wait_for(self.client.generate(prompt, model_name), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            logger.warning("Gemini call timed out after %.1fs", self.timeout_s)
+            raise ExplanationFailed(f"timed out after {self.timeout_s:g}s")
+        except Exception as e:
+            logger.exception("Gemini call failed")
+            raise ExplanationFailed(str(e)) from e
+        if cache is not None and text:
+            await cache.put(client_kind, model_name, prompt, text)
+        return text
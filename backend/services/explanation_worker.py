@@ -0,0 +1,177 @@
+# explanation_worker.py
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import crud
+from services.explanation_service import ExplanationFailed
+
+logger = logging.getLogger("exoplanet_api")
+
+
+# ---------- Deferred explanations ----------
+class ExplanationWorker:
+    """
+    Fills in Gemini text for analyses that were stored with
+    explanation_status="pending". Jobs are queued in-process and handled by a
+    few asyncio tasks (started lazily on the running loop); each job updates
+    the row's explanation/result (or marks it "failed") and wakes anyone
+    waiting on that analysis id.
+
+    Pending rows carry the time the process generating them last claimed them
+    (explanation_claimed_at). start() refreshes the claims of the rows held
+    here every `poll_s` seconds and re-queues pending rows whose claim is older
+    than `stale_s` (their process stopped before handling them).
+    """
+
+    def __init__(self, explainer, session_factory: Callable[[], Any], concurrency: int = 4,
+                 poll_s: float = 10.0, stale_s: float = 60.0):
+        self.explainer = explainer
+        self.session_factory = session_factory
+        self.concurrency = max(1, int(concurrency))
+        self.poll_s = poll_s
+        self.stale_s = stale_s
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._held: set = set()  # analysis ids queued or being generated here
+        self._supervisor: Optional[asyncio.Task] = None
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or not any(not t.done() for t in self._tasks):
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._tasks = [loop.create_task(self._run(self._queue)) for _ in range(self.concurrency)]
+        return self._queue
+
+    def submit(self, analysis_id: int, prompt_koi: str, prompt_planet: Optional[str] = None,
+               use_cache: bool = True):
+        self._held.add(analysis_id)
+        self._ensure_started().put_nowait((analysis_id, prompt_koi, prompt_planet, use_cache))
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # --- completion notifications (REST polling doesn't need these, websockets do) ---
+    def subscribe(self, analysis_id: int) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(analysis_id, []).append(fut)
+        return fut
+
+    def unsubscribe(self, analysis_id: int, fut: asyncio.Future):
+        waiters = self._waiters.get(analysis_id, [])
+        if fut in waiters:
+            waiters.remove(fut)
+        if not waiters:
+            self._waiters.pop(analysis_id, None)
+
+    def _notify(self, analysis_id: int, payload: Dict[str, Any]):
+        for fut in self._waiters.pop(analysis_id, []):
+            if not fut.done():
+                fut.set_result(payload)
+
+    # --- resuming pending rows of stopped processes ---
+    def start(self, prompts: Callable[[Any, Any], Tuple[str, Optional[str]]]):
+        """
+        Begin refreshing claims and picking up orphaned rows (call from the app's lifespan).
+        `prompts(db, analysis)` rebuilds the Gemini prompts of a stored analysis.
+        """
+        if self._supervisor is None or self._supervisor.done():
+            self._supervisor = asyncio.get_running_loop().create_task(self._supervise(prompts))
+
+    async def shutdown(self):
+        """Stop local work and release the claims, so another (or the restarted) process takes the rows over."""
+        held, self._held = list(self._held), set()  # before cancelling: _run drops ids as it unwinds
+        tasks = [t for t in [self._supervisor, *self._tasks] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks, self._supervisor, self._queue = [], None, None
+        if held:
+            await asyncio.to_thread(self._db, crud.heartbeat_explanations, held, None)
+
+    def _db(self, fn, *args):
+        db = self.session_factory()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    def _claim_orphans(self, prompts) -> List[Tuple[int, str, Optional[str]]]:
+        """Claim every orphaned pending row -> (analysis id, KOI prompt, planet prompt)."""
+        claimed = []
+        db = self.session_factory()
+        try:
+            while True:
+                now = time.time()
+                ids = crud.get_orphaned_explanation_ids(db, now - self.stale_s)
+                if not ids:
+                    return claimed
+                for analysis_id in ids:
+                    db_obj = crud.claim_explanation(db, analysis_id, now, now - self.stale_s)
+                    if db_obj is None:
+                        continue  # another process took it
+                    try:
+                        claimed.append((analysis_id, *prompts(db, db_obj)))
+                    except Exception:
+                        logger.exception("Cannot rebuild the prompts of analysis %s", analysis_id)
+                        crud.mark_explanation_failed(db, analysis_id)
+        finally:
+            db.close()
+
+    async def _supervise(self, prompts):
+        while True:
+            try:
+                if self._held:
+                    await asyncio.to_thread(self._db, crud.heartbeat_explanations, list(self._held), time.time())
+                for analysis_id, prompt_koi, prompt_planet in await asyncio.to_thread(self._claim_orphans, prompts):
+                    logger.info("Resuming deferred explanation for analysis %s", analysis_id)
+                    self.submit(analysis_id, prompt_koi, prompt_planet)
+            except Exception:
+                logger.exception("Explanation supervisor pass failed")
+            await asyncio.sleep(self.poll_s)
+
+    # --- worker ---
+    async def _explain(self, prompt_koi: str, prompt_planet: Optional[str],
+                       use_cache: bool) -> Tuple[str, Optional[str]]:
+        if prompt_planet is None:
+            return await self.explainer.generate_checked(prompt_koi, use_cache=use_cache), None
+        koi_text, planet_text = await asyncio.gather(
+            self.explainer.generate_checked(prompt_koi, use_cache=use_cache),
+            self.explainer.generate_checked(prompt_planet, use_cache=use_cache),
+        )
+        return koi_text, planet_text
+
+    async def _mark_failed(self, analysis_id: int):
+        try:
+            await asyncio.to_thread(self._db, crud.mark_explanation_failed, analysis_id)
+        except Exception:  # still "pending": resumed once its claim goes stale
+            logger.exception("Could not mark the explanation of analysis %s failed", analysis_id)
+        self._notify(analysis_id, {"analysis_id": analysis_id, "status": "failed"})
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            analysis_id, prompt_koi, prompt_planet, use_cache = await queue.get()
+            try:
+                try:
+                    koi_text, planet_text = await self._explain(prompt_koi, prompt_planet, use_cache)
+                except ExplanationFailed as e:
+                    logger.warning("Deferred explanation for analysis %s failed: %s", analysis_id, e)
+                    await self._mark_failed(analysis_id)
+                    continue
+                await asyncio.to_thread(self._db, crud.update_analysis_explanation, analysis_id, koi_text, planet_text)
+                self._notify(analysis_id, {
+                    "analysis_id": analysis_id,
+                    "status": "ready",
+                    "gemini_koi_explanation": koi_text,
+                    "gemini_planet_explanation": planet_text,
+                })
+            except Exception:
+                logger.exception("Deferred explanation for analysis %s failed", analysis_id)
+                await self._mark_failed(analysis_id)
+            finally:
+                self._held.discard(analysis_id)
+                queue.task_done()
@@ -0,0 +1,120 @@
+# export.py
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Sequence
+
+import models
+from services.rollups import as_utc
+
+# column -> kind; "result" is the rebuilt /predict payload (JSON text in CSV/Parquet)
+EXPORT_COLUMNS = {
+    "id": "int",
+    "created_at": "datetime",
+    "prediction": "str",
+    "confidence": "float",
+    "reliability_label": "str",
+    "reliability_score": "float",
+    "planet_type": "str",
+    "outlier_count": "int",
+    **{k: "float" for k in models.FEATURE_COLUMNS},
+    "explanation": "str",
+    "result": "json",
+}
+DEFAULT_COLUMNS = tuple(c for c in EXPORT_COLUMNS if c not in ("explanation", "result"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# ---------- Streaming writers ----------
+# Each takes the column names and an iterable of row batches (lists of tuples
+# in column order) and yields encoded chunks, one or more per batch, so only
+# one batch is ever held in memory.
+
+def _text(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    if kind == "datetime":
+        return as_utc(value).isoformat()
+    if kind == "json":
+        return json.dumps(value)
+    return value
+
+
+def csv_chunks(columns: Sequence[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    kinds = [EXPORT_COLUMNS[c] for c in columns]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows([_text(v, k) for v, k in zip(row, kinds)] for row in batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def ndjson_chunks(columns: Sequence[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps({c: as_utc(v).isoformat() if isinstance(v, datetime) else v for c, v in zip(columns, row)}) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object collecting what ParquetWriter wrote since the last take()."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def parquet_chunks(columns: Sequence[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """One row group per batch (needs pyarrow)."""
+    import pyarrow as pa # type: ignore
+    import pyarrow.parquet as pq # type: ignore
+
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "json": pa.string(),
+             "datetime": pa.timestamp("us", tz="UTC")}
+    kinds = [EXPORT_COLUMNS[c] for c in columns]
+    schema = pa.schema([(c, types[k]) for c, k in zip(columns, kinds)])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            arrays = [
+                pa.array([json.dumps(v) if k == "json" and v is not None else v for v in values], type=types[k])
+                for values, k in zip(zip(*batch), kinds)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    yield sink.take()  # footer
+
+
+WRITERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
@@ -0,0 +1,90 @@
+# fuzzy_engine.py
+from typing import Dict, Any, List, Tuple
+import numpy as np # type: ignore
+
+
+# ---------- Compiled fuzzy planet-type rules ----------
+class FuzzyRuleEngine:
+    """
+    CLASS_SPECS compiled into dense (slot x class) arrays, evaluated with
+    broadcasting over an (N rows x slots x classes) block.
+
+    Slot k of class c is the k-th feature listed in that class' spec, so the
+    weighted sum is accumulated in the same order as assign_planet_type_multi
+    and the scores are bit-for-bit identical to the per-row function.
+    """
+
+    def __init__(self, class_specs: Dict[str, Dict[str, Dict[str, Any]]], feature_order: List[str]):
+        self.classes = list(class_specs.keys())
+        self.feature_order = list(feature_order)
+        n_slots = max((len(spec) for spec in class_specs.values()), default=0)
+        shape = (n_slots, len(self.classes))
+
+        # index into feature_order; len(feature_order) points at an all-NaN column
+        self.feat_idx = np.full(shape, len(self.feature_order), dtype=np.intp)
+        self.prim_min = np.full(shape, np.nan)
+        self.prim_max = np.full(shape, np.nan)
+        self.soft_min = np.full(shape, np.nan)
+        self.soft_max = np.full(shape, np.nan)
+        self.weights = np.zeros(shape)
+
+        for c, spec in enumerate(class_specs.values()):
+            for k, (feat, conf) in enumerate(spec.items()):
+                prim = conf.get("prim") or (None, None)
+                soft = conf.get("soft") or (None, None)
+                pmin, pmax = prim
+                smin, smax = soft
+                # one-sided prim ranges test soft bounds by truthiness, so 0 means "no ramp"
+                if pmin is not None and pmax is None and not smin:
+                    smin = None
+                if pmin is None and pmax is not None and not smax:
+                    smax = None
+                if feat in self.feature_order:
+                    self.feat_idx[k, c] = self.feature_order.index(feat)
+                self.prim_min[k, c] = np.nan if pmin is None else pmin
+                self.prim_max[k, c] = np.nan if pmax is None else pmax
+                self.soft_min[k, c] = np.nan if smin is None else smin
+                self.soft_max[k, c] = np.nan if smax is None else smax
+                self.weights[k, c] = conf.get("w", 1.0)
+
+    def membership(self, X: np.ndarray) -> np.ndarray:
+        """Membership of every (row, slot, class) cell -> (N x slots x classes)."""
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_order))
+        X = np.hstack([X, np.full((X.shape[0], 1), np.nan)])
+        v = X[:, self.feat_idx]
+
+        pmin, pmax, smin, smax = self.prim_min, self.prim_max, self.soft_min, self.soft_max
+        has_pmin, has_pmax = ~np.isnan(pmin), ~np.isnan(pmax)
+        has_smin, has_smax = ~np.isnan(smin), ~np.isnan(smax)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prim_hit = (has_pmin | has_pmax) & (~has_pmin | (v >= pmin)) & (~has_pmax | (v <= pmax))
+            low_ramp = has_pmin & has_smin & (smin <= v) & (v < pmin)
+            high_ramp = has_pmax & has_smax & (pmax < v) & (v <= smax)
+            mid = 0.5 * (smin + smax)
+            triangle = ~has_pmin & ~has_pmax & has_smin & has_smax & (smin <= v) & (v <= smax)
+            point = triangle & (smin == smax)  # zero-width triangle: full membership at its only point
+
+            return np.select(
+                [prim_hit, low_ramp, high_ramp, point, triangle],
+                [1.0,
+                 (v - smin) / (pmin - smin),
+                 (smax - v) / (smax - pmax),
+                 1.0,
+                 1 - np.abs(v - mid) / (mid - smin)],
+                default=0.0,
+            )
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        """Weighted class scores -> (N x classes)."""
+        weighted = self.weights * self.membership(X)
+        total = np.zeros((weighted.shape[0], weighted.shape[2]))
+        for k in range(weighted.shape[1]):
+            total += weighted[:, k, :]
+        return total
+
+    def assign(self, X: np.ndarray) -> Tuple[List[str], List[Dict[str, float]]]:
+        """Best class and per-class scores for each row (same shape as assign_planet_type_multi)."""
+        scores = self.scores(X)
+        best = [self.classes[i] for i in scores.argmax(axis=1)]
+        return best, [dict(zip(self.classes, map(float, row))) for row in scores]
@@ -0,0 +1,79 @@
+# inference.py
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np # type: ignore
+
+logger = logging.getLogger("exoplanet_api")
+
+# objectives whose in-place output is already a probability
+_PROBA_OBJECTIVES = ("multi:softprob", "binary:logistic")
+
+
+# ---------- Model wrapper ----------
+class InferenceModel:
+    """
+    Single-pass inference around a joblib-loaded classifier.
+
+    Labels are derived from the probability matrix (argmax over classes_), so
+    the model runs once per request instead of predict() + predict_proba().
+    XGBoost models are evaluated with booster.inplace_predict on a float32
+    array, which skips the DMatrix construction done by the sklearn wrapper.
+    Metadata that never changes (classes, global importance) is read at load time.
+    """
+
+    def __init__(self, clf, feature_pretty: Optional[List[str]] = None):
+        self.clf = clf
+        self.classes = np.asarray(getattr(clf, "classes_", []))
+        self.booster = None
+        self.iteration_range = (0, 0)
+        self.missing = getattr(clf, "missing", np.nan)
+
+        try:
+            booster = clf.get_booster()
+        except Exception:
+            booster = None
+        if booster is not None and getattr(clf, "objective", None) in _PROBA_OBJECTIVES:
+            self.booster = booster
+            try:
+                self.iteration_range = (0, int(clf.best_iteration) + 1)
+            except AttributeError:
+                pass
+
+        self.importance = self._importance(booster, feature_pretty or [])
+
+    @staticmethod
+    def _importance(booster, feature_pretty: List[str]) -> Dict[str, float]:
+        """Global importance (weight) keyed by pretty feature name."""
+        try:
+            importance = booster.get_score(importance_type="weight") if booster is not None else {}
+        except Exception:
+            importance = {}
+        importance_pretty = {}
+        for k, v in importance.items():
+            if str(k).startswith("f"):
+                idx = int(k[1:])
+                fname = feature_pretty[idx] if idx < len(feature_pretty) else k
+            else:
+                fname = k
+            importance_pretty[fname] = float(v)
+        return importance_pretty
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if self.booster is not None:
+            try:
+                X32 = np.ascontiguousarray(X, dtype=np.float32)
+                proba = self.booster.inplace_predict(X32, iteration_range=self.iteration_range,
+                                                     missing=self.missing)
+                if proba.ndim == 1:  # binary:logistic -> P(class 1)
+                    proba = np.column_stack([1.0 - proba, proba])
+                return proba
+            except Exception:  # e.g. one malformed batch: the fast path stays on for the next call
+                logger.exception("In-place prediction failed, falling back to predict_proba for this call")
+        return np.asarray(self.clf.predict_proba(X))
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(labels, proba) from one probability pass; labels match clf.predict()."""
+        proba = self.predict_proba(X)
+        idx = proba.argmax(axis=1)
+        labels = self.classes[idx] if self.classes.size else idx
+        return labels, proba
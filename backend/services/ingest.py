@@ -0,0 +1,27 @@
+# ingest.py
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import pandas as pd # type: ignore
+
+# formats that can be parsed incrementally
+STREAM_FORMATS = (".csv", ".jsonl", ".ndjson")
+
+
+# ---------- Chunked upload parsing ----------
+def open_chunk_reader(fileobj, filename: str, chunk_rows: int = 5000) -> Iterator["pd.DataFrame"]:
+    """
+    Iterate over an uploaded file in DataFrames of at most chunk_rows rows.
+
+    fileobj is the UploadFile's spooled temp file, so neither the raw bytes nor
+    the full DataFrame are ever held in memory at once. Raises ValueError for
+    formats that can't be parsed incrementally (e.g. a single JSON array).
+    """
+    import pandas as pd # type: ignore  (heavy; only needed once a file is uploaded)
+
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return iter(pd.read_csv(fileobj, chunksize=chunk_rows))
+    if name.endswith((".jsonl", ".ndjson")):
+        return iter(pd.read_json(fileobj, lines=True, chunksize=chunk_rows))
+    raise ValueError(f"Streaming ingest supports {', '.join(STREAM_FORMATS)} files")
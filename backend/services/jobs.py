@@ -0,0 +1,329 @@
+# jobs.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np # type: ignore
+
+import crud
+from services.ingest import open_chunk_reader
+
+logger = logging.getLogger("exoplanet_api")
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+
+def count_rows(path: str, filename: str) -> int:
+    """Non-blank data lines (minus the CSV header); only used for progress/ETA, corrected when the job ends."""
+    with open(path, "rb") as f:
+        lines = sum(1 for line in f if line.strip())
+    return max(0, lines - 1) if filename.lower().endswith(".csv") else lines
+
+
+def _init_pool_process(parent_pid: int, initializer: Optional[Callable[[], None]]):
+    """Pool processes exit when the server process is gone (a SIGKILLed parent would otherwise leave them idle)."""
+    def watch_parent():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+    if initializer is not None:
+        initializer()
+
+
+# ---------- Background batch jobs ----------
+class JobManager:
+    """
+    Scores uploaded catalogs in the background, shard by shard.
+
+    The upload is copied to store_dir and a `jobs` row is created; the file is
+    then read in shards of shard_rows rows. Each shard is parsed here
+    (prepare), scored in a process pool (score_fn, so XGBoost + fuzzy rules use
+    every core) and inserted with crud.create_analyses_bulk. The job's progress
+    (shards_done, rows_done) is committed in the same transaction as the
+    shard's rows, so a restarted job skips exactly the committed shards.
+
+    Everything lives in the database, so any process can serve status/cancel
+    requests. The running process refreshes heartbeat_at every poll_s; jobs
+    whose heartbeat is older than stale_s (their process died or was
+    restarted) are claimed and resumed by whichever process notices first.
+
+    A done job's upload is removed right away; a cancelled or failed job keeps
+    it for keep_upload_s (so it can still be resumed), after which the
+    supervisor removes it.
+    """
+
+    def __init__(self, session_factory: Callable[[], Any], store_dir: str,
+                 prepare: Callable[[Any], Tuple[np.ndarray, int]],
+                 score_fn: Callable[[np.ndarray], List[Dict[str, Any]]],
+                 to_rows: Callable[[np.ndarray, List[Dict[str, Any]]], list],
+                 shard_rows: int = 5000, workers: Optional[int] = None,
+                 initializer: Optional[Callable[[], None]] = None,
+                 poll_s: float = 5.0, stale_s: float = 60.0, keep_upload_s: float = 3600.0):
+        self.session_factory = session_factory
+        self.store_dir = store_dir
+        self.prepare = prepare
+        self.score_fn = score_fn
+        self.to_rows = to_rows
+        self.shard_rows = max(1, int(shard_rows))
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.initializer = initializer
+        self.poll_s = poll_s
+        self.stale_s = stale_s
+        self.keep_upload_s = keep_upload_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._supervisor: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    # --- process pool ---
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: this process has threads (executor, Gemini pool) whose locks a fork could copy held
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_pool_process,
+                                                 initargs=(os.getpid(), self.initializer),
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    # --- db helpers (run in threads) ---
+    def _db(self, fn: Callable, *args, **kwargs):
+        db = self.session_factory()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    def get(self, job_id: str):
+        return self._db(crud.get_job, job_id)
+
+    def _store_upload(self, fileobj, filename: str, path: str):
+        """Copy the upload next to the other jobs and check its first rows can be scored."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        fileobj.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, 1024 * 1024)
+        try:
+            with open(path, "rb") as f:
+                first = next(open_chunk_reader(f, filename, 100), None)
+            if first is None or first.empty:
+                raise ValueError("Uploaded file has no rows")
+            self.prepare(first)
+        except BaseException:
+            os.remove(path)
+            raise
+
+    def _commit_shard(self, job_id: str, shard: int, X: np.ndarray, skipped: int,
+                      results: List[Dict[str, Any]], rows_per_sec: float):
+        """Insert one scored shard together with the job's progress; None if the job was cancelled or taken over."""
+        db = self.session_factory()
+        try:
+            job = crud.get_job(db, job_id)
+            if job is None or job.status != "running" or job.owner != self.owner:
+                return None
+            job.rows_done += len(results)
+            job.skipped_rows += skipped
+            job.shards_done = [*job.shards_done, shard]
+            job.rows_per_sec = rows_per_sec
+            job.heartbeat_at = time.time()
+            if results:
+                ids = crud.create_analyses_bulk(db, self.to_rows(X, results))  # also commits the job update
+                job.first_analysis_id = job.first_analysis_id or ids[0]
+                job.last_analysis_id = max(job.last_analysis_id or 0, ids[-1])
+            db.commit()
+            return job.rows_done
+        finally:
+            db.close()
+
+    # --- public API ---
+    async def submit(self, fileobj, filename: str):
+        """Store the upload and start scoring it; raises ValueError for unsupported/empty files."""
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.store_dir, job_id + os.path.splitext(filename or "")[1].lower())
+        await asyncio.to_thread(self._store_upload, fileobj, filename, path)
+        job = await asyncio.to_thread(self._db, crud.create_job, job_id, filename, path, self.owner, time.time())
+        await self._claim_and_start(job_id)
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        """Stop a queued/running job. Committed shards are kept; the job can be resumed later."""
+        cancelled = await asyncio.to_thread(self._db, crud.set_job_status, job_id, "cancelled")
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        self._notify(job_id)
+        return cancelled
+
+    async def resume(self, job_id: str) -> bool:
+        """Restart a cancelled or failed job from its first uncommitted shard, while its upload is kept."""
+        job = await asyncio.to_thread(self.get, job_id)
+        if job is None or not os.path.exists(job.path):
+            return False
+        requeued = await asyncio.to_thread(self._db, crud.set_job_status, job_id, "queued",
+                                           ("cancelled", "failed"), owner=self.owner, heartbeat_at=time.time())
+        if requeued:
+            await self._claim_and_start(job_id)
+        return requeued
+
+    def start(self):
+        """Begin heartbeating and picking up orphaned jobs (call from the app's lifespan)."""
+        if self._supervisor is None or self._supervisor.done():
+            self._supervisor = asyncio.get_running_loop().create_task(self._supervise())
+
+    async def shutdown(self):
+        """Stop local work. Running jobs stay "running" and are resumed once their heartbeat goes stale."""
+        tasks = [t for t in [self._supervisor, *self._tasks.values()] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def after_fork(self):
+        """Fresh identity and no inherited pool/tasks in a forked worker process."""
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = None
+        self._tasks = {}
+        self._supervisor = None
+        self._waiters = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "workers": self.workers, "shard_rows": self.shard_rows,
+                "running_here": sorted(self._tasks)}
+
+    # --- progress notifications (websocket clients; other processes' jobs are polled) ---
+    def subscribe(self, job_id: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(fut)
+        return fut
+
+    def unsubscribe(self, job_id: str, fut: asyncio.Future):
+        waiters = self._waiters.get(job_id, [])
+        if fut in waiters:
+            waiters.remove(fut)
+        if not waiters:
+            self._waiters.pop(job_id, None)
+
+    def _notify(self, job_id: str):
+        for fut in self._waiters.pop(job_id, []):
+            if not fut.done():
+                fut.set_result(None)
+
+    def _remove_stopped_uploads(self):
+        """Delete the stored uploads of jobs that are done, or stopped more than keep_upload_s ago."""
+        try:
+            job_ids = [os.path.splitext(name)[0] for name in os.listdir(self.store_dir)]
+        except FileNotFoundError:
+            return
+        if not job_ids:
+            return
+        stopped_before = datetime.now(timezone.utc) - timedelta(seconds=self.keep_upload_s)
+        for job_id, path in self._db(crud.get_stopped_job_uploads, job_ids, stopped_before):
+            try:
+                os.remove(path)
+                logger.info("Removed the upload of job %s", job_id)
+            except FileNotFoundError:
+                pass
+
+    # --- running ---
+    async def _claim_and_start(self, job_id: str) -> bool:
+        if job_id in self._tasks:
+            return False
+        now = time.time()
+        if not await asyncio.to_thread(self._db, crud.claim_job, job_id, self.owner, now, now - self.stale_s):
+            return False
+        task = asyncio.get_running_loop().create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return True
+
+    async def _supervise(self):
+        while True:
+            try:
+                now = time.time()
+                await asyncio.to_thread(self._db, crud.heartbeat_jobs, list(self._tasks), self.owner, now)
+                for job_id in await asyncio.to_thread(self._db, crud.get_orphaned_job_ids, now - self.stale_s):
+                    if await self._claim_and_start(job_id):
+                        logger.info("Resuming job %s", job_id)
+                await asyncio.to_thread(self._remove_stopped_uploads)
+            except Exception:
+                logger.exception("Job supervisor pass failed")
+            await asyncio.sleep(self.poll_s)
+
+    async def _run(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        pending: Deque[Tuple[int, np.ndarray, int, asyncio.Future]] = deque()
+        try:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job.total_rows is None:
+                job.total_rows = await asyncio.to_thread(count_rows, job.path, job.filename)
+                await asyncio.to_thread(self._db, crud.set_job_status, job_id, "running",
+                                        total_rows=job.total_rows)
+                self._notify(job_id)
+            done = set(job.shards_done or [])
+            start, rows_this_run = time.perf_counter(), 0
+
+            async def commit_next() -> bool:
+                nonlocal rows_this_run
+                shard, X, skipped, fut = pending.popleft()
+                results = await fut
+                rows_this_run += len(results)
+                elapsed = time.perf_counter() - start
+                committed = await asyncio.to_thread(self._commit_shard, job_id, shard, X, skipped, results,
+                                                    round(rows_this_run / elapsed, 1) if elapsed > 0 else 0.0)
+                self._notify(job_id)
+                return committed is not None
+
+            with open(job.path, "rb") as f:
+                reader = open_chunk_reader(f, job.filename, self.shard_rows)
+                shard = -1
+                while True:
+                    df = await asyncio.to_thread(next, reader, None)
+                    if df is None:
+                        break
+                    shard += 1
+                    if shard in done:
+                        continue
+                    X, skipped = await asyncio.to_thread(self.prepare, df)
+                    if len(X):
+                        fut = loop.run_in_executor(self._pool(), self.score_fn, X)
+                    else:
+                        fut = loop.create_future()
+                        fut.set_result([])
+                    pending.append((shard, X, skipped, fut))
+                    # keep every pool process busy while bounding memory
+                    if len(pending) >= 2 * self.workers and not await commit_next():
+                        return
+            while pending:
+                if not await commit_next():
+                    return
+
+            job = await asyncio.to_thread(self.get, job_id)
+            if await asyncio.to_thread(self._db, crud.set_job_status, job_id, "done", ("running",),
+                                       total_rows=job.rows_done + job.skipped_rows):
+                os.remove(job.path)
+                logger.info("Job %s done: %d rows (%d skipped)", job_id, job.rows_done, job.skipped_rows)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None  # a worker died; start a fresh pool for the next job
+            logger.exception("Job %s failed", job_id)
+            await asyncio.to_thread(self._db, crud.set_job_status, job_id, "failed", error=str(e)[:500])
+        finally:
+            for *_, fut in pending:
+                fut.cancel()
+            self._notify(job_id)
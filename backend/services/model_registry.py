@@ -0,0 +1,231 @@
+# model_registry.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib # type: ignore
+import numpy as np # type: ignore
+
+from services.artifacts import FileArtifact
+from services.inference import InferenceModel
+
+logger = logging.getLogger("exoplanet_api")
+
+KOI_MODEL_FILE = "koi_classifier.pkl"
+PLANET_MODEL_FILE = "planet_classifier.pkl"
+STATS_FILE = "feature_stats.pkl"
+BASE_VERSION = "base"  # the files directly in models_store/
+ACTIVE_FILE = "ACTIVE"  # name of the active version, shared by all workers
+
+
+class ModelUnavailable(RuntimeError):
+    """The requested model version doesn't exist or failed to load."""
+
+
+# ---------- One loaded version ----------
+class ModelBundle:
+    """KOI classifier, planet-type classifier and feature stats of one version."""
+
+    def __init__(self, version: str, koi: InferenceModel, planet: InferenceModel,
+                 feature_stats: FileArtifact):
+        self.version = version
+        self.koi = koi
+        self.planet = planet
+        self.feature_stats = feature_stats
+
+    def norms(self):
+        """(koi_norm, planet_norm); re-read when the version's feature_stats.pkl changes."""
+        return self.feature_stats.get()
+
+    def signature(self):
+        """Identifies everything scoring depends on; changes when the feature stats are replaced."""
+        self.feature_stats.get()
+        return self.version, self.feature_stats.signature
+
+
+# ---------- Registry ----------
+class ModelRegistry:
+    """
+    Versioned model artifacts under `root`:
+
+        models_store/{koi_classifier,planet_classifier,feature_stats}.pkl  -> version "base"
+        models_store/versions/<version>/ (same three files)                  -> version "<version>"
+
+    Versions are loaded on first use (or by warm_up()) and kept in memory.
+    activate() loads the new version completely before swapping the active
+    reference, so requests already running finish on the bundle they started
+    with. The active version is also written to models_store/ACTIVE; other
+    workers notice the change on their next request, load the version in the
+    background and keep serving the old one until it's ready.
+
+    A shadow version can score a sampled fraction of rows off the request
+    path; only agreement statistics are recorded.
+    """
+
+    def __init__(self, root: str, feature_pretty: List[str], stats_transform: Callable[[Any], Any],
+                 default_version: Optional[str] = None):
+        self.root = root
+        self.feature_pretty = feature_pretty
+        self.stats_transform = stats_transform
+        self.default_version = default_version
+        self._bundles: Dict[str, ModelBundle] = {}
+        self._load_lock = threading.Lock()
+        self._active: Optional[ModelBundle] = None
+        self._switching: Optional[str] = None
+        self._active_file = FileArtifact(os.path.join(root, ACTIVE_FILE),
+                                         loader=lambda p: open(p).read().strip())
+
+        self.shadow_version: Optional[str] = None
+        self.shadow_rate = 0.0
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_stats = {"rows": 0, "agree": 0, "abs_confidence_delta": 0.0, "errors": 0}
+
+    # --- discovery / loading ---
+    def _path(self, version: str) -> str:
+        return self.root if version == BASE_VERSION else os.path.join(self.root, "versions", version)
+
+    def available(self) -> List[str]:
+        versions = []
+        if os.path.exists(os.path.join(self.root, KOI_MODEL_FILE)):
+            versions.append(BASE_VERSION)
+        versions_dir = os.path.join(self.root, "versions")
+        if os.path.isdir(versions_dir):
+            versions += sorted(v for v in os.listdir(versions_dir)
+                               if os.path.exists(os.path.join(versions_dir, v, KOI_MODEL_FILE)))
+        return versions
+
+    def get(self, version: str) -> ModelBundle:
+        """Bundle for `version`, loading it on first use."""
+        bundle = self._bundles.get(version)
+        if bundle is not None:
+            return bundle
+        with self._load_lock:
+            if version not in self._bundles:
+                self._bundles[version] = self._load(version)
+        return self._bundles[version]
+
+    def _load(self, version: str) -> ModelBundle:
+        path = self._path(version)
+        if version not in self.available():
+            raise ModelUnavailable(f"Model version {version!r} not found")
+        try:
+            koi = joblib.load(os.path.join(path, KOI_MODEL_FILE))
+            planet = joblib.load(os.path.join(path, PLANET_MODEL_FILE))
+            feature_stats = FileArtifact(os.path.join(path, STATS_FILE), transform=self.stats_transform)
+            feature_stats.get()
+        except Exception as e:
+            logger.exception("Failed to load model version %s", version)
+            raise ModelUnavailable(f"Model version {version!r} failed to load: {e}")
+        logger.info("Loaded model version %s from %s", version, path)
+        return ModelBundle(version, InferenceModel(koi, self.feature_pretty), InferenceModel(planet), feature_stats)
+
+    # --- active version ---
+    def _wanted_version(self) -> str:
+        try:
+            wanted = self._active_file.get()
+        except OSError:  # no ACTIVE file yet
+            wanted = None
+        if wanted:
+            return wanted
+        if self.default_version:
+            return self.default_version
+        available = self.available()
+        if not available:
+            raise ModelUnavailable(f"No model artifacts found in {self.root}")
+        return BASE_VERSION if BASE_VERSION in available else available[-1]
+
+    def active(self) -> ModelBundle:
+        """Bundle to score the current request with (cheap: one stat() when nothing changed)."""
+        wanted = self._wanted_version()
+        bundle = self._active
+        if bundle is None:
+            self._active = bundle = self.get(wanted)
+        elif bundle.version != wanted and self._switching != wanted:
+            self._switching = wanted
+            threading.Thread(target=self._switch, args=(wanted,), daemon=True).start()
+        return bundle
+
+    def _switch(self, version: str):
+        try:
+            self._active = self.get(version)
+            logger.info("Active model version is now %s", version)
+        except ModelUnavailable:
+            pass  # logged by _load; keep serving the current version
+        finally:
+            self._switching = None
+
+    def activate(self, version: str) -> ModelBundle:
+        """Load `version`, make it active here and record it for the other workers."""
+        bundle = self.get(version)
+        tmp = os.path.join(self.root, ACTIVE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(self.root, ACTIVE_FILE))
+        self._active = bundle
+        logger.info("Activated model version %s", version)
+        return bundle
+
+    def warm_up(self, background: bool = True):
+        """Load the active (and shadow) version ahead of the first request."""
+        def run():
+            try:
+                self.active()
+                if self.shadow_version:
+                    self.get(self.shadow_version)
+            except ModelUnavailable:
+                pass
+        if background:
+            threading.Thread(target=run, name="model-warm-up", daemon=True).start()
+        else:
+            run()
+
+    # --- shadow scoring ---
+    def set_shadow(self, version: Optional[str], rate: float):
+        if version is not None:
+            self.get(version)
+        self.shadow_version = version
+        self.shadow_rate = min(max(float(rate), 0.0), 1.0)
+        self._shadow_stats = {"rows": 0, "agree": 0, "abs_confidence_delta": 0.0, "errors": 0}
+
+    def shadow(self, X: np.ndarray, codes: np.ndarray, confidence: np.ndarray, primary: ModelBundle):
+        """Queue a sampled subset of rows for the shadow model; never blocks the caller."""
+        version = self.shadow_version
+        if version is None or version == primary.version or self.shadow_rate <= 0:
+            return
+        if self.shadow_rate < 1.0:
+            mask = np.random.random(len(X)) < self.shadow_rate
+            if not mask.any():
+                return
+            X, codes, confidence = X[mask], codes[mask], confidence[mask]
+        self._shadow_pool.submit(self._run_shadow, version, np.array(X), codes, confidence)
+
+    def _run_shadow(self, version: str, X: np.ndarray, codes: np.ndarray, confidence: np.ndarray):
+        stats = self._shadow_stats
+        try:
+            s_codes, s_proba = self.get(version).koi.predict(X)
+        except Exception:
+            stats["errors"] += 1
+            logger.exception("Shadow scoring with version %s failed", version)
+            return
+        stats["rows"] += len(X)
+        stats["agree"] += int((np.asarray(s_codes) == np.asarray(codes)).sum())
+        stats["abs_confidence_delta"] += float(np.abs(s_proba.max(axis=1) - confidence).sum())
+
+    def describe(self) -> Dict[str, Any]:
+        stats = self._shadow_stats
+        rows = stats["rows"]
+        return {
+            "active": self._active.version if self._active is not None else None,
+            "available": self.available(),
+            "loaded": sorted(self._bundles),
+            "shadow": {
+                "version": self.shadow_version,
+                "sample_rate": self.shadow_rate,
+                "rows": rows,
+                "agreement": round(stats["agree"] / rows, 4) if rows else None,
+                "mean_abs_confidence_delta": round(stats["abs_confidence_delta"] / rows, 4) if rows else None,
+                "errors": stats["errors"],
+            },
+        }
@@ -0,0 +1,73 @@
+# normalization.py
+from typing import Dict, Any, List, Tuple
+import numpy as np # type: ignore
+
+OUTLIER_Z = 3.0
+EXTREME_Z = 5.0
+OUTLIER_DECAY = 0.15
+
+
+def reliability_label(score: float) -> str:
+    if score > 0.8:
+        return "High"
+    elif score > 0.5:
+        return "Medium"
+    else:
+        return "Low"
+
+
+# ---------- Feature normalization ----------
+class FeatureStats:
+    """Training means/stds as contiguous vectors in a fixed feature order (std == 0 guarded once)."""
+
+    def __init__(self, stats: Dict[str, Any], feature_keys: List[str]):
+        self.keys = list(feature_keys)
+        self.mean = np.ascontiguousarray([float(stats["means"][k]) for k in self.keys], dtype=float)
+        std = np.ascontiguousarray([float(stats["stds"][k]) for k in self.keys], dtype=float)
+        std[std == 0] = 1.0
+        self.std = std
+
+    def select(self, keys: List[str]) -> "FeatureStats":
+        """Stats for a subset/reordering of the features (e.g. the planet-type inputs)."""
+        idx = [self.keys.index(k) for k in keys]
+        return FeatureStats({"means": dict(zip(keys, self.mean[idx])),
+                             "stds": dict(zip(keys, self.std[idx]))}, keys)
+
+    def score(self, X: np.ndarray) -> "OutlierScores":
+        return OutlierScores(self, np.asarray(X, dtype=float).reshape(-1, len(self.keys)))
+
+
+class OutlierScores:
+    """Z-scores, outlier flags and reliability decay for an (N x F) matrix, computed in one pass."""
+
+    def __init__(self, fs: FeatureStats, X: np.ndarray):
+        self.keys = fs.keys
+        self.mean = fs.mean
+        self.std = fs.std
+        self.X = X
+        self.z = (X - fs.mean) / fs.std
+        abs_z = np.abs(self.z)
+        self.outliers = abs_z > OUTLIER_Z
+        self.extreme = (abs_z > EXTREME_Z).any(axis=1)
+        self.n_outliers = self.outliers.sum(axis=1)
+        self.decay = np.exp(-OUTLIER_DECAY * self.n_outliers)
+
+    def reliability(self, confidence: np.ndarray) -> np.ndarray:
+        return np.asarray(confidence, dtype=float) * self.decay
+
+    # --- per-row dict shapes, built only when a response needs them ---
+    def z_dict(self, i: int) -> Dict[str, float]:
+        return dict(zip(self.keys, map(float, self.z[i])))
+
+    def stats_dict(self, i: int) -> Dict[str, Dict[str, float]]:
+        return {
+            key: {"value": float(self.X[i, f]), "mean": float(self.mean[f]),
+                  "std": float(self.std[f]), "z": float(self.z[i, f])}
+            for f, key in enumerate(self.keys)
+        }
+
+    def flags(self, i: int) -> List[Tuple[str, float]]:
+        return [(self.keys[f], float(self.z[i, f])) for f in np.flatnonzero(self.outliers[i])]
+
+    def outlier_list(self, i: int) -> List[Dict[str, Any]]:
+        return [{"feature": k, "z": z} for k, z in self.flags(i)]
@@ -0,0 +1,30 @@
+# pagination.py
+import base64
+import json
+from typing import Optional
+
+
+# ---------- Opaque keyset cursors ----------
+def encode_cursor(db_obj, sort: str = "created_at", order: str = "desc") -> str:
+    """Token pointing just past db_obj in (sort, id) `order` order; only valid for that sort and order."""
+    raw = json.dumps({"id": db_obj.id, "sort": sort, "order": order}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str], sort: str = "created_at", order: str = "desc") -> Optional[int]:
+    """
+    Analysis id the next page starts after; None for the first page.
+    Raises ValueError if malformed or issued for another sort/order.
+    """
+    if not token:
+        return None
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        after_id = int(data["id"])
+        issued = (data.get("sort", "created_at"), data.get("order", "desc"))  # tokens without them: /history order
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if issued != (sort, order):
+        raise ValueError(f"Cursor was issued for sort={issued[0]}&order={issued[1]}, not sort={sort}&order={order}")
+    return after_id
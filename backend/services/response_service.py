@@ -156,24 +156,111 @@ def format_upload_response(raw: Dict[str, Any], analysis_id: int) -> Dict[str, A
         "planet_type": raw.get("planet_type", {}).get("ml_prediction") if "planet_type" in raw else None,
         "extreme_outlier": raw["extreme_outlier"],
         "logs": logs,
+        "explanation": raw.get("gemini_koi_explanation"),
+        "explanation_status": raw.get("explanation_status", "ready"),
+        "model_version": raw.get("model_version"),
     }
 
 
-def format_explorer_response(db_objs) -> List[Dict[str, Any]]:
+def format_explanation_response(db_obj) -> Dict[str, Any]:
+    r = db_obj.result
+    if r is not None:  # stored before the compact layout (see services/result_store.py)
+        return {
+            "analysis_id": db_obj.id,
+            "status": r.get("explanation_status", "ready"),
+            "gemini_koi_explanation": r.get("gemini_koi_explanation"),
+            "gemini_planet_explanation": (r.get("planet_type") or {}).get("gemini_planet_explanation"),
+        }
+    return {
+        "analysis_id": db_obj.id,
+        "status": db_obj.explanation_status or "ready",
+        "gemini_koi_explanation": db_obj.explanation,
+        "gemini_planet_explanation": db_obj.planet_explanation,
+    }
+
+
+def format_batch_response(raws: List[Dict[str, Any]], analysis_ids: List[Optional[int]],
+                          elapsed: float, skipped: int = 0) -> Dict[str, Any]:
+    results = []
+    for raw, analysis_id in zip(raws, analysis_ids):
+        results.append({
+            "analysis_id": analysis_id,
+            "prediction": raw["prediction"],
+            "confidence": round(raw["confidence"], 3),
+            "reliability": raw["reliability"]["label"],
+            "planet_type": raw.get("planet_type", {}).get("ml_prediction") if "planet_type" in raw else None,
+            "outlier_count": len(raw["outliers"]),
+            "extreme_outlier": raw["extreme_outlier"],
+        })
+    return {
+        "rows": len(results),
+        "skipped_rows": skipped,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(len(results) / elapsed, 1) if elapsed > 0 else 0.0,
+        "model_version": raws[0].get("model_version") if raws else None,
+        "results": results,
+    }
+
+
+def format_explorer_response(rows) -> List[Dict[str, Any]]:
+    """rows: Analysis objects or summary-column rows (see crud.get_analysis_summaries)."""
     formatted = []
-    for obj in db_objs:
-        r = obj.result  # ORM object -> access column
+    for row in rows:
         formatted.append({
-            "analysis_id": obj.id,
-            "prediction": r["prediction"],
-            "confidence": round(r["confidence"], 3),
-            "reliability": r["reliability"]["label"],
-            "planet_type": r.get("planet_type", {}).get("ml_prediction") if "planet_type" in r else None,
-            "outlier_count": len(r["outliers"]),
+            "analysis_id": row.id,
+            "prediction": row.prediction,
+            "confidence": round(row.confidence, 3) if row.confidence is not None else None,
+            "reliability": row.reliability_label,
+            "planet_type": row.planet_type,
+            "outlier_count": row.outlier_count,
         })
     return formatted
 
 
+def format_similar_response(rows, neighbours) -> List[Dict[str, Any]]:
+    """Explorer entries of the (id, distance) neighbours, nearest first (ids no longer stored are skipped)."""
+    by_id = {entry["analysis_id"]: entry for entry in format_explorer_response(rows)}
+    return [{**by_id[i], "distance": round(d, 4)} for i, d in neighbours if i in by_id]
+
+
+def format_job_response(job) -> Dict[str, Any]:
+    """Job row -> status/progress payload (REST and /ws/jobs/{job_id})."""
+    processed = job.rows_done + job.skipped_rows
+    progress, eta_s = None, None
+    if job.status == "done":
+        progress = 1.0
+    elif job.total_rows:
+        progress = round(min(processed / job.total_rows, 1.0), 4)
+        if job.status == "running" and job.rows_per_sec:
+            eta_s = round(max(job.total_rows - processed, 0) / job.rows_per_sec, 1)
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "total_rows": job.total_rows,
+        "rows_done": job.rows_done,
+        "skipped_rows": job.skipped_rows,
+        "progress": progress,
+        "rows_per_sec": job.rows_per_sec,
+        "eta_s": eta_s,
+        "first_analysis_id": job.first_analysis_id,
+        "last_analysis_id": job.last_analysis_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def format_stats_summary(totals: Dict[str, Any], period: Optional[str] = None,
+                         series: Optional[List[tuple]] = None) -> Dict[str, Any]:
+    """totals / series entries: {"total", "prediction", "planet_type", "reliability", "outliers"} counts."""
+    response = dict(totals)
+    if period is not None:
+        response["bucket"] = period
+        response["series"] = [{"start": start, **counts} for start, counts in series or []]
+    return response
+
+
 def format_analysis_response(raw: Dict[str, Any]) -> Dict[str, Any]:
     response = raw.copy()
 
@@ -0,0 +1,83 @@
+# result_cache.py
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np # type: ignore
+
+
+def feature_key(row: np.ndarray) -> bytes:
+    """Canonical bytes of a feature vector (-0.0 -> 0.0, every NaN the same)."""
+    row = np.asarray(row, dtype=np.float64).ravel() + 0.0  # + 0.0 turns -0.0 into 0.0
+    row[np.isnan(row)] = np.nan
+    return row.tobytes()
+
+
+# ---------- Memoized scoring results ----------
+class ResultCache:
+    """
+    LRU of scoring payloads keyed by the canonical feature vector.
+
+    Scoring is a pure function of the inputs and the model artifacts, so
+    entries are only valid for one `generation` (model version + artifact
+    signatures); when the generation changes the cache is cleared. Payloads
+    are stored pickled, which gives both a cheap independent copy per hit
+    (callers mutate the payload) and an exact byte size for the memory bound.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self._lru: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: Optional[Hashable] = None
+        self.bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_generation(self, generation: Hashable):
+        if generation != self._generation:
+            if self._lru:
+                self.counters["invalidations"] += 1
+            self._lru.clear()
+            self.bytes = 0
+            self._generation = generation
+
+    def get(self, generation: Hashable, key: bytes) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._check_generation(generation)
+            blob = self._lru.get(key)
+            if blob is None:
+                self.counters["misses"] += 1
+                return None
+            self._lru.move_to_end(key)
+            self.counters["hits"] += 1
+        return pickle.loads(blob)
+
+    def put(self, generation: Hashable, key: bytes, payload: Dict[str, Any]):
+        blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            old = self._lru.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._lru[key] = blob
+            self.bytes += len(blob)
+            self.counters["stores"] += 1
+            while len(self._lru) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._lru.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else None,
+            "entries": len(self._lru),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,147 @@
+# result_store.py
+import hashlib
+import json
+import struct
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from services.normalization import OUTLIER_Z, EXTREME_Z, reliability_label
+
+
+# ---------- Compact analysis rows ----------
+# A scored row used to be stored as the whole /predict payload. Most of it is
+# either the same for every row of a model version (feature importance,
+# training means/stds, class names) or derived from other values (z-scores,
+# stats, outlier flags, agreement). Rows now keep only their own values:
+# inputs and codes in typed columns, probabilities/scores as packed float64
+# arrays, the Gemini texts once each, plus the key of a result context with
+# the shared parts. unpack_result() rebuilds the original payload: same keys,
+# same float values (z-scores are recomputed with the same float arithmetic).
+
+def pack_floats(values: Iterable[float]) -> bytes:
+    values = list(values)
+    return struct.pack(f"<{len(values)}d", *values)
+
+
+def unpack_floats(blob: bytes) -> Tuple[float, ...]:
+    return struct.unpack(f"<{len(blob) // 8}d", blob)
+
+
+def result_context(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a payload shared with other rows of the same model version (planet part only for exoplanets)."""
+    stats = result["stats"]
+    context = {
+        "model_version": result.get("model_version"),
+        "feature_importance": result["feature_importance"],
+        "features": list(stats),
+        "means": [s["mean"] for s in stats.values()],
+        "stds": [s["std"] for s in stats.values()],
+        "classes": list(result["probabilities"]),
+    }
+    planet = result.get("planet_type")
+    if planet:
+        planet_stats = planet["planet_stats"]
+        context.update({
+            "planet_features": list(planet_stats),
+            "planet_means": [s["mean"] for s in planet_stats.values()],
+            "planet_stds": [s["std"] for s in planet_stats.values()],
+            "planet_classes": list(planet["ml_probabilities"]),
+            "rule_classes": list(planet["rule_scores"]),
+        })
+    return context
+
+
+def context_key(context: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def pack_result(features: Dict[str, Any], result: Dict[str, Any], key: str,
+                feature_columns: Sequence[str]) -> Dict[str, Any]:
+    """Column values of one row (models.Analysis), given the key of its result context."""
+    stats = result["stats"]
+    planet = result.get("planet_type")
+    row = {k: stats[k]["value"] for k in feature_columns}  # the values actually scored
+    row.update({
+        "features": {k: v for k, v in features.items() if k not in stats} or None,
+        "context_key": key,
+        "prediction_code": result["prediction_code"],
+        "probabilities": pack_floats(result["probabilities"].values()),
+        "explanation_status": result.get("explanation_status"),
+        "planet_code": None,
+        "planet_rule_type": None,
+        "planet_scores": None,
+        "planet_explanation": None,
+    })
+    if planet:
+        row.update({
+            "planet_code": planet["ml_code"],
+            "planet_rule_type": planet["rule_based_prediction"],
+            "planet_scores": pack_floats([*planet["ml_probabilities"].values(), *planet["rule_scores"].values(),
+                                          planet["planet_reliability"]["score"]]),
+            "planet_explanation": planet.get("gemini_planet_explanation"),
+        })
+    return row
+
+
+def _feature_stats(keys: List[str], values: List[float], means: List[float], stds: List[float]):
+    """z-scores, stats dict, outliers, extreme flag (as OutlierScores builds them)."""
+    z_scores, stats, outliers, extreme = {}, {}, [], False
+    for k, x, m, s in zip(keys, values, means, stds):
+        z = (x - m) / s
+        z_scores[k] = z
+        stats[k] = {"value": x, "mean": m, "std": s, "z": z}
+        if abs(z) > OUTLIER_Z:
+            outliers.append({"feature": k, "z": z})
+        if abs(z) > EXTREME_Z:
+            extreme = True
+    return z_scores, stats, outliers, extreme
+
+
+def unpack_features(row, feature_columns: Sequence[str]) -> Dict[str, Any]:
+    return {**{k: getattr(row, k) for k in feature_columns}, **(row.features or {})}
+
+
+def unpack_result(row, context: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the stored payload of a compact row."""
+    keys = context["features"]
+    values = [getattr(row, k) for k in keys]
+    z_scores, stats, outliers, extreme = _feature_stats(keys, values, context["means"], context["stds"])
+    result: Dict[str, Any] = {
+        "prediction": row.prediction,
+        "prediction_code": row.prediction_code,
+        "probabilities": dict(zip(context["classes"], unpack_floats(row.probabilities))),
+        "confidence": row.confidence,
+        "reliability": {"score": row.reliability_score, "label": row.reliability_label},
+        "z_scores": z_scores,
+        "stats": stats,
+        "outliers": outliers,
+        "extreme_outlier": extreme,
+        "feature_importance": dict(context["feature_importance"]),
+        "gemini_koi_explanation": row.explanation,
+    }
+    if context["model_version"] is not None:  # payloads from before the model registry have no version
+        result["model_version"] = context["model_version"]
+    if row.planet_code is not None:
+        planet_keys = context["planet_features"]
+        by_key = dict(zip(keys, values))
+        p_z, p_stats, p_outliers, p_extreme = _feature_stats(
+            planet_keys, [by_key[k] for k in planet_keys], context["planet_means"], context["planet_stds"])
+        scores = unpack_floats(row.planet_scores)
+        n_ml, n_rule = len(context["planet_classes"]), len(context["rule_classes"])
+        reliability = scores[n_ml + n_rule]
+        result["planet_type"] = {
+            "ml_prediction": row.planet_type,
+            "ml_code": row.planet_code,
+            "ml_probabilities": dict(zip(context["planet_classes"], scores[:n_ml])),
+            "rule_based_prediction": row.planet_rule_type,
+            "rule_scores": dict(zip(context["rule_classes"], scores[n_ml:n_ml + n_rule])),
+            "agreement": row.planet_type == row.planet_rule_type,
+            "gemini_planet_explanation": row.planet_explanation,
+            "planet_z_scores": p_z,
+            "planet_stats": p_stats,
+            "planet_outliers": p_outliers,
+            "planet_extreme_outlier": p_extreme,
+            "planet_reliability": {"score": reliability, "label": reliability_label(reliability)},
+        }
+    if row.explanation_status is not None:
+        result["explanation_status"] = row.explanation_status
+    return result
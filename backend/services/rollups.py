@@ -0,0 +1,81 @@
+# rollups.py
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Counters kept per analysis (crud adds them in the insert transaction):
+#   ("all", "", dimension, value)            totals
+#   ("day", "2026-10-17", dimension, value)  per UTC day
+#   ("hour", "2026-10-17T07", dimension, value)
+# dimension "total" (value "") counts rows; the others count summary column values.
+PERIODS = {"day": ("%Y-%m-%d", timedelta(days=1)), "hour": ("%Y-%m-%dT%H", timedelta(hours=1))}
+DIMENSIONS = ("prediction", "planet_type", "reliability", "outliers")
+OUTLIER_BUCKETS = ((5, "5+"), (3, "3-4"), (2, "2"), (1, "1"), (0, "0"))
+
+RollupKey = Tuple[str, str, str, str]
+
+
+def outlier_bucket(count: Optional[int]) -> Optional[str]:
+    if count is None:
+        return None
+    return next(label for low, label in OUTLIER_BUCKETS if count >= low)
+
+
+def as_utc(ts: datetime) -> datetime:
+    """created_at comes back naive from SQLite (stored as UTC) and aware from Postgres."""
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def bucket_of(ts: datetime, period: str) -> str:
+    return as_utc(ts).strftime(PERIODS[period][0])
+
+
+def bucket_start_iso(bucket: str, period: str) -> str:
+    return datetime.strptime(bucket, PERIODS[period][0]).replace(tzinfo=timezone.utc).isoformat()
+
+
+def bucket_starts(period: str, count: int, now: datetime) -> List[str]:
+    """The `count` most recent buckets of `period` up to now, oldest first."""
+    fmt, step = PERIODS[period]
+    now = as_utc(now)
+    return [(now - step * i).strftime(fmt) for i in range(count - 1, -1, -1)]
+
+
+def row_values(row: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Rolled-up value of each dimension for one analysis (summary columns, see crud.summary_columns)."""
+    return {
+        "prediction": row.get("prediction"),
+        "planet_type": row.get("planet_type"),
+        "reliability": row.get("reliability_label"),
+        "outliers": outlier_bucket(row.get("outlier_count")),
+    }
+
+
+def rollup_counts(rows: Iterable[Tuple[Dict[str, Any], datetime]]) -> Counter:
+    """Counter increments for (summary columns, created_at) pairs."""
+    counts: Counter = Counter()
+    for row, created_at in rows:
+        buckets = [("all", "")] + [(period, bucket_of(created_at, period)) for period in PERIODS]
+        values = [("total", "")] + [(d, v) for d, v in row_values(row).items() if v is not None]
+        for period, bucket in buckets:
+            for dimension, value in values:
+                counts[period, bucket, dimension, value] += 1
+    return counts
+
+
+def summarize(rows: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    """Rollup rows (bucket, dimension, value, count) -> {bucket: {"total": n, dimension: {value: n}}}."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        entry = out.setdefault(row.bucket, empty_summary())
+        if row.dimension == "total":
+            entry["total"] = row.count
+        else:
+            entry[row.dimension][row.value] = row.count
+    return out
+
+
+def empty_summary() -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"total": 0, **{d: {} for d in DIMENSIONS}}
+    summary["outliers"] = {label: 0 for _, label in reversed(OUTLIER_BUCKETS)}
+    return summary
@@ -0,0 +1,311 @@
+# similarity.py
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import joblib # type: ignore
+import numpy as np # type: ignore
+
+import crud, models
+
+# sklearn (~1s to import, with scipy) is only needed once the index is built or searched
+if TYPE_CHECKING:
+    from sklearn.neighbors import KDTree # type: ignore
+
+logger = logging.getLogger("exoplanet_api")
+
+INDEX_FORMAT = 2
+INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", "similarity_index.joblib") or None  # saved tree (None: not saved)
+
+
+# ---------- Nearest-neighbour index over stored analyses ----------
+class SimilarityIndex:
+    """
+    k-nearest-neighbour search over the feature vectors of stored analyses,
+    in z-score space (feature_stats.pkl means/stds, so every feature weighs
+    the same).
+
+    Rows live in a KD-tree plus a small delta of newer rows that is scanned
+    brute force. refresh() appends analyses past the last indexed id to the
+    delta; searches run it after an insert in this process (notify(), a crud
+    created listener) and otherwise every `refresh_s` seconds, which picks up
+    rows inserted by other workers. Once the delta
+    reaches `merge_rows`, a new tree is built in a background thread and saved
+    to `path`; after a restart the saved tree is loaded and only newer rows are
+    read from the database.
+
+    Concurrent transactions can commit a lower id after a higher one, so the
+    ids skipped below the last indexed id (at most `gap_window` of them) are
+    remembered as gaps and looked up again on every refresh, until they show
+    up or `gap_ttl_s` seconds pass (rolled back or deleted rows never do).
+    Gaps are saved with the tree.
+    """
+
+    def __init__(self, session_factory: Callable[[], Any], norm: Callable[[], Any],
+                 path: Optional[str] = None, merge_rows: int = 4096, refresh_s: float = 1.0,
+                 batch_size: int = 20000, gap_window: int = 10000, gap_ttl_s: float = 600.0):
+        self.session_factory = session_factory
+        self.norm = norm  # -> FeatureStats (mean/std vectors in models.FEATURE_COLUMNS order)
+        self.path = path
+        self.merge_rows = max(1, int(merge_rows))
+        self.refresh_s = float(refresh_s)
+        self.batch_size = batch_size
+        self.gap_window = int(gap_window)
+        self.gap_ttl_s = float(gap_ttl_s)
+        self._dirty = False
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._merging = False
+        self._clear()
+
+    def _clear(self):
+        dims = len(models.FEATURE_COLUMNS)
+        self._generation = getattr(self, "_generation", 0) + 1
+        self.mean: Optional[np.ndarray] = None
+        self.std: Optional[np.ndarray] = None
+        self.high_water = 0  # largest analysis id indexed (tree or delta)
+        self._gaps: Dict[int, float] = {}  # skipped id below high_water -> time.time() it was noticed
+        self._tree: Optional["KDTree"] = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_X = np.empty((0, dims))
+
+    # --- building / loading ---
+    def build(self, ids: np.ndarray, X: np.ndarray, mean: np.ndarray, std: np.ndarray):
+        """Replace the index with raw feature rows X (ids ascending)."""
+        from sklearn.neighbors import KDTree # type: ignore
+        mean, std = np.asarray(mean, dtype=float), np.asarray(std, dtype=float)
+        Z = (np.asarray(X, dtype=float) - mean) / std
+        tree = KDTree(Z) if len(Z) else None
+        with self._lock:
+            self._clear()
+            self.mean, self.std = mean, std
+            self._tree, self._tree_ids = tree, np.asarray(ids, dtype=np.int64)
+            self.high_water = int(self._tree_ids[-1]) if len(self._tree_ids) else 0
+            self._note_gaps(self._tree_ids, 0)
+            self._loaded = True
+
+    def _read_rows(self, after_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, raw feature rows) of analyses with id > after_id."""
+        id_chunks, x_chunks = [], []
+        db = self.session_factory()
+        try:
+            while True:
+                rows = crud.get_feature_rows(db, after_id=after_id, limit=self.batch_size)
+                if not rows:
+                    break
+                block = np.array(rows, dtype=float)
+                id_chunks.append(block[:, 0].astype(np.int64))
+                x_chunks.append(block[:, 1:])
+                after_id = rows[-1][0]
+        finally:
+            db.close()
+        if not id_chunks:
+            return np.empty(0, dtype=np.int64), np.empty((0, self._delta_X.shape[1]))
+        return np.concatenate(id_chunks), np.vstack(x_chunks)
+
+    def load_saved(self, fs) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            saved = joblib.load(self.path)
+        except Exception:
+            logger.exception("Could not read similarity index %s", self.path)
+            return False
+        if (saved.get("format") != INDEX_FORMAT or not np.array_equal(saved["mean"], fs.mean)
+                or not np.array_equal(saved["std"], fs.std)):
+            return False  # written with other feature stats
+        with self._lock:
+            self._clear()
+            self.mean, self.std = saved["mean"], saved["std"]
+            self._tree, self._tree_ids = saved["tree"], saved["ids"]
+            self.high_water = saved["high_water"]
+            self._gaps = dict(saved["gaps"])
+            self._loaded = True
+        return True
+
+    def load(self):
+        """Load the saved index (or build it from the analyses table), then catch up."""
+        fs = self.norm()
+        if self.load_saved(fs):
+            logger.info("Loaded similarity index (%d rows) from %s", len(self._tree_ids), self.path)
+        else:
+            ids, X = self._read_rows(0)
+            self.build(ids, X, fs.mean, fs.std)
+            logger.info("Built similarity index over %d analyses", len(ids))
+            self.save()
+        self.refresh()
+
+    def _current(self, fs) -> bool:
+        return self._loaded and np.array_equal(fs.mean, self.mean) and np.array_equal(fs.std, self.std)
+
+    def ensure_loaded(self):
+        """Load on first use, and rebuild when the active model's feature stats change."""
+        if self._current(self.norm()):
+            return
+        with self._load_lock:
+            if not self._current(self.norm()):
+                self.load()
+
+    def warm_up(self):
+        def run():
+            try:
+                self.ensure_loaded()
+            except Exception:
+                logger.exception("Similarity index warm-up failed")
+        threading.Thread(target=run, name="similarity-warm-up", daemon=True).start()
+
+    # --- incremental updates ---
+    def notify(self, rows: List[dict]):
+        """crud created listener: the next search reads the new rows."""
+        self._dirty = True
+
+    def refresh(self):
+        """Append analyses inserted since the last refresh (by any worker), and gaps that got filled, to the delta."""
+        self._dirty = False
+        self._refreshed_at = time.monotonic()
+        self.append(*self._read_gaps())
+        self.append(*self._read_rows(self.high_water))
+
+    def _note_gaps(self, ids: np.ndarray, after_id: int):
+        """Remember the ids between after_id and max(ids) that are missing from `ids` (caller holds _lock)."""
+        if not len(ids):
+            return
+        top = int(ids.max())
+        low = max(after_id + 1, top - self.gap_window + 1, 1)
+        if top - low + 1 == len(ids[ids >= low]):
+            return  # no gaps
+        now = time.time()
+        for gap in np.setdiff1d(np.arange(low, top + 1, dtype=np.int64), ids, assume_unique=True):
+            self._gaps.setdefault(int(gap), now)
+
+    def _read_gaps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, raw feature rows) of gaps that have been committed since; expired gaps are dropped."""
+        expired_before = time.time() - self.gap_ttl_s
+        with self._lock:
+            for gap in [g for g, t in self._gaps.items() if t < expired_before]:
+                del self._gaps[gap]
+            gaps = sorted(self._gaps)
+        rows = []
+        if gaps:
+            gaps = np.asarray(gaps, dtype=np.int64)
+            breaks = np.flatnonzero(np.diff(gaps) != 1) + 1  # one range query per run of consecutive ids
+            db = self.session_factory()
+            try:
+                for run in np.split(gaps, breaks):
+                    rows.extend(crud.get_feature_rows(db, after_id=int(run[0]) - 1, limit=len(run),
+                                                      before_id=int(run[-1]) + 1))
+            finally:
+                db.close()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, self._delta_X.shape[1]))
+        block = np.array(rows, dtype=float)
+        return block[:, 0].astype(np.int64), block[:, 1:]
+
+    def append(self, ids: np.ndarray, X: np.ndarray):
+        """Add raw feature rows (ids ascending, past high_water or filling a gap) to the delta."""
+        if not len(ids):
+            return
+        Z = (X - self.mean) / self.std
+        with self._lock:
+            # another thread may have appended them meanwhile
+            keep = ids > self.high_water
+            below = ~keep
+            if below.any():
+                keep[below] = [int(i) in self._gaps for i in ids[below]]
+            if not keep.any():
+                return
+            ids, Z = ids[keep], Z[keep]
+            for i in ids[ids <= self.high_water]:
+                del self._gaps[int(i)]
+            self._note_gaps(ids[ids > self.high_water], self.high_water)
+            self._delta_ids = np.concatenate([self._delta_ids, ids])
+            self._delta_X = np.vstack([self._delta_X, Z])
+            self.high_water = max(self.high_water, int(ids.max()))
+            start_merge = len(self._delta_ids) >= self.merge_rows and not self._merging
+            self._merging = self._merging or start_merge
+        if start_merge:
+            threading.Thread(target=self._merge, name="similarity-merge", daemon=True).start()
+
+    def _merge(self):
+        """Rebuild the tree with the current delta; searches keep using the old one meanwhile."""
+        from sklearn.neighbors import KDTree # type: ignore
+        try:
+            with self._lock:
+                generation, tree, tree_ids = self._generation, self._tree, self._tree_ids
+                n, delta_ids, delta_X = len(self._delta_ids), self._delta_ids, self._delta_X
+            Z = np.vstack([np.asarray(tree.data), delta_X]) if tree is not None else delta_X
+            new_tree = KDTree(Z)
+            with self._lock:
+                if self._generation != generation:  # cleared or rebuilt meanwhile
+                    return
+                self._tree, self._tree_ids = new_tree, np.concatenate([tree_ids, delta_ids])
+                self._delta_ids, self._delta_X = self._delta_ids[n:], self._delta_X[n:]
+            self.save()
+        except Exception:
+            logger.exception("Similarity index merge failed")
+        finally:
+            self._merging = False
+
+    def save(self):
+        """Write the tree (not the delta) to `path`; a reload reads newer rows from the database."""
+        if not self.path:
+            return
+        with self._lock:
+            tree_ids = self._tree_ids
+            high_water = int(tree_ids.max()) if len(tree_ids) else 0
+            # delta rows below the saved high_water are read again as gaps after a reload
+            gaps = {**{int(i): time.time() for i in self._delta_ids[self._delta_ids < high_water]},
+                    **{g: t for g, t in self._gaps.items() if g < high_water}}  # the rest is re-read past high_water
+            state = {"format": INDEX_FORMAT, "mean": self.mean, "std": self.std, "tree": self._tree,
+                     "ids": tree_ids, "high_water": high_water, "gaps": gaps}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        joblib.dump(state, tmp)
+        os.replace(tmp, self.path)  # atomic, other workers may load it at the same time
+
+    def clear(self):
+        """Forget every row (after the analyses table was emptied)."""
+        with self._load_lock:
+            with self._lock:
+                self._clear()
+                self._loaded = False
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    # --- queries ---
+    def search(self, features: List[float], k: int = 20, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """The k nearest analyses to a raw feature vector as (id, distance), nearest first."""
+        self.ensure_loaded()
+        if self._dirty or time.monotonic() - self._refreshed_at >= self.refresh_s:
+            self.refresh()
+        return self.query(features, k, exclude_id)
+
+    def query(self, features: List[float], k: int = 20, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """search() without loading or refreshing the index."""
+        n = k + (exclude_id is not None)
+        with self._lock:
+            q = ((np.asarray(features, dtype=float) - self.mean) / self.std).reshape(1, -1)
+            ids, dists = [], []
+            if self._tree is not None:
+                d, idx = self._tree.query(q, k=min(n, len(self._tree_ids)))
+                ids.append(self._tree_ids[idx[0]])
+                dists.append(d[0])
+            if len(self._delta_ids):
+                diff = self._delta_X - q
+                d2 = np.einsum("ij,ij->i", diff, diff)
+                top = np.argpartition(d2, n - 1)[:n] if len(d2) > n else np.arange(len(d2))
+                ids.append(self._delta_ids[top])
+                dists.append(np.sqrt(d2[top]))
+        if not ids:
+            return []
+        ids, dists = np.concatenate(ids), np.concatenate(dists)
+        order = np.argsort(dists, kind="stable")
+        return [(int(i), float(d)) for i, d in zip(ids[order], dists[order]) if i != exclude_id][:k]
+
+    def describe(self) -> dict:
+        return {"rows": len(self._tree_ids) + len(self._delta_ids), "delta_rows": len(self._delta_ids),
+                "high_water": self.high_water, "gaps": len(self._gaps), "path": self.path}
@@ -0,0 +1,262 @@
+# timing.py
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Tuple
+
+# seconds; covers sub-millisecond numpy stages up to slow Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+TRACE_HEADER = "x-trace-id"
+
+
+# ---------- Prometheus histogram (text exposition format) ----------
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            sep = "," if base else ""
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative:g}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series[-1]:g}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ---------- Per-request traces ----------
+class Trace:
+    def __init__(self, trace_id: str):
+        self.id = trace_id
+        self.start = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.analysis_id: Optional[int] = None
+        self.status: Optional[int] = None
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("prismiq_trace", default=None)
+
+
+class Timings:
+    """
+    Stage timings for the hot path.
+
+    stage()/timed() record a duration into the process-wide histogram and,
+    when called inside a traced request (see TimingMiddleware), into that
+    request's Trace. Traces feed the Server-Timing header and /ws/logs
+    subscribers; the last `keep_recent` finished traces can be replayed by
+    trace id or analysis id.
+    """
+
+    def __init__(self, keep_recent: int = 256):
+        self.stage_seconds = Histogram("prismiq_stage_seconds",
+                                       "Time spent per pipeline stage (score_batch stages are per batch)",
+                                       ("stage",))
+        self.request_seconds = Histogram("prismiq_request_seconds", "HTTP request latency",
+                                         ("method", "route", "status"))
+        self.keep_recent = keep_recent
+        self._lock = threading.Lock()
+        self._live: Dict[str, Trace] = {}
+        self._recent: "OrderedDict[str, Trace]" = OrderedDict()
+        self._by_analysis: "OrderedDict[int, str]" = OrderedDict()
+        self._reserved: set = set()  # ids handed out by reserve(), not yet used by a request
+        self._subs: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    # --- recording ---
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    async def timed(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.stage_seconds.observe(seconds, name)
+        trace = _current.get()
+        if trace is not None:
+            trace.stages.append((name, seconds))
+            self._publish(trace.id, ("stage", name, seconds))
+
+    def mark(self, name: str):
+        """
+        Record `name` as the time since the request started (e.g. body parsing + validation).
+        Only the first stage of a request counts, so nested handlers (upload -> predict) don't repeat it.
+        """
+        trace = _current.get()
+        if trace is not None and not trace.stages:
+            self.record(name, time.perf_counter() - trace.start)
+
+    def set_analysis(self, analysis_id: int):
+        trace = _current.get()
+        if trace is not None:
+            trace.analysis_id = analysis_id
+            self._publish(trace.id, ("analysis", analysis_id))
+
+    # --- trace lifecycle (TimingMiddleware) ---
+    def begin(self, trace_id: Optional[str] = None) -> Tuple[Trace, contextvars.Token]:
+        """Start a trace; `trace_id` (the request's X-Trace-Id) is only used if reserve() handed it out."""
+        with self._lock:
+            if trace_id is not None and trace_id in self._reserved:
+                self._reserved.discard(trace_id)
+            else:
+                trace_id = uuid.uuid4().hex
+            trace = Trace(trace_id)
+            self._live[trace.id] = trace
+        return trace, _current.set(trace)
+
+    def end(self, trace: Trace, token: contextvars.Token, method: str, route: str, status: int):
+        _current.reset(token)
+        trace.status = status
+        self.request_seconds.observe(time.perf_counter() - trace.start, method, route, str(status))
+        with self._lock:
+            self._live.pop(trace.id, None)
+            if trace.stages:  # only pipeline requests are worth replaying
+                self._recent[trace.id] = trace
+                if trace.analysis_id is not None:
+                    self._by_analysis[trace.analysis_id] = trace.id
+                while len(self._recent) > self.keep_recent:
+                    old_id, old = self._recent.popitem(last=False)
+                    if old.analysis_id is not None:
+                        self._by_analysis.pop(old.analysis_id, None)
+        self._publish(trace.id, ("done", status))
+
+    def server_timing(self, trace: Trace) -> str:
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in trace.stages]
+        parts.append(f"total;dur={(time.perf_counter() - trace.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+    # --- /ws/logs ---
+    def reserve(self) -> Tuple[str, asyncio.Queue]:
+        """
+        A new trace id and the queue of its events. The id is unguessable and only
+        used once: the first request that sends it in X-Trace-Id is traced under it.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        trace_id = uuid.uuid4().hex
+        with self._lock:
+            self._reserved.add(trace_id)
+            self._subs[trace_id] = [(asyncio.get_running_loop(), queue)]
+        return trace_id, queue
+
+    def subscribe(self, trace_id: Optional[str] = None,
+                  analysis_id: Optional[int] = None) -> Tuple[str, asyncio.Queue, List[Tuple]]:
+        """
+        (trace id, queue of future events, events that already happened) of a live or
+        recent trace; the trace id is "" if there is none.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            if trace_id is None:
+                trace_id = self._by_analysis.get(analysis_id) if analysis_id is not None else None
+            trace = (self._live.get(trace_id) or self._recent.get(trace_id)) if trace_id is not None else None
+            if trace is None:
+                return "", queue, []
+            replay: List[Tuple] = [("stage", name, sec) for name, sec in trace.stages]
+            if trace.analysis_id is not None:
+                replay.append(("analysis", trace.analysis_id))
+            if trace.status is not None:
+                replay.append(("done", trace.status))
+            else:
+                self._subs.setdefault(trace_id, []).append((asyncio.get_running_loop(), queue))
+        return trace_id, queue, replay
+
+    def unsubscribe(self, trace_id: str, queue: asyncio.Queue):
+        with self._lock:
+            subs = [s for s in self._subs.get(trace_id, []) if s[1] is not queue]
+            if subs:
+                self._subs[trace_id] = subs
+            else:
+                self._subs.pop(trace_id, None)
+                self._reserved.discard(trace_id)  # nobody is waiting for it any more
+
+    def _publish(self, trace_id: str, event: Tuple):
+        subs = self._subs.get(trace_id)
+        if not subs:
+            return
+        for loop, queue in list(subs):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:  # subscriber's loop is closed
+                self.unsubscribe(trace_id, queue)
+
+    # --- exposition ---
+    def render_prometheus(self) -> str:
+        return "\n".join(self.stage_seconds.render() + self.request_seconds.render()) + "\n"
+
+
+# ---------- ASGI middleware ----------
+class TimingMiddleware:
+    """Traces each HTTP request: Server-Timing / X-Trace-Id headers and the request histogram."""
+
+    def __init__(self, app, timings: Timings):
+        self.app = app
+        self.timings = timings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-trace-id":
+                trace_id = value.decode("latin-1")[:64]
+                break
+        trace, token = self.timings.begin(trace_id)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", self.timings.server_timing(trace).encode("latin-1")))
+                headers.append((b"x-trace-id", trace.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            self.timings.end(trace, token, scope.get("method", ""), getattr(route, "path", "unmatched"), status)
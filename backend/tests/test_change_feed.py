@@ -0,0 +1,59 @@
+# test_change_feed.py
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient # type: ignore
+
+import crud
+import main
+import models
+from services.change_feed import RESYNC, ChangeFeed
+
+with open(os.path.join(os.path.dirname(__file__), "data", "baseline_analyses.json")) as f:
+    ANALYSES = json.load(f)
+
+
+@pytest.fixture
+def db():
+    models.Base.metadata.create_all(main.engine)  # the app's (conftest) database
+    db = main.SessionLocal()
+    yield db
+    db.close()
+
+
+def test_explorer_socket_sends_snapshot_then_deltas(db):
+    first = crud.create_analysis(db, ANALYSES[0]["features"], ANALYSES[0]["result"])
+    with TestClient(main.app).websocket_connect("/ws/explorer") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "snapshot"
+        assert first.id in [r["analysis_id"] for r in snapshot["results"]]
+
+        second = crud.create_analysis(db, ANALYSES[1]["features"], ANALYSES[1]["result"])
+        delta = ws.receive_json()
+        assert delta["type"] == "delta"
+        assert [r["analysis_id"] for r in delta["results"]] == [second.id]
+        assert delta["results"][0]["prediction"] == ANALYSES[1]["result"]["prediction"]
+
+
+def test_slow_subscriber_gets_resync():
+    feed = ChangeFeed(max_queue=2)
+
+    async def run():
+        slow, fast = feed.subscribe(), feed.subscribe()
+        for i in range(5):
+            feed.publish([{"id": i}])
+            await asyncio.sleep(0)  # deliveries are scheduled on the loop
+            if i < 4:
+                assert await fast.get() == [{"id": i}]
+        received = [await slow.get()]
+        feed.publish([{"id": 5}])  # after the reload: deltas again
+        await asyncio.sleep(0)
+        received.append(await slow.get())
+        return received, slow
+
+    received, slow = asyncio.run(run())
+    assert received == [RESYNC, [{"id": 5}]]
+    assert slow.dropped == 4  # 2 queued + 2 arriving while stale
+    assert feed.stats()["resyncs"] == 1
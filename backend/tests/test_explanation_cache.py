@@ -0,0 +1,40 @@
+# test_explanation_cache.py
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+
+import models
+from services.explanation_cache import ExplanationCache
+from services.explanation_service import ExplanationService, FakeGeminiClient
+
+
+class StubGeminiClient:
+    """Answers like the real client would (same cache namespace)."""
+    kind = "gemini"
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        return f"gemini says: {prompt}"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_fake_client_output_is_not_served_to_gemini(session_factory):
+    fake = ExplanationService(FakeGeminiClient(), cache=ExplanationCache(session_factory))
+    # a fresh process with the real client: only the persistent tier is shared
+    real = ExplanationService(StubGeminiClient(), cache=ExplanationCache(session_factory))
+
+    async def run():
+        return await fake.generate("prompt"), await real.generate("prompt"), await real.generate("prompt")
+
+    fake_text, real_text, cached_text = asyncio.run(run())
+    assert fake_text.startswith("[fake ")
+    assert real_text == cached_text == "gemini says: prompt"
+    assert real.cache.counters["memory_hits"] == 1
@@ -0,0 +1,111 @@
+# test_explanation_worker.py
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+
+import models
+from services.explanation_service import ExplanationService
+from services.explanation_worker import ExplanationWorker
+
+
+class FakeClient:
+    """Gemini client stand-in that answers, raises ("error") or hangs past the timeout ("timeout")."""
+
+    def __init__(self, failure: str | None = None):
+        self.failure = failure
+        self.prompts = []
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        self.prompts.append(prompt)
+        if self.failure == "error":
+            raise RuntimeError("Gemini unavailable")
+        if self.failure == "timeout":
+            await asyncio.sleep(10)
+        return f"explained: {prompt}"
+
+
+def explainer(client: FakeClient) -> ExplanationService:
+    return ExplanationService(client, timeout_s=0.05)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'worker.db'}")
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def add_pending(session_factory, claimed_at) -> int:
+    db = session_factory()
+    obj = models.Analysis(explanation_status="pending", explanation_claimed_at=claimed_at)
+    db.add(obj)
+    db.commit()
+    analysis_id = obj.id
+    db.close()
+    return analysis_id
+
+
+def load(session_factory, analysis_id):
+    db = session_factory()
+    obj = db.get(models.Analysis, analysis_id)
+    db.close()
+    return obj
+
+
+async def drain(worker: ExplanationWorker, client: FakeClient, calls: int):
+    """Wait for `calls` Gemini calls to finish, then stop the worker."""
+    deadline = time.monotonic() + 5
+    while len(client.prompts) < calls and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await worker._queue.join()
+    await worker.shutdown()
+
+
+@pytest.mark.parametrize("failure", ["error", "timeout"])
+def test_failed_generation_is_stored(session_factory, failure):
+    client = FakeClient(failure)
+    worker = ExplanationWorker(explainer(client), session_factory)
+    analysis_id = add_pending(session_factory, time.time())
+
+    async def run():
+        worker.submit(analysis_id, "koi prompt", "planet prompt")
+        await drain(worker, client, 2)
+
+    asyncio.run(run())
+    obj = load(session_factory, analysis_id)
+    assert (obj.explanation_status, obj.explanation) == ("failed", None)
+
+
+def test_orphaned_rows_are_resumed(session_factory):
+    client = FakeClient()
+    worker = ExplanationWorker(explainer(client), session_factory, stale_s=60)
+    orphaned = add_pending(session_factory, time.time() - 120)  # its process stopped
+    unclaimed = add_pending(session_factory, None)
+    live = add_pending(session_factory, time.time())  # still held by another process
+
+    async def run():
+        worker.start(lambda db, obj: (f"koi {obj.id}", None))
+        await drain(worker, client, 2)
+
+    asyncio.run(run())
+    assert sorted(client.prompts) == [f"koi {orphaned}", f"koi {unclaimed}"]
+    for analysis_id in (orphaned, unclaimed):
+        obj = load(session_factory, analysis_id)
+        assert (obj.explanation_status, obj.explanation) == ("ready", f"explained: koi {analysis_id}")
+    assert load(session_factory, live).explanation_status == "pending"
+
+
+def test_shutdown_releases_claims(session_factory):
+    worker = ExplanationWorker(explainer(FakeClient()), session_factory)
+    analysis_id = add_pending(session_factory, time.time())
+
+    async def run():
+        worker._held.add(analysis_id)  # queued here when the process stops
+        await worker.shutdown()
+
+    asyncio.run(run())
+    assert load(session_factory, analysis_id).explanation_claimed_at is None
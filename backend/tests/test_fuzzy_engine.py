@@ -0,0 +1,73 @@
+# test_fuzzy_engine.py
+import numpy as np # type: ignore
+import pytest
+
+from main import CLASS_SPECS, PLANET_FEATURE_ORDER, assign_planet_type_multi, fuzzy_engine, membership
+from services.fuzzy_engine import FuzzyRuleEngine
+
+# (prim, soft) bounds of one feature, including the degenerate ones CLASS_SPECS doesn't use
+BOUND_CASES = {
+    "two_sided": ((1.0, 2.0), (0.5, 3.0)),
+    "two_sided_zero_width_soft": ((1.0, 2.0), (1.0, 2.0)),
+    "two_sided_no_soft": ((1.0, 2.0), None),
+    "low_only": ((1.0, None), (0.5, None)),
+    "low_only_zero_width_soft": ((1.0, None), (1.0, None)),
+    "low_only_soft_zero": ((1.0, None), (0.0, None)),  # 0 is falsy: no ramp
+    "high_only": ((None, 2.0), (None, 3.0)),
+    "high_only_zero_width_soft": ((None, 2.0), (None, 2.0)),
+    "high_only_soft_zero": ((None, -1.0), (None, 0.0)),
+    "triangle": ((None, None), (0.0, 4.0)),
+    "triangle_zero_width": ((None, None), (2.0, 2.0)),
+    "no_bounds": ((None, None), (None, None)),
+    "no_prim": (None, (0.5, 3.0)),
+}
+EDGES = [-1.0, -0.5, 0.0, 0.5, 0.75, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, np.nan]
+
+
+def scalar_membership(value, **bounds):
+    """membership(), except at the only point of a zero-width triangle, where it divides by zero
+    and the engine gives full membership."""
+    try:
+        return membership(value, **bounds)
+    except ZeroDivisionError:
+        assert bounds["soft_min"] == bounds["soft_max"] == value
+        return 1.0
+
+
+@pytest.mark.parametrize("case", sorted(BOUND_CASES))
+def test_membership_matches_scalar(case):
+    prim, soft = BOUND_CASES[case]
+    engine = FuzzyRuleEngine({"cls": {"x": {"prim": prim, "soft": soft, "w": 1.0}}}, ["x"])
+    values = np.array(EDGES + list(np.nextafter(EDGES[:-1], np.inf)) + list(np.nextafter(EDGES[:-1], -np.inf)))
+
+    got = engine.membership(values.reshape(-1, 1))[:, 0, 0]
+    expected = [scalar_membership(float(v),
+                                  prim_min=prim[0] if prim else None, prim_max=prim[1] if prim else None,
+                                  soft_min=soft[0] if soft else None, soft_max=soft[1] if soft else None)
+                for v in values]
+    assert got.tolist() == expected
+
+
+def test_class_specs_match_scalar():
+    rng = np.random.default_rng(0)
+    scale = np.array([30, 6, 12000, 12, 2, 1500], dtype=float)
+    X = rng.uniform(0, 1, size=(2000, len(PLANET_FEATURE_ORDER))) * scale
+    # every bound of every spec, exactly and on either side
+    for spec in CLASS_SPECS.values():
+        for feat, conf in spec.items():
+            if feat not in PLANET_FEATURE_ORDER:
+                continue
+            for bound in (conf.get("prim") or ()) + (conf.get("soft") or ()):
+                if bound is None:
+                    continue
+                for v in (bound, np.nextafter(bound, np.inf), np.nextafter(bound, -np.inf)):
+                    row = rng.uniform(0, 1, len(PLANET_FEATURE_ORDER)) * scale
+                    row[PLANET_FEATURE_ORDER.index(feat)] = v
+                    X = np.vstack([X, row])
+    X[::97, 2] = np.nan
+
+    types, scores = fuzzy_engine.assign(X)
+    for row, rule_type, rule_scores in zip(X, types, scores):
+        expected_type, expected_scores = assign_planet_type_multi(dict(zip(PLANET_FEATURE_ORDER, map(float, row))))
+        assert rule_scores == expected_scores
+        assert rule_type == expected_type
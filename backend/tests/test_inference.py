@@ -0,0 +1,46 @@
+# test_inference.py
+import numpy as np # type: ignore
+
+from services.inference import InferenceModel
+
+
+class FlakyBooster:
+    """inplace_predict that fails on its first call only."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def inplace_predict(self, X, iteration_range, missing):
+        self.calls += 1
+        if self.calls == 1:
+            raise ValueError("bad batch")
+        return np.full(len(X), 0.75)
+
+    def get_score(self, importance_type):
+        return {}
+
+
+class Classifier:
+    objective = "binary:logistic"
+    classes_ = np.array([0, 1])
+
+    def __init__(self):
+        self.booster = FlakyBooster()
+        self.fallbacks = 0
+
+    def get_booster(self):
+        return self.booster
+
+    def predict_proba(self, X):
+        self.fallbacks += 1
+        return np.tile([0.5, 0.5], (len(X), 1))
+
+
+def test_inplace_failure_falls_back_for_that_call_only():
+    clf = Classifier()
+    model = InferenceModel(clf)
+    X = np.zeros((3, 2))
+
+    assert model.predict_proba(X).tolist() == [[0.5, 0.5]] * 3
+    assert model.predict_proba(X).tolist() == [[0.25, 0.75]] * 3
+    assert (clf.booster.calls, clf.fallbacks) == (2, 1)
@@ -0,0 +1,60 @@
+# test_jobs.py
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+
+import crud
+import models
+from services.jobs import JobManager
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def manager(session_factory, tmp_path, keep_upload_s: float) -> JobManager:
+    return JobManager(session_factory, str(tmp_path / "jobs_store"), prepare=None, score_fn=None,
+                      to_rows=None, keep_upload_s=keep_upload_s)
+
+
+def add_job(session_factory, jobs: JobManager, job_id: str, status: str) -> str:
+    """A job in `status` with its upload stored under jobs.store_dir."""
+    path = os.path.join(jobs.store_dir, job_id + ".csv")
+    os.makedirs(jobs.store_dir, exist_ok=True)
+    with open(path, "w") as f:
+        f.write("koi_period\n1.0\n")
+    db = session_factory()
+    crud.create_job(db, job_id, "koi.csv", path, jobs.owner, time.time())
+    if status != "queued":
+        crud.set_job_status(db, job_id, status)
+    db.close()
+    return path
+
+
+def test_stopped_jobs_keep_their_upload_until_it_expires(session_factory, tmp_path):
+    jobs = manager(session_factory, tmp_path, keep_upload_s=3600)
+    paths = {status: add_job(session_factory, jobs, status, status)
+             for status in ("queued", "done", "cancelled", "failed")}
+
+    jobs._remove_stopped_uploads()
+    assert {s for s, p in paths.items() if os.path.exists(p)} == {"queued", "cancelled", "failed"}
+
+    jobs.keep_upload_s = 0
+    time.sleep(1.1)  # finished_at has second resolution on SQLite
+    jobs._remove_stopped_uploads()
+    assert {s for s, p in paths.items() if os.path.exists(p)} == {"queued"}
+
+
+def test_resume_needs_the_upload(session_factory, tmp_path):
+    jobs = manager(session_factory, tmp_path, keep_upload_s=0)
+    os.remove(add_job(session_factory, jobs, "gone", "cancelled"))
+    assert not asyncio.run(jobs.resume("gone"))
+    assert jobs.get("gone").status == "cancelled"
@@ -0,0 +1,86 @@
+# test_migrations.py
+import json
+import os
+
+import numpy as np # type: ignore
+import pytest
+from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+
+import crud, migrations, models
+from services.similarity import SimilarityIndex
+
+# rows written by the baseline API (/predict_manual): full payload in `result`, no model_version
+with open(os.path.join(os.path.dirname(__file__), "data", "baseline_analyses.json")) as f:
+    BASELINE_ROWS = json.load(f)
+
+BASELINE_DDL = (
+    "CREATE TABLE analyses (id INTEGER NOT NULL PRIMARY KEY, features JSON NOT NULL, result JSON NOT NULL, "
+    "explanation VARCHAR, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+)
+
+
+# a payload from before the per-feature stats were stored; it can't be rebuilt, so it stays full JSON
+OLDER_ROW = {
+    "features": {**BASELINE_ROWS[1]["features"], "kepid": 757450},
+    "result": {k: v for k, v in BASELINE_ROWS[1]["result"].items() if k not in ("stats", "z_scores")},
+    "explanation": None,
+}
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(BASELINE_DDL)
+        conn.exec_driver_sql("CREATE INDEX ix_analyses_id ON analyses (id)")
+        for row in BASELINE_ROWS + [OLDER_ROW]:
+            conn.exec_driver_sql("INSERT INTO analyses (features, result, explanation) VALUES (?, ?, ?)",
+                                 (json.dumps(row["features"]), json.dumps(row["result"]), row["explanation"]))
+    yield engine, sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_baseline_rows_are_compacted(baseline_db):
+    engine, session_factory = baseline_db
+    migrations.run(engine, session_factory)
+
+    db = session_factory()
+    rows = db.query(models.Analysis).order_by(models.Analysis.id).all()
+    assert len(rows) == len(BASELINE_ROWS) + 1
+    for obj, original in zip(rows, BASELINE_ROWS):
+        assert obj.result is None
+        assert obj.context_key is not None
+        assert all(getattr(obj, k) is not None for k in models.FEATURE_COLUMNS)
+        assert crud.analysis_result(db, obj) == original["result"]
+        assert crud.analysis_features(obj) == original["features"]
+    db.close()
+
+
+def test_uncompactable_rows_get_feature_columns(baseline_db):
+    engine, session_factory = baseline_db
+    migrations.run(engine, session_factory)
+
+    db = session_factory()
+    obj = db.query(models.Analysis).order_by(models.Analysis.id.desc()).first()
+    assert obj.result == OLDER_ROW["result"]
+    assert [getattr(obj, k) for k in models.FEATURE_COLUMNS] == [OLDER_ROW["features"][k] for k in models.FEATURE_COLUMNS]
+    assert crud.analysis_features(obj) == OLDER_ROW["features"]
+    db.close()
+
+    unit = type("Stats", (), {"mean": np.zeros(len(models.FEATURE_COLUMNS)), "std": np.ones(len(models.FEATURE_COLUMNS))})
+    index = SimilarityIndex(session_factory, lambda: unit)
+    nearest = index.search([OLDER_ROW["features"][k] for k in models.FEATURE_COLUMNS], k=5)
+    assert len(nearest) == len(BASELINE_ROWS) + 1
+    assert nearest[0] == (obj.id, 0.0)
+
+
+def test_migrations_are_idempotent(baseline_db):
+    engine, session_factory = baseline_db
+    migrations.run(engine, session_factory)
+    migrations.run(engine, session_factory)
+
+    db = session_factory()
+    results = [crud.analysis_result(db, o) for o in db.query(models.Analysis).order_by(models.Analysis.id)]
+    assert results == [row["result"] for row in BASELINE_ROWS + [OLDER_ROW]]
+    db.close()
@@ -0,0 +1,52 @@
+# test_pagination.py
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+
+import crud
+import models
+from main import keyset_page
+from services.pagination import decode_cursor, encode_cursor
+
+CONFIDENCE = {1: 0.9, 2: None, 3: 0.5, 4: 0.9, 5: None, 6: 0.1}
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pages.db'}")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all(models.Analysis(id=i, confidence=c) for i, c in CONFIDENCE.items())
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
+
+
+def walk(db, order: str, limit: int = 2) -> list:
+    """Ids of every page of /explorer?sort=confidence, following next_cursor."""
+    def fetch(after_id, n):
+        return crud.get_analysis_summaries(db, limit=n, after_id=after_id, sort="confidence",
+                                           descending=order == "desc")
+    ids, cursor = [], ""
+    while cursor is not None:
+        rows, cursor = keyset_page(fetch, cursor, limit, "confidence", order)
+        ids += [r.id for r in rows]
+    return ids
+
+
+@pytest.mark.parametrize("order, expected", [("desc", [4, 1, 3, 6, 5, 2]), ("asc", [6, 3, 1, 4, 2, 5])])
+def test_null_sort_values_come_last(db, order, expected):
+    assert walk(db, order) == expected
+
+
+def test_cursor_is_bound_to_its_sort_order():
+    token = encode_cursor(models.Analysis(id=7), "confidence", "asc")
+    assert decode_cursor(token, "confidence", "asc") == 7
+    for sort, order in [("confidence", "desc"), ("created_at", "asc")]:
+        with pytest.raises(ValueError):
+            decode_cursor(token, sort, order)
+    with pytest.raises(HTTPException) as e:
+        keyset_page(lambda after_id, n: [], token, 10)
+    assert e.value.status_code == 400
@@ -0,0 +1,67 @@
+# test_similarity.py
+import numpy as np # type: ignore
+import pytest
+from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+
+import models
+from services.similarity import SimilarityIndex
+
+UNIT = type("Stats", (), {"mean": np.zeros(len(models.FEATURE_COLUMNS)), "std": np.ones(len(models.FEATURE_COLUMNS))})
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'similarity.db'}")
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def insert(session_factory, *ids: int):
+    """Commit analyses with explicit ids, e.g. in the order concurrent transactions would."""
+    db = session_factory()
+    db.add_all(models.Analysis(id=i, **{k: float(i) for k in models.FEATURE_COLUMNS}) for i in ids)
+    db.commit()
+    db.close()
+
+
+def indexed(index: SimilarityIndex) -> list:
+    index.refresh()
+    return sorted(i for i, _ in index.query([0.0] * len(models.FEATURE_COLUMNS), k=100))
+
+
+def test_rows_committed_out_of_id_order_are_indexed(session_factory):
+    index = SimilarityIndex(session_factory, lambda: UNIT)
+    insert(session_factory, 1, 2)
+    index.ensure_loaded()
+    insert(session_factory, 5)  # ids 3 and 4 belong to transactions that haven't committed yet
+    assert indexed(index) == [1, 2, 5]
+    assert index.describe()["gaps"] == 2
+
+    insert(session_factory, 3, 4)
+    assert indexed(index) == [1, 2, 3, 4, 5]
+    assert index.describe()["gaps"] == 0
+    assert indexed(index) == [1, 2, 3, 4, 5]  # not added twice
+
+
+def test_gaps_survive_a_reload(session_factory, tmp_path):
+    path = str(tmp_path / "index.joblib")
+    index = SimilarityIndex(session_factory, lambda: UNIT, path=path, merge_rows=1)
+    insert(session_factory, 1, 3)
+    index.ensure_loaded()
+    assert index.describe()["gaps"] == 1
+
+    insert(session_factory, 2)
+    reloaded = SimilarityIndex(session_factory, lambda: UNIT, path=path)
+    assert reloaded.load_saved(UNIT)
+    assert reloaded.describe()["gaps"] == 1
+    assert indexed(reloaded) == [1, 2, 3]
+
+
+def test_gaps_expire(session_factory):
+    index = SimilarityIndex(session_factory, lambda: UNIT, gap_ttl_s=0)
+    insert(session_factory, 1, 3)
+    index.ensure_loaded()
+    index.refresh()  # id 2 was rolled back: stop looking for it
+    assert index.describe()["gaps"] == 0
@@ -21,7 +21,7 @@ const Anomalies = () => {
   const [filter, setFilter] = useState("All");
 
   useEffect(() => {
-    fetch(`https://prismiq-opo2.onrender.com/explorer`)
+    fetch(`https://prismiq-opo2.onrender.com/explorer?prediction=False%20Positive`)
       .then((res) => res.json())
       .then((data) => {
         const results = Array.isArray(data) ? data : data.results || [];